@@ -0,0 +1,75 @@
+# Scaling benchmark of the parallel streamline generation.
+# Traces the same domain with an increasing number of worker processes and prints the time and
+# the speedup over a single worker. Run from the directory containing the roadGraphGen package:
+#
+#   python -m roadGraphGen.benchmarks.parallel_scaling --size 4000 --tiles 4 --workers 1 2 4 8
+import argparse
+import os
+
+from mathutils import Vector
+from time import time
+
+from roadGraphGen.roadGraphGen.integrator import RK4Integrator
+from roadGraphGen.roadGraphGen.parallel import ParallelStreamlineGenerator
+from roadGraphGen.roadGraphGen.streamline_parameters import StreamlineParameters
+from roadGraphGen.roadGraphGen.streamlines import StreamlineGenerator
+from roadGraphGen.roadGraphGen.tensor_field import TensorField
+
+
+def create_generator(size, seed):
+    field = TensorField()
+    field.add_grid(Vector((size * 0.6, size * 0.4)), size, 35, 1.983775)
+    field.add_grid(Vector((size * 0.4, size * 0.6)), size, 35, -1.283775)
+    field.add_radial(Vector((size * 0.3, size * 0.3)), size / 2, 55)
+
+    # Same values as used by the RGG_GraphGenerator.
+    parameters = StreamlineParameters(
+        dsep=100,
+        dtest=30,
+        dstep=1,
+        dcirclejoin=5,
+        dlookahead=200,
+        joinangle=0.1,
+        path_iterations=1500,
+        seed_tries=500,
+        simplify_tolerance=0.01,
+        collide_early=0,
+    )
+    return StreamlineGenerator(
+        integrator=RK4Integrator(field, parameters),
+        origin=Vector((0.0, 0.0)),
+        world_dimensions=Vector((size, size)),
+        parameters=parameters,
+        seed=seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the parallel streamline generation.")
+    parser.add_argument("--size", type=float, default=2000)
+    parser.add_argument("--tiles", type=int, default=4, help="tiles per axis")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sequential", action="store_true", help="also time a single generator")
+    args = parser.parse_args()
+
+    if args.sequential:
+        generator = create_generator(args.size, args.seed)
+        t = time()
+        generator.create_all_streamlines()
+        print(f"sequential: {time() - t:8.2f}s, {len(generator.all_streamlines)} streamlines")
+
+    # Speedups are relative to the first worker count.
+    baseline = None
+    for workers in args.workers:
+        generator = create_generator(args.size, args.seed)
+        t = time()
+        ParallelStreamlineGenerator(generator, (args.tiles, args.tiles), workers).create_all_streamlines()
+        elapsed = time() - t
+        baseline = baseline or elapsed
+        print(f"{workers:3d} workers: {elapsed:8.2f}s, speedup {baseline / elapsed:5.2f}, "
+              f"{len(generator.all_streamlines)} streamlines, {os.cpu_count()} cpus")
+
+
+if __name__ == "__main__":
+    main()
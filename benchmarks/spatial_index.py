@@ -0,0 +1,94 @@
+# Benchmark of the streamline sample storages on the standard generation of the RGG_GraphGenerator.
+# Traces the same domain with every storage and prints the time, checking that the streamlines are
+# the same. Afterwards times separation tests at dtest and at a fraction of it, one at a time and
+# all at once, and the nearby point queries of joining, against the samples of the generation.
+# Run from the directory containing the roadGraphGen package:
+#
+#   python -m roadGraphGen.benchmarks.spatial_index --size 2000
+import argparse
+
+import numpy as np
+
+from mathutils import Vector
+from time import time
+
+from roadGraphGen.roadGraphGen.batch_runner import GenerationJob
+from roadGraphGen.roadGraphGen.clearance import ClearanceGridStorage
+from roadGraphGen.roadGraphGen.grid_storage import GridStorage, NumpyGridStorage
+from roadGraphGen.roadGraphGen.integrator import RK4Integrator
+from roadGraphGen.roadGraphGen.spatial_index import QuadtreeStorage
+from roadGraphGen.roadGraphGen.streamline_parameters import StreamlineParameters
+from roadGraphGen.roadGraphGen.streamlines import StreamlineGenerator
+
+STORAGES = {
+    'list': GridStorage,
+    'numpy': NumpyGridStorage,
+    'quadtree': QuadtreeStorage,
+    'clearance': ClearanceGridStorage,
+}
+
+
+def create_generator(job: GenerationJob, grid_class):
+    parameters = StreamlineParameters(**job.parameters)
+    return StreamlineGenerator(
+        integrator=RK4Integrator(job.create_field(), parameters),
+        origin=Vector(job.origin),
+        world_dimensions=Vector((job.width, job.height)),
+        parameters=parameters,
+        seed=job.seed,
+        grid_class=grid_class
+    )
+
+
+def time_queries(grid, queries, d_sq, distance):
+    t = time()
+    for v in queries:
+        grid.is_valid_sample(v, d_sq)
+    valid_time = time() - t
+    t = time()
+    grid.is_valid_samples(queries, d_sq)
+    batch_time = time() - t
+    t = time()
+    for v in queries:
+        grid.get_nearby_point_array(v, distance)
+    return valid_time, batch_time, time() - t
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the streamline sample storages.")
+    parser.add_argument("--size", type=float, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--storages", nargs="+", default=list(STORAGES), choices=list(STORAGES))
+    args = parser.parse_args()
+
+    job = GenerationJob('benchmark', args.size, args.size, args.seed)
+    generators = {}
+    for name in args.storages:
+        generator = create_generator(job, STORAGES[name])
+        t = time()
+        generator.create_all_streamlines()
+        elapsed = time() - t
+        generators[name] = generator
+        points = [[tuple(p) for p in streamline] for streamline in generator.all_streamlines]
+        same = points == [[tuple(p) for p in s] for s in next(iter(generators.values())).all_streamlines]
+        print(f"{name:>8} generation: {elapsed:8.2f}s, {len(points)} streamlines, "
+              f"{'same' if same else 'DIFFERENT'} streamlines")
+
+    # Queries around the samples, where separation tests happen during tracing.
+    rng = np.random.default_rng(args.seed)
+    samples = next(iter(generators.values())).major_grid.samples_to_arrays()[0]
+    queries = samples[rng.integers(0, len(samples), args.queries)] + rng.normal(0, 20, (args.queries, 2))
+    queries = [Vector(p) for p in queries.tolist()]
+    parameters = StreamlineParameters(**job.parameters)
+    for dtest in [parameters.dtest, parameters.dtest / 10]:
+        for name, generator in generators.items():
+            valid_time, batch_time, nearby_time = time_queries(
+                generator.major_grid, queries, dtest ** 2, parameters.dlookahead)
+            print(f"{name:>8} dtest {dtest:5.1f}: is_valid_sample {valid_time / len(queries) * 1e6:7.2f}us, "
+                  f"is_valid_samples {batch_time / len(queries) * 1e6:7.2f}us, "
+                  f"get_nearby_point_array {nearby_time / len(queries) * 1e6:7.2f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,7 @@ class RGG_RoadGraphGenPanel(RGG_BasePanel, bpy.types.Panel):
     def draw(self, context):
         layout = self.layout
         layout.operator("rgg.generate_graph")
+        layout.operator("rgg.generate_graph_modal")
 
 
 # ------------------------------------------------------------------------
@@ -57,6 +58,46 @@ class RGG_GenerateGraph(bpy.types.Operator):
         return {'FINISHED'}
 
 
+# Generates the graph in time slices of 'budget_ms' milliseconds on timer events, so Blender stays
+# responsive. Reports the progress in the status bar, ESC cancels the generation.
+class RGG_GenerateGraphModal(bpy.types.Operator):
+    bl_idname = "rgg.generate_graph_modal"
+    bl_label = "Generate (Non-Blocking)"
+
+    budget_ms: bpy.props.FloatProperty(name="Time Budget (ms)", default=30.0, min=1.0)
+
+    def invoke(self, context, event):
+        self.graph_generator = RGG_GraphGenerator()
+        self.graph_generator.start()
+
+        window_manager = context.window_manager
+        self.timer = window_manager.event_timer_add(0.001, window=context.window)
+        window_manager.modal_handler_add(self)
+
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.finish(context)
+            self.report({'INFO'}, "Graph generation cancelled")
+            return {'CANCELLED'}
+
+        if event.type == 'TIMER':
+            if not self.graph_generator.step(self.budget_ms):
+                self.finish(context)
+                return {'FINISHED'}
+
+            phase, done, total = self.graph_generator.progress
+            progress = f"{done}" if total is None else f"{done}/{total}"
+            context.workspace.status_text_set(f"Generating graph - {phase}: {progress} (ESC to cancel)")
+
+        return {'PASS_THROUGH'}
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        context.workspace.status_text_set(None)
+
+
 # ------------------------------------------------------------------------
 #    Registration of Panel and Operator
 # ------------------------------------------------------------------------
@@ -64,7 +105,8 @@ class RGG_GenerateGraph(bpy.types.Operator):
 
 classes = [
     RGG_RoadGraphGenPanel,
-    RGG_GenerateGraph
+    RGG_GenerateGraph,
+    RGG_GenerateGraphModal
 ]
 
 
@@ -1,20 +1,40 @@
 import math
+import numpy as np
 
 from mathutils import Vector
 
-from roadGraphGen.roadGraphGen.tensor import Tensor
+from roadGraphGen.roadGraphGen.tensor import Tensor, TensorArray
 
 
 # The BasisField subclasses define specific tensor field patterns/designs.
 #
 # Can be sampled to retrieve the tensor at a specified point of the domain.
 # 'get_weighted_tensor' returns the tensor weighted with the fields decay constant.
+#
+# The batch variants ('get_weighted_tensors', 'get_tensors', 'get_tensor_weights') take an
+# (N, 2) array of points and follow the same semantics as the single point methods, with
+# tensors returned as a TensorArray and weights as an (N,) array.
+#
+# 'get_influence_radius' returns the distance from the center beyond which the field does
+# not contribute to the tensor field. In smooth mode the Gaussian weight never reaches zero,
+# so the radius at which the weight drops below 'epsilon' is returned instead.
+#
+# mathutils Vectors can not be pickled, so the center is pickled as a tuple.
 class BasisField:
     def __init__(self, center: Vector, size, decay):
         self.center = center.copy()
         self.size = size
         self.decay = decay
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['center'] = tuple(self.center)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.center = Vector(self.center)
+
     def get_weighted_tensor(self, point: Vector, smooth=False):
         return self.get_tensor(point).scale(self.get_tensor_weight(point, smooth))
 
@@ -30,6 +50,27 @@ class BasisField:
             return 0
         return max(0, (1 - norm_distance_to_center)) ** self.decay
 
+    def get_influence_radius(self, smooth: bool, epsilon=1e-6):
+        if not smooth:
+            return self.size
+        if self.decay <= 0:
+            return math.inf
+        return self.size * math.sqrt(math.log(1 / epsilon) / self.decay)
+
+    def get_weighted_tensors(self, points: np.ndarray, smooth=False) -> TensorArray:
+        return self.get_tensors(points).scale(self.get_tensor_weights(points, smooth))
+
+    def get_tensors(self, points: np.ndarray) -> TensorArray:
+        return TensorArray.zeros(len(points))
+
+    def get_tensor_weights(self, points: np.ndarray, smooth: bool):
+        norm_distance_to_center = np.hypot(points[:, 0] - self.center.x, points[:, 1] - self.center.y) / self.size
+        if smooth:
+            return np.exp(-self.decay * norm_distance_to_center ** 2)
+        if self.decay == 0:
+            return np.where(norm_distance_to_center >= 1, 0.0, 1.0)
+        return np.maximum(0, (1 - norm_distance_to_center)) ** self.decay
+
 
 class GridBasisField(BasisField):
     def __init__(self, center: Vector, size, decay, theta):
@@ -39,6 +80,12 @@ class GridBasisField(BasisField):
     def get_tensor(self, point: Vector):
         return Tensor(1, [math.cos(2 * self.theta), math.sin(2 * self.theta)])
 
+    def get_tensors(self, points: np.ndarray) -> TensorArray:
+        matrix = np.empty((len(points), 2))
+        matrix[:, 0] = math.cos(2 * self.theta)
+        matrix[:, 1] = math.sin(2 * self.theta)
+        return TensorArray(np.ones(len(points)), matrix)
+
 
 class RadialBasisField(BasisField):
     def __init__(self, center: Vector, size, decay):
@@ -49,3 +96,11 @@ class RadialBasisField(BasisField):
         t1 = t.y ** 2 - t.x ** 2
         t2 = -2 * t.x * t.y
         return Tensor(1, [t1, t2])
+
+    def get_tensors(self, points: np.ndarray) -> TensorArray:
+        tx = points[:, 0] - self.center.x
+        ty = points[:, 1] - self.center.y
+        matrix = np.empty((len(points), 2))
+        matrix[:, 0] = ty ** 2 - tx ** 2
+        matrix[:, 1] = -2 * tx * ty
+        return TensorArray(np.ones(len(points)), matrix)
@@ -0,0 +1,330 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from mathutils import Vector
+from time import time
+
+from roadGraphGen.roadGraphGen.clearance import ClearanceGridStorage
+from roadGraphGen.roadGraphGen.field_raster import TensorFieldRaster
+from roadGraphGen.roadGraphGen.graph import Graph
+from roadGraphGen.roadGraphGen.grid_storage import GridStorage, NumpyGridStorage, SparseGridStorage
+from roadGraphGen.roadGraphGen.integrator import AdaptiveIntegrator, RK4Integrator
+from roadGraphGen.roadGraphGen.spatial_index import QuadtreeStorage
+from roadGraphGen.roadGraphGen.streamline_parameters import StreamlineParameters
+from roadGraphGen.roadGraphGen.streamlines import StreamlineGenerator
+from roadGraphGen.roadGraphGen.tensor_field import TensorField
+
+
+# Same basis fields and parameters as used by the RGG_GraphGenerator.
+# Basis fields are given as ('grid', center, size, decay, theta) or ('radial', center, size, decay).
+DEFAULT_BASIS_FIELDS = (
+    ('grid', (1381, 788), 1500, 35, 1.983775),
+    ('grid', (1181, 988), 1500, 35, -1.283775),
+    ('radial', (800, 888), 750, 55),
+)
+DEFAULT_PARAMETERS = {
+    'dsep': 100,
+    'dtest': 30,
+    'dstep': 1,
+    'dcirclejoin': 5,
+    'dlookahead': 200,
+    'joinangle': 0.1,
+    'path_iterations': 1500,
+    'seed_tries': 500,
+    'simplify_tolerance': 0.01,
+    'collide_early': 0,
+}
+# Grid classes selectable by the 'grid' of a job.
+GRID_CLASSES = {
+    'clearance': ClearanceGridStorage,
+    'list': GridStorage,
+    'numpy': NumpyGridStorage,
+    'quadtree': QuadtreeStorage,
+    'sparse': SparseGridStorage,
+}
+
+
+# Configuration of one road graph of a batch, generated like by the RGG_GraphGenerator, but without
+# Blender. 'parameters' overrides single StreamlineParameters of DEFAULT_PARAMETERS.
+class GenerationJob:
+    def __init__(self, name: str, width=100, height=100, seed=-1, parameters: dict = None,
+                 basis_fields=DEFAULT_BASIS_FIELDS, field_resolution: float = None, batch_size: int = None,
+                 adaptive=False, free_space_sampling=False, origin=(519, 249), grid='list'):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.parameters = dict(DEFAULT_PARAMETERS, **(parameters or {}))
+        self.basis_fields = tuple(tuple(field) for field in basis_fields)
+        self.field_resolution = field_resolution
+        self.batch_size = batch_size
+        self.adaptive = adaptive
+        self.free_space_sampling = free_space_sampling
+        self.origin = tuple(origin)
+        if grid not in GRID_CLASSES:
+            raise ValueError(f"Unknown grid '{grid}' of job {name}")
+        self.grid = grid
+
+    # Creates a job from a dictionary of the arguments of __init__, e.g. read from a JSON file.
+    @staticmethod
+    def from_dict(config: dict) -> 'GenerationJob':
+        return GenerationJob(**config)
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    def create_field(self) -> TensorField:
+        field = TensorField()
+        for kind, center, *arguments in self.basis_fields:
+            if kind == 'grid':
+                field.add_grid(Vector(center), *arguments)
+            elif kind == 'radial':
+                field.add_radial(Vector(center), *arguments)
+            else:
+                raise ValueError(f"Unknown basis field type '{kind}' of job {self.name}")
+        return field
+
+    # Key of the raster of the job, equal for all jobs sharing the same field layout and domain.
+    # None if the field is sampled directly.
+    def raster_key(self):
+        if self.field_resolution is None:
+            return None
+        layout = [self.basis_fields, self.origin, (self.width, self.height), self.field_resolution]
+        return hashlib.sha1(json.dumps(layout).encode('utf-8')).hexdigest()
+
+
+# Outcome of a job: the graph file written, the seed actually used, the time of every phase
+# and the size of the result, or the traceback of the error the job failed with.
+class JobResult:
+    def __init__(self, name: str, path: str = None, seed: int = None, timings: dict = None,
+                 streamlines=0, nodes=0, edges=0, error: str = None):
+        self.name = name
+        self.path = path
+        self.seed = seed
+        self.timings = timings or {}
+        self.streamlines = streamlines
+        self.nodes = nodes
+        self.edges = edges
+        self.error = error
+
+
+# Headless generation of many road graphs, e.g. for sweeps over seeds and parameters, on a pool of
+# worker processes. The graph of every job is written as JSON to the output directory as soon as
+# it is finished, and the results are yielded in order of completion by 'run'.
+#
+# Rasters of the tensor field are cached as pickles in cache_directory, by default a subdirectory
+# of the output directory, and shared by all jobs with the same field layout and domain. Missing
+# rasters are built once, in parallel, before the jobs are started. Every worker keeps the raster
+# loaded last, so consecutive jobs of a layout do not even read it again. Jobs whose raster can not
+# be built are reported as failed, like any other failing job, and the rest of the batch still runs.
+class BatchRunner:
+    def __init__(self, jobs: list[GenerationJob], output_directory: str, workers: int = None,
+                 cache_directory: str = None):
+        names = [job.name for job in jobs]
+        if len(set(names)) != len(names):
+            raise ValueError("Names of the jobs of a batch must be unique")
+        self.jobs = jobs
+        self.output_directory = output_directory
+        self.workers = workers
+        self.cache_directory = cache_directory or os.path.join(output_directory, 'raster_cache')
+
+    def run(self):
+        os.makedirs(self.output_directory, exist_ok=True)
+        os.makedirs(self.cache_directory, exist_ok=True)
+
+        rasters = {}
+        for job in self.jobs:
+            key = job.raster_key()
+            if key is not None and not os.path.exists(raster_path(self.cache_directory, key)):
+                rasters.setdefault(key, job)
+
+        if self.workers == 1:
+            errors = {key: try_build_raster(job, self.cache_directory) for key, job in rasters.items()}
+            yield from self.report_raster_errors(errors)
+            for task in self.get_tasks(errors):
+                yield report(run_job(*task))
+            return
+
+        with ProcessPoolExecutor(self.workers) as executor:
+            futures = {
+                executor.submit(try_build_raster, job, self.cache_directory): key for key, job in rasters.items()
+            }
+            errors = {futures[future]: future.result() for future in as_completed(futures)}
+            yield from self.report_raster_errors(errors)
+            for future in as_completed([executor.submit(run_job, *task) for task in self.get_tasks(errors)]):
+                yield report(future.result())
+
+    # Jobs whose raster could not be built fail with the error of the raster, without being run.
+    def report_raster_errors(self, errors: dict):
+        for job in self.jobs:
+            error = errors.get(job.raster_key())
+            if error is not None:
+                yield report(JobResult(job.name, timings={'total': 0.0}, error=error))
+
+    def get_tasks(self, errors: dict):
+        return [
+            (job, self.output_directory, self.cache_directory)
+            for job in self.jobs if errors.get(job.raster_key()) is None
+        ]
+
+    def run_all(self) -> list[JobResult]:
+        return list(self.run())
+
+
+def raster_path(cache_directory, key):
+    return os.path.join(cache_directory, key + '.pickle')
+
+
+# Samples the raster of job and stores it in the cache. Written to a temporary file first, so
+# other processes never read a partially written raster.
+def build_raster(job: GenerationJob, cache_directory):
+    raster = TensorFieldRaster(
+        job.create_field(),
+        Vector(job.origin),
+        Vector((job.width, job.height)),
+        job.field_resolution
+    )
+    path = raster_path(cache_directory, job.raster_key())
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as f:
+        pickle.dump(raster, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+    return raster
+
+
+# Builds the raster of job, returning the traceback of the error if that fails, or None.
+def try_build_raster(job: GenerationJob, cache_directory):
+    try:
+        build_raster(job, cache_directory)
+    except Exception:
+        return f"Building the raster of the field failed:\n{traceback.format_exc()}"
+    return None
+
+
+# (key, raster) of the raster loaded last in this process.
+loaded_raster = (None, None)
+
+
+# Returns the raster of job from the cache, building it if missing, with the field of the job.
+def load_raster(job: GenerationJob, field: TensorField, cache_directory):
+    global loaded_raster
+    key = job.raster_key()
+    if loaded_raster[0] != key:
+        path = raster_path(cache_directory, key)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                raster = pickle.load(f)
+        else:
+            raster = build_raster(job, cache_directory)
+        loaded_raster = (key, raster)
+    raster = loaded_raster[1]
+    raster.field = field
+    return raster
+
+
+def run_job(job: GenerationJob, output_directory, cache_directory) -> JobResult:
+    timings = {}
+    start = time()
+    try:
+        field = job.create_field()
+        parameters = StreamlineParameters(**job.parameters)
+        integrator_class = AdaptiveIntegrator if job.adaptive else RK4Integrator
+        integrator = integrator_class(field, parameters)
+        if job.field_resolution is not None:
+            t = time()
+            integrator.raster = load_raster(job, field, cache_directory)
+            timings['raster'] = time() - t
+
+        generator = StreamlineGenerator(
+            integrator=integrator,
+            origin=Vector(job.origin),
+            world_dimensions=Vector((job.width, job.height)),
+            parameters=parameters,
+            seed=job.seed,
+            grid_class=GRID_CLASSES[job.grid]
+        )
+        if job.free_space_sampling:
+            generator.enable_free_space_sampling()
+
+        t = time()
+        generator.create_all_streamlines(job.batch_size)
+        timings['streamlines'] = time() - t
+
+        t = time()
+        graph = Graph(generator)
+        timings['graph'] = time() - t
+
+        t = time()
+        path = os.path.join(output_directory, job.name + '.json')
+        write_graph(graph, job, generator.seed, path)
+        timings['write'] = time() - t
+        timings['total'] = time() - start
+
+        return JobResult(job.name, path, generator.seed, timings,
+                         len(generator.all_streamlines), len(graph.nodes), len(graph.edges))
+    except Exception:
+        timings['total'] = time() - start
+        return JobResult(job.name, timings=timings, error=traceback.format_exc())
+
+
+# Writes the nodes and edges of graph as JSON, edges referring to the indices of their nodes and
+# holding all points of their section, alongside the job and the seed used.
+def write_graph(graph: Graph, job: GenerationJob, seed, path):
+    indices = {id(node): i for i, node in enumerate(graph.nodes)}
+    data = {
+        'job': job.to_dict(),
+        'seed': seed,
+        'nodes': [[node.co.x, node.co.y] for node in graph.nodes],
+        'edges': [
+            {
+                'start': indices[id(edge.start_node)],
+                'end': indices[id(edge.end_node)],
+                'major': edge.major,
+                'level': edge.level,
+                'points': [[p.x, p.y] for p in edge.connection]
+            }
+            for edge in graph.edges
+        ]
+    }
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(temporary_path, path)
+
+
+def report(result: JobResult) -> JobResult:
+    if result.error is not None:
+        print(f"Job {result.name} failed after {result.timings['total']:.2f}s:\n{result.error}")
+    else:
+        phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in result.timings.items() if phase != 'total')
+        print(f"Job {result.name} completed in {result.timings['total']:.2f}s ({phases}): "
+              f"{result.streamlines} streamlines, {result.nodes} nodes")
+    return result
+
+
+# Runs the jobs of a JSON file holding a list of GenerationJob arguments, e.g.
+#
+#   python -m roadGraphGen.roadGraphGen.batch_runner jobs.json output --workers 4
+def main():
+    parser = argparse.ArgumentParser(description="Headless batch generation of road graphs.")
+    parser.add_argument("jobs", help="JSON file with a list of job configurations")
+    parser.add_argument("output", help="directory the graphs are written to")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=None, help="raster cache directory")
+    args = parser.parse_args()
+
+    with open(args.jobs) as f:
+        jobs = [GenerationJob.from_dict(config) for config in json.load(f)]
+    t = time()
+    results = BatchRunner(jobs, args.output, args.workers, args.cache).run_all()
+    failed = sum(1 for result in results if result.error is not None)
+    print(f"\n{len(results) - failed} of {len(results)} jobs completed in {time() - t:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import math
+import numpy as np
+
+from roadGraphGen.roadGraphGen.grid_storage import StreamlinePointHash
+from roadGraphGen.roadGraphGen.polyline import Polyline
+
+
+# Traces streamlines of several seeds in lockstep. The forward and backward fronts of all
+# seeds are advanced together, one integration step per iteration, with integration, bounds
+# test, turn check and circle join detection evaluated on arrays of all fronts at once.
+# The grid validity of all new front points of an iteration is resolved in one batch.
+#
+# Front 2 * k is the forward and front 2 * k + 1 the backward front of seed k. Every front
+# records its points in a preallocated buffer, the streamline of seed k is the reversed
+# backward buffer followed by the forward buffer. Point i of the forward buffer lies i steps
+# from the seed, point i of the backward buffer -(i + 1) steps, which are the positions used
+# to detect a streamline colliding with itself.
+#
+# Fronts are only tested against the grids of the generator, streamlines traced in the same
+# batch do not see each other. Traced one after the other, a streamline would have been tested
+# against the earlier streamlines as well, so as soon as a streamline comes closer than dtest
+# (or its seed closer than dsep) to an earlier one of the batch, it and all later streamlines
+# are cut from the batch and stop tracing. The remaining streamlines are identical to the
+# streamlines traced one at a time.
+class LockstepTracer:
+    def __init__(self, generator):
+        self.generator = generator
+
+    # Returns the streamlines of the longest prefix of seeds that do not depend on each other.
+    def trace(self, seeds, majors, collide_both) -> list:
+        generator = self.generator
+        parameters = generator.parameters
+        n_seeds = len(seeds)
+        if n_seeds == 0:
+            return []
+
+        seed_points = np.array([(seed.x, seed.y) for seed in seeds], dtype=np.float64)
+        majors = np.asarray(majors, dtype=bool)
+        collide_both = np.asarray(collide_both, dtype=bool)
+        batch = BatchSamples(generator.parameters_sq, seed_points, majors, collide_both)
+
+        d = generator.integrator.integrate_points(seed_points, majors)
+        front_seeds = np.repeat(seed_points, 2, axis=0)
+        front_majors = np.repeat(majors, 2)
+        front_collide = np.repeat(collide_both, 2)
+        direction = np.repeat(d, 2, axis=0)
+        direction[1::2] *= -1
+        original_direction = direction.copy()
+        point = front_seeds + direction
+        valid = self.points_in_bounds(point)
+
+        # Per front: the seed (forward only), one point per iteration, the point rejected in the
+        # last iteration and the two circle join points of that same iteration.
+        buffer = np.empty((2 * n_seeds, parameters.path_iterations + 4, 2))
+        length = np.zeros(2 * n_seeds, dtype=int)
+        self.append(buffer, length, np.arange(0, 2 * n_seeds, 2), seed_points, batch)
+        point_hashes = [
+            StreamlinePointHash(generator.dcollideself_sq, generator.n_streamline_look_back)
+            for _ in range(n_seeds)
+        ]
+        for point_hash, (x, y) in zip(point_hashes, seed_points.tolist()):
+            point_hash.add(x, y, 0)
+
+        dcirclejoin_sq = generator.parameters_sq.dcirclejoin
+        escaped = np.zeros(n_seeds, dtype=bool)
+        active = valid[0::2] | valid[1::2]
+        for _ in range(parameters.path_iterations):
+            if not active.any():
+                break
+
+            fronts = np.flatnonzero(valid & np.repeat(active, 2))
+            self.add_to_hashes(point_hashes, fronts, point[fronts], self.positions(length, fronts))
+            self.append(buffer, length, fronts, point[fronts], batch)
+
+            next_direction = generator.integrator.integrate_points(point[fronts], front_majors[fronts])
+            moving = np.einsum('ij,ij->i', next_direction, next_direction) >= 0.01
+            flip = np.einsum('ij,ij->i', next_direction, direction[fronts]) < 0
+            next_direction[flip] *= -1
+            next_point = point[fronts] + next_direction
+
+            accepted = (
+                moving
+                & self.points_in_bounds(next_point)
+                & ~self.streamlines_turned(
+                    front_seeds[fronts], original_direction[fronts], next_point, next_direction)
+            )
+            accepted[accepted] = self.valid_samples(
+                next_point[accepted], front_majors[fronts][accepted], front_collide[fronts][accepted])
+            accepted[accepted] = ~self.self_collisions(
+                point_hashes, fronts[accepted], next_point[accepted], self.positions(length, fronts[accepted]))
+
+            point[fronts[accepted]] = next_point[accepted]
+            direction[fronts[accepted]] = next_direction[accepted]
+            rejected = moving & ~accepted
+            self.append(buffer, length, fronts[rejected], next_point[rejected], batch)
+            valid[fronts[~accepted]] = False
+
+            difference = point[0::2] - point[1::2]
+            sq_distance_between_points = np.einsum('ij,ij->i', difference, difference)
+            escaped |= active & (sq_distance_between_points > dcirclejoin_sq)
+            joined = np.flatnonzero(active & escaped & (sq_distance_between_points <= dcirclejoin_sq))
+            if len(joined):
+                self.append(buffer, length, 2 * joined, point[2 * joined], batch)
+                self.append(buffer, length, 2 * joined, point[2 * joined + 1], batch)
+                self.append(buffer, length, 2 * joined + 1, point[2 * joined + 1], batch)
+                active[joined] = False
+
+            active &= valid[0::2] | valid[1::2]
+            active[batch.cutoff:] = False
+
+        streamlines = []
+        for k in range(batch.cutoff):
+            points = np.concatenate((
+                buffer[2 * k + 1, :length[2 * k + 1]][::-1],
+                buffer[2 * k, :length[2 * k]]
+            ))
+            # Rounded to the single precision of the Vectors the points are used as.
+            streamlines.append(Polyline(points.astype(np.float32)))
+        return streamlines
+
+    def append(self, buffer, length, fronts, points, batch):
+        buffer[fronts, length[fronts]] = points
+        length[fronts] += 1
+        if len(seeds := fronts // 2) and len(batch.seeds) > 1:
+            batch.add_samples(seeds, points)
+
+    # Returns the positions along their streamlines of the next points appended to the fronts.
+    def positions(self, length, fronts) -> np.ndarray:
+        return np.where(fronts % 2 == 0, length[fronts], -(length[fronts] + 1))
+
+    def add_to_hashes(self, point_hashes, fronts, points, positions):
+        for front, (x, y), position in zip(fronts.tolist(), points.tolist(), positions.tolist()):
+            point_hashes[front // 2].add(x, y, position)
+
+    def self_collisions(self, point_hashes, fronts, points, positions) -> np.ndarray:
+        return np.array([
+            point_hashes[front // 2].collides(x, y, position)
+            for front, (x, y), position in zip(fronts.tolist(), points.tolist(), positions.tolist())
+        ], dtype=bool)
+
+    def points_in_bounds(self, points: np.ndarray) -> np.ndarray:
+        origin = self.generator.origin
+        world_dimensions = self.generator.world_dimensions
+        return (
+            (origin.x <= points[:, 0]) & (points[:, 0] < world_dimensions.x + origin.x)
+            & (origin.y <= points[:, 1]) & (points[:, 1] < world_dimensions.y + origin.y)
+        )
+
+    # Checks if the streamlines have turned more than 180 degrees, to find circles.
+    def streamlines_turned(self, seeds, original_directions, points, directions) -> np.ndarray:
+        perpendicular_vectors = np.stack((original_directions[:, 1], -original_directions[:, 0]), axis=1)
+        is_left = np.einsum('ij,ij->i', points - seeds, perpendicular_vectors) < 0
+        direction_up = np.einsum('ij,ij->i', directions, perpendicular_vectors) > 0
+        turning_back = np.einsum('ij,ij->i', original_directions, directions) < 0
+        return turning_back & (is_left == direction_up)
+
+    # Separation tests of the next points of all fronts, in one pass per direction.
+    def valid_samples(self, points, majors, collide_both) -> np.ndarray:
+        generator = self.generator
+        valid = np.ones(len(points), dtype=bool)
+        for major in [True, False]:
+            fronts = majors == major
+            if fronts.any():
+                valid[fronts] = generator.is_valid_samples(
+                    major, points[fronts], generator.parameters_sq.dtest, collide_both[fronts])
+        return valid
+
+
+# Samples of the streamlines traced in one batch, stored per direction in a sparse grid of
+# dtest sized cells, to find the first streamline of the batch that depends on an earlier one.
+# 'cutoff' is the index of that streamline, or the batch size.
+class BatchSamples:
+    def __init__(self, parameters_sq, seeds: np.ndarray, majors: np.ndarray, collide_both: np.ndarray):
+        self.dtest_sq = parameters_sq.dtest
+        self.dsep_sq = parameters_sq.dsep
+        self.cell_size = math.sqrt(parameters_sq.dtest)
+        self.seeds = seeds
+        self.majors = majors.tolist()
+        self.majors_array = majors
+        self.collide_both = collide_both.tolist()
+        self.any_collide_both = any(self.collide_both)
+        self.cells = {True: {}, False: {}}
+        self.cutoff = len(seeds)
+
+    def add_samples(self, seed_indices: np.ndarray, points: np.ndarray):
+        self.check_seeds(seed_indices, points)
+
+        for k, (x, y) in zip(seed_indices.tolist(), points.tolist()):
+            if k >= self.cutoff:
+                continue
+            major = self.majors[k]
+            cx = math.floor(x / self.cell_size)
+            cy = math.floor(y / self.cell_size)
+            self.check_cells(self.cells[major], k, x, y, cx, cy, True)
+            if self.any_collide_both:
+                self.check_cells(self.cells[not major], k, x, y, cx, cy, False)
+            self.cells[major].setdefault((cx, cy), []).append((x, y, k))
+
+    # Cuts the batch at any later seed closer than dsep to the points of a streamline.
+    def check_seeds(self, seed_indices: np.ndarray, points: np.ndarray):
+        difference = points[:, None, :] - self.seeds[None, :self.cutoff, :]
+        close = np.einsum('ijk,ijk->ij', difference, difference) < self.dsep_sq
+        later = seed_indices[:, None] < np.arange(self.cutoff)[None, :]
+        same_direction = self.majors_array[seed_indices][:, None] == self.majors_array[None, :self.cutoff]
+        dependent = np.flatnonzero((close & later & same_direction).any(axis=0))
+        if len(dependent):
+            self.cutoff = int(dependent[0])
+
+    def check_cells(self, cells, k, x, y, cx, cy, same_direction):
+        for i in range(cx - 1, cx + 2):
+            for j in range(cy - 1, cy + 2):
+                for sx, sy, other in cells.get((i, j), ()):
+                    if other == k or other >= self.cutoff:
+                        continue
+                    later = max(k, other)
+                    if not same_direction and not self.collide_both[later]:
+                        continue
+                    if (sx - x) ** 2 + (sy - y) ** 2 < self.dtest_sq:
+                        self.cutoff = later
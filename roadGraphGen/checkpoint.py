@@ -0,0 +1,186 @@
+import json
+import math
+import numpy as np
+
+from collections import deque
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.polyline import Polyline
+from roadGraphGen.roadGraphGen.seed_sampler import FreeSpaceSampler
+from roadGraphGen.roadGraphGen.tensor_field import as_point_array
+
+
+# Checkpoint file of the state of a StreamlineGenerator, to resume a long generation later.
+#
+# The file starts with MAGIC and the length of a JSON header, followed by the header and raw
+# little endian arrays, each aligned to ALIGNMENT bytes, so they can be read as memory mapped
+# views without copying. The header holds the scalar state, the parameters, the bit generator
+# state of the random generator and the dtype, shape and offset of every array.
+#
+# Streamlines, simplified streamlines, grid samples and candidate seeds are stored as float32
+# points, which is exactly the precision of mathutils Vectors all points are rounded to, so a
+# resumed generation continues exactly like one that was never interrupted.
+#
+# The tensor field and integrator are not part of the checkpoint, the generator loaded into
+# must be constructed with the same ones. Neither are grids linked by 'add_existing_streamlines',
+# the links of the generator loaded into are kept.
+MAGIC = b'RGGCKPT\x01'
+ALIGNMENT = 64
+
+
+def save_checkpoint(generator, path):
+    if generator.joining is not None:
+        raise ValueError("Can not save a checkpoint while dangling streamlines are joined")
+
+    arrays = {}
+    majors = {id(streamline) for streamline in generator.streamlines_major}
+    arrays['streamline_majors'] = np.array(
+        [id(streamline) in majors for streamline in generator.all_streamlines], dtype=bool)
+    arrays['streamline_points'], arrays['streamline_lengths'] = polylines_to_arrays(generator.all_streamlines)
+    arrays['simple_points'], arrays['simple_lengths'] = polylines_to_arrays(generator.all_streamlines_simple)
+    arrays['major_grid_points'], arrays['major_grid_counts'] = generator.major_grid.samples_to_arrays()
+    arrays['minor_grid_points'], arrays['minor_grid_counts'] = generator.minor_grid.samples_to_arrays()
+    arrays['candidate_seeds_major'] = points_to_array(generator.candidate_seeds_major)
+    arrays['candidate_seeds_minor'] = points_to_array(generator.candidate_seeds_minor)
+
+    sampler = generator.seed_sampler
+    if sampler is not None:
+        for major, name in [(True, 'major'), (False, 'minor')]:
+            arrays['sampler_blocked_' + name] = sampler.blocked[major]
+            arrays['sampler_failures_' + name] = sampler.failures[major]
+            arrays['sampler_free_' + name] = np.array(sampler.free[major], dtype=np.int64)
+
+    header = {
+        'origin': tuple(generator.origin),
+        'world_dimensions': tuple(generator.world_dimensions),
+        'seed': int(generator.seed),
+        'parameters': vars(generator.parameters),
+        'rng': generator.rng.bit_generator.state,
+        'seed_at_endpoints': generator.SEED_AT_ENDPOINTS,
+        'streamlines_done': generator.streamlines_done,
+        'last_streamline_major': generator.last_streamline_major,
+        'first_major': generator.first_major,
+        'first_minor': generator.first_minor,
+        'field_version': generator.field_version,
+        'sampler': None if sampler is None else (sampler.subdivisions, sampler.max_failures),
+        'arrays': {}
+    }
+
+    # Offsets are relative to the end of the header, whose length depends on them.
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+        arrays[name] = array
+        header['arrays'][name] = (array.dtype.str, array.shape, offset)
+        offset = aligned(offset + array.nbytes)
+
+    encoded = json.dumps(header).encode('utf-8')
+    data_start = aligned(len(MAGIC) + 8 + len(encoded))
+    encoded = encoded.ljust(data_start - len(MAGIC) - 8)
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(8, 'little'))
+        f.write(encoded)
+        for name, array in arrays.items():
+            f.seek(data_start + header['arrays'][name][2])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+
+
+# Replaces the state of generator by the state saved at path. The generator must have the same
+# domain as the saved one.
+def load_checkpoint(generator, path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a streamline generator checkpoint")
+        header_length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    data_start = len(MAGIC) + 8 + header_length
+
+    if (
+        tuple(header['origin']) != tuple(generator.origin)
+        or tuple(header['world_dimensions']) != tuple(generator.world_dimensions)
+    ):
+        raise ValueError(f"Domain of checkpoint {path} does not match the domain of the generator")
+
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {
+        name: np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=data, offset=data_start + offset)
+        for name, (dtype, shape, offset) in header['arrays'].items()
+    }
+
+    # Updated in place, as the integrator may share the parameters.
+    parameters = generator.parameters
+    vars(parameters).update(header['parameters'])
+    generator.parameters_sq = parameters.copy_sq()
+    generator.dcollideself_sq = (parameters.dcirclejoin / 2) ** 2
+    generator.n_streamline_step = math.floor(parameters.dcirclejoin / parameters.dstep)
+    generator.n_streamline_look_back = 2 * generator.n_streamline_step
+    generator.seed = header['seed']
+    generator.rng = np.random.default_rng(generator.seed)
+    generator.rng.bit_generator.state = header['rng']
+    generator.SEED_AT_ENDPOINTS = header['seed_at_endpoints']
+    generator.streamlines_done = header['streamlines_done']
+    generator.last_streamline_major = header['last_streamline_major']
+    generator.first_major = header['first_major']
+    generator.first_minor = header['first_minor']
+    generator.field_version = header['field_version']
+    generator.joining = None
+
+    generator.clear_streamlines()
+    streamlines = arrays_to_polylines(arrays['streamline_points'], arrays['streamline_lengths'])
+    for streamline, major in zip(streamlines, arrays['streamline_majors'].tolist()):
+        generator.streamlines(major).append(streamline)
+        generator.all_streamlines.append(streamline)
+    generator.all_streamlines_simple = deque(
+        deque(simple) for simple in arrays_to_polylines(arrays['simple_points'], arrays['simple_lengths']))
+
+    for major, name in [(True, 'major'), (False, 'minor')]:
+        grid = generator.grid_class(generator.world_dimensions, generator.origin, parameters.dsep)
+        grid.linked_grids = generator.grid(major).linked_grids
+        grid.set_samples(arrays[name + '_grid_points'], arrays[name + '_grid_counts'])
+        if major:
+            generator.major_grid = grid
+        else:
+            generator.minor_grid = grid
+    generator.candidate_seeds_major = deque(array_to_points(arrays['candidate_seeds_major']))
+    generator.candidate_seeds_minor = deque(array_to_points(arrays['candidate_seeds_minor']))
+
+    if header['sampler'] is None:
+        generator.seed_sampler = None
+    else:
+        sampler = FreeSpaceSampler(generator.origin, generator.world_dimensions, parameters.dsep, *header['sampler'])
+        for major, name in [(True, 'major'), (False, 'minor')]:
+            sampler.blocked[major] = np.array(arrays['sampler_blocked_' + name])
+            sampler.failures[major] = np.array(arrays['sampler_failures_' + name])
+            sampler.free[major] = arrays['sampler_free_' + name].tolist()
+        generator.seed_sampler = sampler
+
+
+def aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def points_to_array(points) -> np.ndarray:
+    return np.array([(p.x, p.y) for p in points], dtype=np.float32).reshape(-1, 2)
+
+
+def array_to_points(array: np.ndarray) -> list[Vector]:
+    return [Vector(p) for p in array.tolist()]
+
+
+# Concatenates the points of all polylines, returning the points and the length of every polyline.
+def polylines_to_arrays(polylines):
+    points = [as_point_array(polyline) for polyline in polylines]
+    points = np.concatenate(points).astype(np.float32) if points else np.zeros((0, 2), dtype=np.float32)
+    return points, np.array([len(polyline) for polyline in polylines], dtype=np.int64)
+
+
+def arrays_to_polylines(points: np.ndarray, lengths: np.ndarray) -> list[Polyline]:
+    polylines = []
+    start = 0
+    for length in lengths.tolist():
+        polylines.append(Polyline(points[start:start + length], slack=0))
+        start += length
+    return polylines
@@ -0,0 +1,177 @@
+import math
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.grid_storage import NumpyGridStorage
+from roadGraphGen.roadGraphGen.tensor_field import as_point_array
+
+
+# Raster of the distance from the center of every pixel to the nearest point added, capped at
+# 'max_distance'. Adding points stamps a disc of max_distance around them, lowering the distances
+# of the pixels inside it.
+#
+# The distance of a pixel less 'margin', half the diagonal of a pixel, is a lower bound of the
+# distance to the nearest point anywhere in the pixel, so a single lookup proves that a position
+# is clear of all points. Points of dense polylines are stamped with a stride, the distance to
+# the nearest stamped point being lowered by the largest distance of a skipped point to one, so
+# the lower bound still holds.
+class ClearanceRaster:
+    def __init__(self, origin: Vector, world_dimensions: Vector, cell_size, max_distance):
+        self.origin = origin.copy()
+        self.world_dimensions = world_dimensions.copy()
+        self.cell_size = cell_size
+        self.max_distance = max_distance
+        # Float32 rounding of the distances is covered by a small fraction of a pixel.
+        self.margin = cell_size * (math.sqrt(2) / 2 + 1e-3)
+        self.dimensions = (
+            max(1, math.ceil(world_dimensions.x / cell_size)),
+            max(1, math.ceil(world_dimensions.y / cell_size))
+        )
+
+        # Pixel offsets whose centers can lie within max_distance of a point in the center pixel.
+        r = math.ceil(max_distance / cell_size) + 1
+        offsets = np.arange(-r, r + 1)
+        grid_x, grid_y = np.meshgrid(offsets, offsets, indexing='ij')
+        offsets = np.stack((grid_x.ravel(), grid_y.ravel()), axis=1)
+        self.offsets = offsets[np.hypot(*(np.abs(offsets) - 1).clip(0).T) * cell_size <= max_distance]
+
+        self.clear()
+
+    def clear(self):
+        self.distances = np.full(self.dimensions, self.max_distance, dtype=np.float32)
+
+    # Lowers the distances of the pixels around the points of the polyline line.
+    def add_points(self, line):
+        points = as_point_array(line)
+        if len(points) == 0:
+            return
+        points, gap = self.stamped_points(points)
+
+        local = (points - (self.origin.x, self.origin.y)) / self.cell_size
+        pixels = np.floor(local).astype(int)[:, None, :] + self.offsets[None, :, :]
+        difference = (pixels + 0.5 - local[:, None, :]) * self.cell_size
+        distances = np.sqrt(np.einsum('ijk,ijk->ij', difference, difference)) - gap
+        inside = (
+            (pixels[..., 0] >= 0) & (pixels[..., 0] < self.dimensions[0])
+            & (pixels[..., 1] >= 0) & (pixels[..., 1] < self.dimensions[1])
+            & (distances < self.max_distance)
+        )
+        flat = pixels[inside][:, 0] * self.dimensions[1] + pixels[inside][:, 1]
+        np.minimum.at(self.distances.reshape(-1), flat, distances[inside].astype(np.float32))
+
+    # Every stride-th point of the polyline and its last point, with the largest distance of a
+    # skipped point to the nearest stamped point. Points closer than a quarter pixel barely
+    # change the distances.
+    def stamped_points(self, points: np.ndarray):
+        if len(points) < 3:
+            return points, 0.0
+        spacing = float(np.hypot(*np.diff(points, axis=0).T).mean())
+        stride = max(1, int(self.cell_size / 4 / spacing)) if spacing > 0 else 1
+        if stride == 1:
+            return points, 0.0
+        indices = np.arange(len(points))
+        before = indices - indices % stride
+        after = np.minimum(before + stride, len(points) - 1)
+        gap = np.minimum(
+            np.hypot(*(points - points[before]).T), np.hypot(*(points - points[after]).T)
+        ).max()
+        return np.concatenate((points[::stride], points[-1:])), float(gap)
+
+    # Lower bounds of the distances from the points to the nearest point added, 0 outside of the
+    # raster.
+    def get_clearance(self, points) -> np.ndarray:
+        points = as_point_array(points)
+        pixels = np.floor((points - (self.origin.x, self.origin.y)) / self.cell_size).astype(int)
+        inside = (
+            (pixels[:, 0] >= 0) & (pixels[:, 0] < self.dimensions[0])
+            & (pixels[:, 1] >= 0) & (pixels[:, 1] < self.dimensions[1])
+        )
+        clearance = np.zeros(len(points))
+        clearance[inside] = self.distances[pixels[inside, 0], pixels[inside, 1]] - self.margin
+        return clearance
+
+    # Whether all points added are at least distance away from (x, y).
+    def is_clear(self, x, y, distance) -> bool:
+        i = math.floor((x - self.origin.x) / self.cell_size)
+        j = math.floor((y - self.origin.y) / self.cell_size)
+        if i < 0 or j < 0 or i >= self.dimensions[0] or j >= self.dimensions[1]:
+            return False
+        return self.distances[i, j] - self.margin >= distance
+
+
+# NumpyGridStorage with a ClearanceRaster of its samples, with 'resolution' pixels per dsep.
+# Separation tests the raster proves to be valid take a single lookup, all others scan the
+# cells as before, so results are the same as of a NumpyGridStorage. Most tests of tracing are
+# valid, as streamlines mostly run clear of others, while those close to other streamlines fall
+# back to the scan.
+#
+# Distances are stamped up to dsep and half a pixel diagonal, the largest test distance, so
+# tests at dtest and dsep both use the raster. 'get_clearance' is a signal for seed selection,
+# see StreamlineGenerator.SEED_FARTHEST.
+#
+# Samples outside of the domain are kept in the first cell of the grid, where separation tests
+# of points near that cell see them, so those points always scan the cells once such samples
+# exist.
+class ClearanceGridStorage(NumpyGridStorage):
+    def __init__(self, world_dimensions: Vector, origin: Vector, dsep, capacity=16, resolution=4):
+        super().__init__(world_dimensions, origin, dsep, capacity)
+        cell_size = dsep / resolution
+        self.raster = ClearanceRaster(origin, world_dimensions, cell_size, dsep + cell_size)
+        self.samples_outside = False
+        # Points below both bounds may lie in the 2 x 2 cells around the first cell, with a margin
+        # for the single precision cells are computed in.
+        self.first_cells_bounds = (origin.x + 2.001 * dsep, origin.y + 2.001 * dsep)
+
+    def add_polyline(self, line):
+        points = as_point_array(line)
+        super().add_polyline(points)
+        self.add_to_raster(points)
+
+    def add_sample(self, v, coords=None):
+        super().add_sample(v, coords)
+        self.add_to_raster(np.array([(v.x, v.y)]))
+
+    def set_samples(self, points: np.ndarray, counts: np.ndarray):
+        super().set_samples(points, counts)
+        self.raster.clear()
+        self.samples_outside = False
+        self.add_to_raster(np.asarray(points, dtype=np.float64))
+
+    def add_to_raster(self, points: np.ndarray):
+        if len(points) == 0:
+            return
+        self.raster.add_points(points)
+        if not self.samples_outside:
+            self.samples_outside = bool(self.points_out_of_bounds(points).any())
+
+    def is_valid_sample(self, v, d_sq=None) -> bool:
+        if d_sq is None:
+            d_sq = self.dsep_sq
+        x = v.x
+        y = v.y
+        if not self.raster.is_clear(x, y, math.sqrt(d_sq)) or (self.samples_outside and self.near_first_cell(x, y)):
+            return super().is_valid_sample(v, d_sq)
+        return all(grid.is_valid_sample(v, d_sq) for grid in self.linked_grids)
+
+    def points_far_from_samples(self, points: np.ndarray, d_sq) -> np.ndarray:
+        clear = self.raster.get_clearance(points) >= math.sqrt(d_sq)
+        if self.samples_outside:
+            clear &= ~self.near_first_cell(points[:, 0], points[:, 1])
+        valid = np.ones(len(points), dtype=bool)
+        valid[~clear] = super().points_far_from_samples(points[~clear], d_sq)
+        return valid
+
+    # Whether points may lie in the cells whose separation tests see the samples outside of the
+    # domain. Points outside of the domain are never clear in the raster.
+    def near_first_cell(self, x, y):
+        return (x < self.first_cells_bounds[0]) & (y < self.first_cells_bounds[1])
+
+    # Lower bounds of the distances from the points to the nearest sample of this grid and of
+    # the linked grids with a raster, at most dsep and a pixel.
+    def get_clearance(self, points) -> np.ndarray:
+        clearance = self.raster.get_clearance(points)
+        for grid in self.linked_grids:
+            if isinstance(grid, ClearanceGridStorage):
+                clearance = np.minimum(clearance, grid.get_clearance(points))
+        return clearance
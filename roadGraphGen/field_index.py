@@ -0,0 +1,127 @@
+import math
+
+from mathutils import Vector
+
+
+# Spatial index of the influence discs of basis fields, used by the TensorField to only
+# evaluate the basis fields that can contribute to a sample.
+#
+# Each disc is registered in all cells of a sparse grid (a dict keyed by cell coordinates)
+# that its bounding box overlaps. Fields with an unbounded influence are kept separately and
+# returned for every query. Queries return fields in the order they were added, so sums
+# over the returned fields are evaluated in the same order as over all fields. 'order'
+# holds the position of each field in that order.
+class BasisFieldIndex:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.unbounded = []
+        self.radii = {}
+        self.order = {}
+        self.count = 0
+
+    def clear(self):
+        self.cells = {}
+        self.unbounded = []
+        self.radii = {}
+        self.order = {}
+        self.count = 0
+
+    def add(self, field, radius):
+        self.radii[field] = radius
+        self.order[field] = self.count
+        self.count += 1
+        self.register(field)
+
+    def remove(self, field):
+        if field not in self.radii:
+            return
+        self.unregister(field)
+        del self.radii[field]
+        position = self.order.pop(field)
+        self.count -= 1
+        for other, other_position in self.order.items():
+            if other_position > position:
+                self.order[other] = other_position - 1
+
+    # Re-registers field, e.g. after its center or size changed, keeping its position in the order.
+    def update(self, field, radius):
+        self.unregister(field)
+        self.radii[field] = radius
+        self.register(field)
+
+    def register(self, field):
+        radius = self.radii[field]
+        if math.isinf(radius):
+            self.unbounded.append(field)
+            return
+
+        position = self.order[field]
+        for key in self.get_cell_keys(field.center, radius):
+            cell = self.cells.setdefault(key, [])
+            cell.append(field)
+            # Fields re-registered by 'update' are not necessarily the last in order.
+            if len(cell) > 1 and self.order[cell[-2]] > position:
+                cell.sort(key=self.order.__getitem__)
+
+    def unregister(self, field):
+        radius = self.radii[field]
+        if math.isinf(radius):
+            self.unbounded.remove(field)
+            return
+
+        for key in self.get_cell_keys(field.center, radius):
+            cell = self.cells[key]
+            cell.remove(field)
+            if not cell:
+                del self.cells[key]
+
+    def get_cell_keys(self, center: Vector, radius):
+        min_x = math.floor((center.x - radius) / self.cell_size)
+        max_x = math.floor((center.x + radius) / self.cell_size)
+        min_y = math.floor((center.y - radius) / self.cell_size)
+        max_y = math.floor((center.y + radius) / self.cell_size)
+        return [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+    # Returns all fields whose influence disc contains point.
+    def query(self, point: Vector):
+        key = (math.floor(point.x / self.cell_size), math.floor(point.y / self.cell_size))
+        fields = [
+            field for field in self.cells.get(key, [])
+            if math.hypot(point.x - field.center.x, point.y - field.center.y) < self.radii[field]
+        ]
+        if self.unbounded:
+            fields.extend(self.unbounded)
+            fields.sort(key=self.order.__getitem__)
+        return fields
+
+    # Returns all fields whose influence disc overlaps the axis aligned box between min_v and max_v.
+    def query_box(self, min_v: Vector, max_v: Vector):
+        min_x = math.floor(min_v.x / self.cell_size)
+        max_x = math.floor(max_v.x / self.cell_size)
+        min_y = math.floor(min_v.y / self.cell_size)
+        max_y = math.floor(max_v.y / self.cell_size)
+
+        # Large boxes are cheaper to test against every field than to walk cell by cell.
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > len(self.radii):
+            candidates = self.radii.keys()
+        else:
+            candidates = {
+                field for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)
+                for field in self.cells.get((x, y), [])
+            }
+            candidates.update(self.unbounded)
+
+        fields = [field for field in candidates if self.disc_overlaps_box(field, min_v, max_v)]
+        return sorted(fields, key=self.order.__getitem__)
+
+    def disc_overlaps_box(self, field, min_v: Vector, max_v: Vector):
+        radius = self.radii[field]
+        if math.isinf(radius):
+            return True
+        dx = max(min_v.x - field.center.x, 0, field.center.x - max_v.x)
+        dy = max(min_v.y - field.center.y, 0, field.center.y - max_v.y)
+        return math.hypot(dx, dy) < radius
+
+    def get_radius(self, field):
+        return self.radii[field]
@@ -0,0 +1,179 @@
+import math
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.tensor import Tensor, TensorArray
+from roadGraphGen.roadGraphGen.tensor_field import TensorField, as_point_array
+
+
+# Precomputed raster of a TensorField over the domain given by origin and world dimensions.
+# The field is sampled once at the raster nodes, 'resolution' apart, and afterwards looked
+# up with bilinear interpolation, instead of summing all basis fields for every sample.
+#
+# The orientation is stored as the unit tensor components [cos(2 * theta), sin(2 * theta)],
+# which, unlike the eigenvectors, can be interpolated without sign ambiguity. Nodes where
+# the field is degenerate (r == 0) are stored as zero tensors.
+# Points outside of the domain are clamped to the border of the raster.
+#
+# After the tensor field changed, 'refresh' resamples only the tiles of tile_size x tile_size
+# nodes that overlap the region changed since the raster was last sampled.
+#
+# Origin and world dimensions are pickled as tuples, as mathutils Vectors can not be pickled.
+class TensorFieldRaster:
+    def __init__(self, field: TensorField, origin: Vector, world_dimensions: Vector, resolution, tile_size=32):
+        self.field = field
+        self.version = field.version
+        self.tile_size = tile_size
+        self.origin = origin.copy()
+        self.world_dimensions = world_dimensions.copy()
+        self.resolution = resolution
+        self.raster_dimensions = (
+            max(2, math.ceil(world_dimensions.x / resolution) + 1),
+            max(2, math.ceil(world_dimensions.y / resolution) + 1)
+        )
+        self.components = np.zeros((*self.raster_dimensions, 2))
+        self.update()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['origin'] = tuple(self.origin)
+        state['world_dimensions'] = tuple(self.world_dimensions)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.origin = Vector(self.origin)
+        self.world_dimensions = Vector(self.world_dimensions)
+
+    # Resamples the tensor field at all raster nodes.
+    def update(self):
+        self.version = self.field.version
+        self.components = self.sample_components(0, self.raster_dimensions[0], 0, self.raster_dimensions[1])
+        # Flat copies of the components, indexed by i * raster_dimensions[1] + j, as indexing
+        # python lists is considerably faster than indexing arrays for single point lookups.
+        self.cos_2theta = self.components[..., 0].ravel().tolist()
+        self.sin_2theta = self.components[..., 1].ravel().tolist()
+
+    # Resamples the tiles overlapping the region of the field changed since the last update.
+    # Returns the number of resampled nodes.
+    def refresh(self):
+        region = self.field.get_dirty_region(self.version)
+        self.version = self.field.version
+        if region is None:
+            return 0
+
+        min_i, max_i = self.get_tile_range(region[0], region[2], self.origin.x, self.raster_dimensions[0])
+        min_j, max_j = self.get_tile_range(region[1], region[3], self.origin.y, self.raster_dimensions[1])
+        if min_i >= max_i or min_j >= max_j:
+            return 0
+
+        block = self.sample_components(min_i, max_i, min_j, max_j)
+        self.components[min_i:max_i, min_j:max_j] = block
+        for i in range(min_i, max_i):
+            start = i * self.raster_dimensions[1]
+            self.cos_2theta[start + min_j:start + max_j] = block[i - min_i, :, 0].tolist()
+            self.sin_2theta[start + min_j:start + max_j] = block[i - min_i, :, 1].tolist()
+        return block.shape[0] * block.shape[1]
+
+    # Returns the node range [min, max) along one axis of all tiles overlapping [low, high].
+    def get_tile_range(self, low, high, origin, dimension):
+        low = math.floor(max(0.0, (low - origin) / self.resolution))
+        high = math.ceil(min(dimension - 1.0, (high - origin) / self.resolution))
+        if low > high:
+            return 0, 0
+        return (
+            low // self.tile_size * self.tile_size,
+            min(dimension, (high // self.tile_size + 1) * self.tile_size)
+        )
+
+    # Samples the unit tensor components at the nodes [min_i, max_i) x [min_j, max_j).
+    def sample_components(self, min_i, max_i, min_j, max_j):
+        r, theta, major, minor = self.field.sample_points(self.node_points(min_i, max_i, min_j, max_j))
+        components = np.zeros((len(r), 2))
+        nonzero = r != 0
+        components[nonzero, 0] = np.cos(2 * theta[nonzero])
+        components[nonzero, 1] = np.sin(2 * theta[nonzero])
+        return components.reshape(max_i - min_i, max_j - min_j, 2)
+
+    def node_points(self, min_i, max_i, min_j, max_j) -> np.ndarray:
+        xs = self.origin.x + np.arange(min_i, max_i) * self.resolution
+        ys = self.origin.y + np.arange(min_j, max_j) * self.resolution
+        grid_x, grid_y = np.meshgrid(xs, ys, indexing='ij')
+        return np.stack((grid_x.ravel(), grid_y.ravel()), axis=1)
+
+    # Returns the interpolated tensor components [cos(2 * theta), sin(2 * theta)] at point.
+    def interpolate(self, point: Vector):
+        gx = min(max((point.x - self.origin.x) / self.resolution, 0.0), self.raster_dimensions[0] - 1)
+        gy = min(max((point.y - self.origin.y) / self.resolution, 0.0), self.raster_dimensions[1] - 1)
+        i = min(int(gx), self.raster_dimensions[0] - 2)
+        j = min(int(gy), self.raster_dimensions[1] - 2)
+        fx = gx - i
+        fy = gy - j
+
+        k00 = i * self.raster_dimensions[1] + j
+        k10 = k00 + self.raster_dimensions[1]
+        c = self.cos_2theta
+        s = self.sin_2theta
+        return (
+            (c[k00] * (1 - fx) + c[k10] * fx) * (1 - fy) + (c[k00 + 1] * (1 - fx) + c[k10 + 1] * fx) * fy,
+            (s[k00] * (1 - fx) + s[k10] * fx) * (1 - fy) + (s[k00 + 1] * (1 - fx) + s[k10 + 1] * fx) * fy
+        )
+
+    def sample_point(self, point: Vector) -> Tensor:
+        c, s = self.interpolate(point)
+        if c == 0 and s == 0:
+            return Tensor.zero()
+        return Tensor(1, [c, s])
+
+    def sample_field_vector(self, point: Vector, major: bool) -> Vector:
+        c, s = self.interpolate(point)
+        if c == 0 and s == 0:
+            return Vector((0.0, 0.0))
+        theta = math.atan2(s, c) / 2
+        if not major:
+            theta += math.pi / 2
+        return Vector((math.cos(theta), math.sin(theta)))
+
+    # Batch variants of 'sample_point', like TensorField.sample_points/sample_tensors.
+    # 'r' is the magnitude of the interpolated components.
+    def sample_points(self, points):
+        tensors = self.sample_tensors(points)
+        return tensors.r, tensors.theta, tensors.get_major(), tensors.get_minor()
+
+    def sample_tensors(self, points) -> TensorArray:
+        points = as_point_array(points)
+        gx = np.clip((points[:, 0] - self.origin.x) / self.resolution, 0.0, self.raster_dimensions[0] - 1)
+        gy = np.clip((points[:, 1] - self.origin.y) / self.resolution, 0.0, self.raster_dimensions[1] - 1)
+        i = np.minimum(gx.astype(int), self.raster_dimensions[0] - 2)
+        j = np.minimum(gy.astype(int), self.raster_dimensions[1] - 2)
+        fx = (gx - i)[:, None]
+        fy = (gy - j)[:, None]
+
+        c = self.components
+        matrix = (
+            (c[i, j] * (1 - fx) + c[i + 1, j] * fx) * (1 - fy)
+            + (c[i, j + 1] * (1 - fx) + c[i + 1, j + 1] * fx) * fy
+        )
+        return TensorArray(np.hypot(matrix[:, 0], matrix[:, 1]), matrix)
+
+    # Returns the maximum angle (radians) between the major eigenvectors of the raster and the
+    # analytic field, tested on a lattice with 'samples_per_cell' points along each cell axis.
+    # Close to degenerate points of the field (e.g. radial centers) the error is large at any
+    # resolution, 'quantile' < 1 returns the respective quantile of the error instead.
+    def max_angular_error(self, samples_per_cell=2, quantile=1.0):
+        step = self.resolution / samples_per_cell
+        xs = self.origin.x + np.arange(0, self.world_dimensions.x + step / 2, step)
+        ys = self.origin.y + np.arange(0, self.world_dimensions.y + step / 2, step)
+        grid_x, grid_y = np.meshgrid(xs, ys, indexing='ij')
+        points = np.stack((grid_x.ravel(), grid_y.ravel()), axis=1)
+
+        r_raster, theta_raster, _, _ = self.sample_points(points)
+        r_field, theta_field, _, _ = self.field.sample_points(points)
+        valid = (r_raster != 0) & (r_field != 0)
+        if not valid.any():
+            return 0.0
+
+        # Eigenvectors have no sign, so angles are compared modulo pi.
+        difference = np.abs(theta_raster[valid] - theta_field[valid]) % math.pi
+        return float(np.quantile(np.minimum(difference, math.pi - difference), quantile))
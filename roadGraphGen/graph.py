@@ -70,6 +70,8 @@ class UndirectedEdge(Edge):
         self._direction = None
         self._direction_backwards = None
         self.major = False
+        # Road level of the streamline of the edge, see StreamlineHierarchy.
+        self.level = 0
 
     def set_directed_edges(self, edges: list['DirectedEdge']):
         self.directed_edges = edges
@@ -120,8 +122,14 @@ class DirectedEdge(Edge):
 # Intersection detection uses brute-force implementation, testing all streamline segments against each other.
 # Graph generation is based on simplified streamlines by default. Using the complex streamlines as a base
 # takes a very long time with the current implementation.
+#
+# A StreamlineHierarchy can be given instead of a StreamlineGenerator, the edges are tagged with the road
+# level of their streamline.
+#
+# With incremental=True the graph is not generated on construction, but by exhausting 'generate_steps',
+# which yields after every streamline and phase, so generation can be spread over several calls.
 class Graph():
-    def __init__(self, streamlines: StreamlineGenerator, complex=False):
+    def __init__(self, streamlines: StreamlineGenerator, complex=False, incremental=False):
         self.streamlines = streamlines
         self.all_streamlines = streamlines.all_streamlines if complex else streamlines.all_streamlines_simple
         streamline_sections = deque([])
@@ -133,12 +141,24 @@ class Graph():
         self.directed_border_edges: list[DirectedEdge] = []
         self.edges: list[UndirectedEdge] = []
         self.border_edges: list[UndirectedEdge] = []
-        self.generate_graph()
+        if not incremental:
+            self.generate_graph()
 
     def generate_graph(self):
-        self.generate_streamline_sections()
+        for _ in self.generate_steps():
+            pass
+
+    # Generates the graph step by step, yielding (done, total) after the sections of every streamline,
+    # after the nodes and after the border connections.
+    def generate_steps(self):
+        total = len(self.all_streamlines) + 2
+        for i in range(len(self.all_streamlines)):
+            self.generate_streamline_section(i)
+            yield i + 1, total
         self.generate_nodes()
+        yield total - 1, total
         self.add_border_connections()
+        yield total, total
 
     # Find intersections along each streamline and split streamline into sections at intersection points.
     # Original streamlines are preserved, turns representation of streamlines from polylines to sections
@@ -149,47 +169,50 @@ class Graph():
     # Depending on the magnitute of the segment, multiple other streamlines can intersect the same segment.
     def generate_streamline_sections(self):
         for i in range(len(self.all_streamlines)):
-            streamline = self.all_streamlines[i]
-            section = deque([streamline[0]])
-            # Extend start of streamline slightly, to check for T-intersection.
-            # Also tests for intersections with itself, which can happen in the current implementation,
-            # probably due to inaccuracies in the current integration around circular elements in the tensor field.
-            if not (self.streamline_is_circle(streamline) or self.point_on_world_border(streamline[0])):
-                direction = streamline[0] - streamline[1]
+            self.generate_streamline_section(i)
+
+    def generate_streamline_section(self, i):
+        streamline = self.all_streamlines[i]
+        section = deque([streamline[0]])
+        # Extend start of streamline slightly, to check for T-intersection.
+        # Also tests for intersections with itself, which can happen in the current implementation,
+        # probably due to inaccuracies in the current integration around circular elements in the tensor field.
+        if not (self.streamline_is_circle(streamline) or self.point_on_world_border(streamline[0])):
+            direction = streamline[0] - streamline[1]
+            direction.normalize()
+            segment_end = streamline[0] + (direction * self.streamlines.parameters.dstep * 1.5)
+            segment_start = streamline[0]
+            intersections = self.find_intersections(segment_start, segment_end, streamline, -1)
+            if intersections:
+                section.appendleft(intersections[0])
+        # Test each segment of the streamline for intersections.
+        for j in range(len(streamline) - 1):
+            segment_start = streamline[j]
+            segment_end = streamline[j + 1]
+            intersections = self.find_intersections(segment_start, segment_end, streamline, j)
+            if intersections:
+                for intersection in intersections:
+                    section.append(intersection)
+                    self.streamline_sections[i].append(section)
+                    section = deque([intersection])
+                section.append(segment_end)
+            else:
+                section.append(segment_end)
+        # Join start and end section of circular streamlines, if they should connect.
+        if self.streamline_is_circle(self.all_streamlines[i]) and self.streamline_sections[i]:
+            section.pop()
+            self.streamline_sections[i][0].extendleft(reversed(section))
+        else:
+            # Extend end of streamline slightly, to check for T-intersections.
+            if not self.point_on_world_border(streamline[-1]):
+                direction = streamline[-1] - streamline[-2]
                 direction.normalize()
-                segment_end = streamline[0] + (direction * self.streamlines.parameters.dstep * 1.5)
-                segment_start = streamline[0]
-                intersections = self.find_intersections(segment_start, segment_end, streamline, -1)
-                if intersections:
-                    section.appendleft(intersections[0])
-            # Test each segment of the streamline for intersections.
-            for j in range(len(streamline) - 1):
-                segment_start = streamline[j]
-                segment_end = streamline[j + 1]
-                intersections = self.find_intersections(segment_start, segment_end, streamline, j)
+                segment_end = streamline[-1] + (direction * self.streamlines.parameters.dstep * 1.5)
+                segment_start = streamline[-1]
+                intersections = self.find_intersections(segment_start, segment_end, streamline, len(streamline) - 2)
                 if intersections:
-                    for intersection in intersections:
-                        section.append(intersection)
-                        self.streamline_sections[i].append(section)
-                        section = deque([intersection])
-                    section.append(segment_end)
-                else:
-                    section.append(segment_end)
-            # Join start and end section of circular streamlines, if they should connect.
-            if self.streamline_is_circle(self.all_streamlines[i]) and self.streamline_sections[i]:
-                section.pop()
-                self.streamline_sections[i][0].extendleft(reversed(section))
-            else:
-                # Extend end of streamline slightly, to check for T-intersections.
-                if not self.point_on_world_border(streamline[-1]):
-                    direction = streamline[-1] - streamline[-2]
-                    direction.normalize()
-                    segment_end = streamline[-1] + (direction * self.streamlines.parameters.dstep * 1.5)
-                    segment_start = streamline[-1]
-                    intersections = self.find_intersections(segment_start, segment_end, streamline, len(streamline) - 2)
-                    if intersections:
-                        section.append(intersections[0])
-                self.streamline_sections[i].append(section)
+                    section.append(intersections[0])
+            self.streamline_sections[i].append(section)
 
     # Finds intersections of given segment, denoted by segment_start and segment_end, and all other segments.
     # Skips segments on the same streamline and connected to the given segment.
@@ -236,7 +259,8 @@ class Graph():
         tolerance = dstep / 2
         origin = self.streamlines.origin
         dimensions = self.streamlines.world_dimensions
-        for streamline in self.streamline_sections:
+        levels = self.streamlines.streamline_levels
+        for level, streamline in zip(levels, self.streamline_sections):
             for section in streamline:
                 start = section[0]
                 start_node = None
@@ -283,6 +307,7 @@ class Graph():
                 end_node.add_neighbor(end_neighbor)
 
                 edge = UndirectedEdge(start_node, end_node, section)
+                edge.level = level
                 self.edges.append(edge)
                 start_node.add_edge(edge)
                 end_node.add_edge(edge)
@@ -373,7 +398,7 @@ class Graph():
         direction = endpoint - previous_point
         direction.normalize()
         endpoint_extension = endpoint + (direction * self.streamlines.parameters.dstep * 1.5)
-        if any([endpoint is segment_start, endpoint is segment_end]):
+        if any([endpoint == segment_start, endpoint == segment_end]):
             return None
         return geometry.intersect_line_line_2d(segment_start, segment_end, endpoint_extension, endpoint)
 
@@ -1,21 +1,39 @@
 import bmesh
 import bpy
+import math
 
 from mathutils import Vector
 from time import time
 
+from roadGraphGen.roadGraphGen.field_raster import TensorFieldRaster
 from roadGraphGen.roadGraphGen.graph import Graph
-from roadGraphGen.roadGraphGen.integrator import RK4Integrator
+from roadGraphGen.roadGraphGen.grid_storage import GridStorage
+from roadGraphGen.roadGraphGen.integrator import AdaptiveIntegrator, RK4Integrator
+from roadGraphGen.roadGraphGen.parallel import ParallelStreamlineGenerator
 from roadGraphGen.roadGraphGen.streamline_parameters import StreamlineParameters
 from roadGraphGen.roadGraphGen.streamlines import StreamlineGenerator
 from roadGraphGen.roadGraphGen.tensor_field import TensorField
 
 
 class RGG_GraphGenerator():
-    def __init__(self, width: int = 100, height: int = 100, seed: int = -1):
+    def __init__(self, width: int = 100, height: int = 100, seed: int = -1, field_resolution: float = None,
+                 batch_size: int = None, adaptive: bool = False, workers: int = None,
+                 free_space_sampling: bool = False, grid_class=GridStorage):
         # Create new global TensorField.
         self.field = TensorField()
 
+        # Spacing of the precomputed tensor field raster used by the integrator. The analytic
+        # tensor field is sampled directly if no resolution is given.
+        self.field_resolution = field_resolution
+
+        # Number of streamlines traced together by the lockstep tracer, see
+        # StreamlineGenerator.create_all_streamlines. Streamlines are traced one by one if None.
+        self.batch_size = batch_size
+
+        # Number of worker processes tracing tiles of the domain in parallel, see
+        # ParallelStreamlineGenerator. Streamlines are traced in this process if None.
+        self.workers = workers
+
         # Create new StreamlineParameters. Values used here are derived from testing and seem like a good baseline.
         self.parameters = StreamlineParameters(
             dsep=100,
@@ -30,23 +48,57 @@ class RGG_GraphGenerator():
             collide_early=0,
         )
 
-        # Create new RK4Integrator with tensor field and parameters as input.
-        self.integrator = RK4Integrator(
+        # Create new RK4Integrator with tensor field and parameters as input, or an adaptive
+        # integrator, which takes considerably fewer samples of the field.
+        integrator_class = AdaptiveIntegrator if adaptive else RK4Integrator
+        self.integrator = integrator_class(
             self.field,
             self.parameters
         )
 
         # Create new StreamlineGenerator with integrator, parameters, and origin + world dimensions as input variables.
         # Current testing shows that integer values based on common screen sizes work well.
+        # Samples are stored in grids of grid_class, e.g. the faster NumpyGridStorage.
         self.generator = StreamlineGenerator(
             integrator=self.integrator,
             origin=Vector((519, 249)),
             world_dimensions=Vector((width, height)),
             parameters=self.parameters,
-            seed=seed
+            seed=seed,
+            grid_class=grid_class
         )
 
+        # Draw seeds only from free space, until none is left, instead of rejecting random points.
+        if free_space_sampling:
+            self.generator.enable_free_space_sampling()
+
+        # State of a time sliced generation, see 'start' and 'step'.
+        self.steps = None
+        self.progress = None
+
     def generate(self, with_visualization: bool = True):
+        for _ in self.generate_steps(with_visualization):
+            pass
+
+    # Starts a time sliced generation, which is advanced by calls of 'step'.
+    def start(self, with_visualization: bool = True):
+        self.steps = self.generate_steps(with_visualization)
+        self.progress = ('field', 0, None)
+
+    # Advances the generation started by 'start' for about budget_ms milliseconds, at least by one
+    # step. Returns False once the generation is finished. The current (phase, done, total) is
+    # stored in 'progress', total being None while it is not known yet.
+    def step(self, budget_ms: float = 20):
+        end = time() + budget_ms / 1000
+        for progress in self.steps:
+            self.progress = progress
+            if time() >= end:
+                return True
+        return False
+
+    # Generates the graph step by step, yielding the progress as (phase, done, total) after every
+    # streamline of the 'streamlines' and every step of the 'graph' phase.
+    def generate_steps(self, with_visualization: bool = True):
         print(f"\n\n--- Start graph generation of size {int(self.generator.world_dimensions[0])} x "
               f"{int(self.generator.world_dimensions[1])} with seed {self.generator.seed} ---")
 
@@ -55,21 +107,53 @@ class RGG_GraphGenerator():
         self.field.add_grid(Vector((1181, 988)), 1500, 35, -1.283775)
         self.field.add_radial(Vector((800, 888)), 750, 55)
 
+        if self.field_resolution is not None:
+            t = time()
+
+            self.integrator.raster = TensorFieldRaster(
+                self.field,
+                self.generator.origin,
+                self.generator.world_dimensions,
+                self.field_resolution
+            )
+
+            print(f"\nRasterization of tensor field completed in {time() - t:.2f}s")
+            print(f"Angular error of raster: maximum "
+                  f"{math.degrees(self.integrator.raster.max_angular_error()):.3f} degrees, 99th percentile "
+                  f"{math.degrees(self.integrator.raster.max_angular_error(quantile=0.99)):.3f} degrees")
+        yield 'field', 1, 1
+
         # Generate all streamlines.
         print("\n- Start generation of streamlines -")
 
         t = time()
 
-        self.generator.create_all_streamlines()
+        if self.workers is not None:
+            # About two tiles per worker, to balance the load of sparse and dense tiles.
+            tiles_per_axis = math.ceil(math.sqrt(2 * self.workers))
+            ParallelStreamlineGenerator(
+                self.generator,
+                tiles=(tiles_per_axis, tiles_per_axis),
+                workers=self.workers
+            ).create_all_streamlines(self.batch_size)
+        elif self.batch_size is not None:
+            self.generator.create_all_streamlines(self.batch_size)
+        else:
+            self.generator.start_streamlines()
+            while self.generator.update():
+                yield 'streamlines', len(self.generator.all_streamlines), None
 
         print(f"Generation of streamlines completed in {time() - t:.2f}s")
+        yield 'streamlines', len(self.generator.all_streamlines), len(self.generator.all_streamlines)
 
         # Generate graph from generated streamlines.
         print("\n- Start generation of graph -")
 
         t = time()
 
-        self.graph = Graph(self.generator)
+        self.graph = Graph(self.generator, incremental=True)
+        for done, total in self.graph.generate_steps():
+            yield 'graph', done, total
 
         print(f"Generation of graph completed in {time() - t:.2f}s")
 
@@ -79,10 +163,28 @@ class RGG_GraphGenerator():
             t = time()
 
             self.visualize_edges()
+            yield 'visualization', 1, 2
             self.visualize_nodes()
+            yield 'visualization', 2, 2
 
             print(f"Visualization of graph completed in {time() - t:.2f}s")
 
+    # Regenerates the graph after the tensor field has been edited, retracing only the streamlines
+    # passing through the changed region.
+    def regenerate(self, with_visualization: bool = True):
+        t = time()
+
+        if not self.generator.retrace_changed_region(self.batch_size):
+            return
+
+        print(f"Retracing of streamlines completed in {time() - t:.2f}s")
+
+        self.graph = Graph(self.generator)
+
+        if with_visualization:
+            self.visualize_edges()
+            self.visualize_nodes()
+
     # Turn streamline sections of the graph into curves to visualize in Blender.
     def visualize_edges(self, prefix=''):
         try:
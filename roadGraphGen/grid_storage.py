@@ -1,14 +1,29 @@
 import math
+import numpy as np
 
+from array import array
+from collections import deque
 from mathutils import Vector
 
+from roadGraphGen.roadGraphGen.tensor_field import as_point_array
+
 
 # Cartesian grid data structure based on the open source implementation of ProbableTrain.
 # Used to find nearby points and check separation distance, by dividing domain into grid
 # of cells containing points.
 #
-# - Note: would like to replace this with a proper spatial index that could then be used
-#   for improved intersection detection as well (Quadtree, [Hilbert] R-Tree, PH-Tree).
+# - Note: spatial_index.QuadtreeStorage is a drop-in replacement on a quadtree, whose index
+#   stores polyline segments as well, e.g. for intersection detection.
+#
+# 'extend' links the grid to other grids, e.g. of coarser road levels, without copying their
+# samples: validity tests and nearby point queries cover the samples of linked grids as well.
+#
+# Cells store the coordinates of their samples as flat float64 arrays [x0, y0, x1, y1, ...],
+# rather than the Vectors added, which take several times the memory.
+#
+# 'is_valid_samples' tests many points at once against all samples ordered by cell, which are
+# gathered again after samples have been added, so it suits many tests between additions, e.g.
+# of the fronts of a batch, rather than single tests after every streamline, e.g. of seeds.
 class GridStorage:
     def __init__(self, world_dimensions: Vector, origin: Vector, dsep):
         # Grid assumes origin point (0.0, 0.0).
@@ -18,26 +33,69 @@ class GridStorage:
         self.dsep = dsep
         self.dsep_sq = self.dsep ** 2
         self.grid_dimensions = Vector((world_dimensions.x / dsep, world_dimensions.y / dsep))
+        # Number of cells along x and y.
+        self.grid_shape = (math.ceil(self.grid_dimensions.x), math.ceil(self.grid_dimensions.y))
         self.grid = []
-        for x in range(0, math.ceil(self.grid_dimensions.x)):
+        for x in range(0, self.grid_shape[0]):
             self.grid.append([])
-            for y in range(0, math.ceil(self.grid_dimensions.y)):
-                self.grid[x].append([])
+            for y in range(0, self.grid_shape[1]):
+                self.grid[x].append(array('d'))
+        # Samples of cells as (N, 2) arrays, built on demand by 'get_cell_array' and dropped
+        # when a sample is added to the cell.
+        self.cell_arrays = {}
+        # Samples of all cells for 'is_valid_samples', built on demand by 'get_sample_index' and
+        # dropped when a sample is added.
+        self.sample_index = None
+        self.linked_grids: list[GridStorage] = []
+
+    # Links grid_storage to this grid. Samples added to it later are seen by this grid as well.
+    def extend(self, grid_storage: 'GridStorage'):
+        if grid_storage is not self and grid_storage not in self.linked_grids:
+            self.linked_grids.append(grid_storage)
 
-    def add_all(self, grid_storage):
-        for row in grid_storage.grid:
-            for cell in row:
-                for sample in cell:
-                    self.add_sample(sample)
+    def add_all(self, grid_storage: 'GridStorage'):
+        self.add_polyline(grid_storage.samples_to_arrays()[0])
 
+    # Adds all points of line, a sequence of Vectors or a Polyline.
     def add_polyline(self, line):
-        for v in line:
-            self.add_sample(v)
+        points = as_point_array(line)
+        cells = self.get_point_cells(points)
+        for (x, y), (i, j) in zip(points.tolist(), cells.tolist()):
+            cell = self.grid[i][j]
+            cell.append(x)
+            cell.append(y)
+            self.cell_arrays.pop((i, j), None)
+        self.sample_index = None
+
+    # Returns all samples as an array of points, ordered by cell, and the number of samples of
+    # every cell, cells ordered by x, then y.
+    def samples_to_arrays(self):
+        cells = [cell for row in self.grid for cell in row]
+        points = np.frombuffer(b''.join(cell.tobytes() for cell in cells), dtype=np.float64)
+        counts = [len(cell) // 2 for cell in cells]
+        return points.reshape(-1, 2), np.array(counts, dtype=np.int64)
+
+    # Replaces all samples by the samples of the arrays returned by 'samples_to_arrays'.
+    def set_samples(self, points: np.ndarray, counts: np.ndarray):
+        coordinates = np.ascontiguousarray(points, dtype=np.float64).ravel()
+        start = 0
+        counts = iter(counts.tolist())
+        for row in self.grid:
+            for y in range(len(row)):
+                count = 2 * next(counts)
+                row[y] = array('d', coordinates[start:start + count].tobytes())
+                start += count
+        self.cell_arrays.clear()
+        self.sample_index = None
 
     def add_sample(self, v, coords=None):
         if coords is None:
             coords = self.get_sample_coords(v)
-        self.grid[int(coords.x)][int(coords.y)].append(v)
+        cell = self.grid[int(coords.x)][int(coords.y)]
+        cell.append(v.x)
+        cell.append(v.y)
+        self.cell_arrays.pop((int(coords.x), int(coords.y)), None)
+        self.sample_index = None
 
     def is_valid_sample(self, v, d_sq=None) -> bool:
         if d_sq is None:
@@ -50,29 +108,139 @@ class GridStorage:
                 if not self.vector_out_of_bounds(cell, self.grid_dimensions):
                     if not self.vector_far_from_vectors(v, self.grid[int(cell.x)][int(cell.y)], d_sq):
                         return False
-        return True
+        return all(grid.is_valid_sample(v, d_sq) for grid in self.linked_grids)
 
     # called every integration step
-    def vector_far_from_vectors(self, v, vectors, d_sq) -> bool:
-        for sample in vectors:
-            if sample != v:
-                distance_sq = (sample.x - v.x) ** 2 + (sample.y - v.y) ** 2
+    def vector_far_from_vectors(self, v, cell, d_sq) -> bool:
+        x = v.x
+        y = v.y
+        for i in range(0, len(cell), 2):
+            sx = cell[i]
+            sy = cell[i + 1]
+            if sx != x or sy != y:
+                distance_sq = (sx - x) ** 2 + (sy - y) ** 2
                 if distance_sq < d_sq:
                     return False
         return True
 
+    # 'is_valid_sample' of all points of an (N, 2) array at once, as a boolean mask. Points are
+    # tested in the single precision of Vectors, so the mask equals the results of
+    # 'is_valid_sample(Vector(point))'.
+    def is_valid_samples(self, points, d_sq=None) -> np.ndarray:
+        if d_sq is None:
+            d_sq = self.dsep_sq
+        points = as_point_array(points).astype(np.float32).astype(np.float64)
+        valid = self.points_far_from_samples(points, d_sq)
+        for grid in self.linked_grids:
+            valid &= grid.is_valid_samples(points, d_sq)
+        return valid
+
+    # Whether every point is at least sqrt(d_sq) away from all samples of the 3 x 3 cells around
+    # its cell other than those equal to it. The points still valid are paired with all samples of
+    # each of the surrounding cells in turn, their own cell first, so all distances of a cell
+    # offset are computed at once.
+    def points_far_from_samples(self, points: np.ndarray, d_sq) -> np.ndarray:
+        valid = np.ones(len(points), dtype=bool)
+        if len(points) == 0:
+            return valid
+        cells = self.get_point_cells(points)
+        for offset in [(0, 0), *((x, y) for x in range(-1, 2) for y in range(-1, 2) if x or y)]:
+            active = np.flatnonzero(valid)
+            samples, starts, counts = self.get_cell_samples(cells[active] + offset)
+            queries = np.repeat(active, counts)
+            if len(queries) == 0:
+                continue
+            # Index of the samples of every pair, the samples of a cell being consecutive.
+            first = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+            difference = samples[first + np.arange(len(queries))] - points[queries]
+            dx = difference[:, 0]
+            dy = difference[:, 1]
+            too_close = (dx * dx + dy * dy < d_sq) & ((dx != 0) | (dy != 0))
+            valid[queries[too_close]] = False
+        return valid
+
+    # Samples of 'get_sample_index' with the index of the first sample and the number of samples
+    # of each of cells, an (N, 2) array, cells outside of the grid having no samples.
+    def get_cell_samples(self, cells: np.ndarray):
+        samples, starts, counts = self.get_sample_index()
+        inside = (cells[:, 0] >= 0) & (cells[:, 1] >= 0) & (cells[:, 0] < self.grid_shape[0]) & (
+            cells[:, 1] < self.grid_shape[1])
+        flat = np.where(inside, cells[:, 0] * self.grid_shape[1] + cells[:, 1], 0)
+        return samples, starts[flat], np.where(inside, counts[flat], 0)
+
+    # All samples ordered by cell, with the index of the first sample and the number of samples
+    # of every cell, as returned by 'samples_to_arrays'.
+    def get_sample_index(self):
+        if self.sample_index is None:
+            samples, counts = self.samples_to_arrays()
+            self.sample_index = (samples, np.cumsum(counts) - counts, counts)
+        return self.sample_index
+
     def get_nearby_points(self, v, distance):
-        radius = math.ceil((distance / self.dsep) - 0.5)
+        radius = max(1, math.ceil((distance / self.dsep) - 0.5))
         coords = self.get_sample_coords(v)
         out = []
         for x in range(-1 * radius, 1 * radius + 1):
             for y in range(-1 * radius, 1 * radius + 1):
                 cell = Vector((coords.x + x, coords.y + y))
                 if not self.vector_out_of_bounds(cell, self.grid_dimensions):
-                    for v2 in self.grid[int(cell.x)][int(cell.y)]:
-                        out.append(v2)
+                    samples = self.grid[int(cell.x)][int(cell.y)]
+                    for i in range(0, len(samples), 2):
+                        out.append(Vector((samples[i], samples[i + 1])))
+        for grid in self.linked_grids:
+            out.extend(grid.get_nearby_points(v, distance))
         return out
 
+    # Array variant of 'get_nearby_points', returning the samples in the same order.
+    def get_nearby_point_array(self, v, distance) -> np.ndarray:
+        radius = max(1, math.ceil((distance / self.dsep) - 0.5))
+        cx, cy = self.get_sample_cell(v)
+        arrays = [
+            self.get_cell_array(x, y)
+            for x in range(max(0, cx - radius), min(self.grid_shape[0], cx + radius + 1))
+            for y in range(max(0, cy - radius), min(self.grid_shape[1], cy + radius + 1))
+        ]
+        arrays.extend(grid.get_nearby_point_array(v, distance) for grid in self.linked_grids)
+        if not arrays:
+            return np.zeros((0, 2))
+        return np.concatenate(arrays)
+
+    def get_cell_array(self, x, y) -> np.ndarray:
+        points = self.cell_arrays.get((x, y))
+        if points is None:
+            points = np.array(self.grid[x][y], dtype=np.float64).reshape(-1, 2)
+            self.cell_arrays[(x, y)] = points
+        return points
+
+    # Finds the sample within distance of v that is closest to v inside the cone of directions less
+    # than max_angle from direction, ignoring samples behind v and samples equal to any of exclude.
+    # Samples closer than sqrt(near_sq), at any angle, are taken immediately, the first one in the
+    # order of 'get_nearby_points'. Returns (sample, distance_sq, near) or None.
+    def get_nearest_in_cone(self, v, direction, distance, max_angle, near_sq, exclude=()):
+        samples = self.get_nearby_point_array(v, distance)
+        if len(samples) == 0:
+            return None
+        candidates = np.ones(len(samples), dtype=bool)
+        for e in exclude:
+            candidates &= (samples[:, 0] != e.x) | (samples[:, 1] != e.y)
+
+        difference = samples - (v.x, v.y)
+        dot = difference @ (direction.x, direction.y)
+        distance_sq = np.einsum('ij,ij->i', difference, difference)
+        candidates &= dot >= 0
+
+        near = np.flatnonzero(candidates & (distance_sq < near_sq))
+        if len(near):
+            return Vector(samples[near[0]]), float(distance_sq[near[0]]), True
+
+        # angle < max_angle, compared by cosines.
+        length = np.sqrt(distance_sq) * direction.length
+        candidates &= dot > math.cos(max_angle) * length
+        if not candidates.any():
+            return None
+        closest = np.flatnonzero(candidates)[np.argmin(distance_sq[candidates])]
+        return Vector(samples[closest]), float(distance_sq[closest]), False
+
     def world_to_grid(self, v) -> Vector:
         return v - self.origin
 
@@ -88,3 +256,299 @@ class GridStorage:
         if self.vector_out_of_bounds(v, self.world_dimensions):
             return Vector((0.0, 0.0))
         return Vector((math.floor(v.x / self.dsep), math.floor(v.y / self.dsep)))
+
+    # Cell of 'get_sample_coords' as a tuple of ints, without creating a Vector for it.
+    def get_sample_cell(self, world_v: Vector):
+        v = world_v - self.origin
+        if v.x < 0 or v.y < 0 or v.x >= self.world_dimensions.x or v.y >= self.world_dimensions.y:
+            return 0, 0
+        return math.floor(v.x / self.dsep), math.floor(v.y / self.dsep)
+
+    # Cells of all points as computed by 'get_sample_coords', in the single precision of Vectors.
+    def get_point_cells(self, points: np.ndarray) -> np.ndarray:
+        cells = np.floor(self.get_local_points(points) / self.dsep).astype(int)
+        cells[self.points_out_of_bounds(points)] = 0
+        return cells
+
+    # Whether the points lie outside of the domain, as tested by 'get_sample_coords'.
+    def points_out_of_bounds(self, points: np.ndarray) -> np.ndarray:
+        local = self.get_local_points(points)
+        return (
+            (local[:, 0] < 0) | (local[:, 1] < 0)
+            | (local[:, 0] >= self.world_dimensions.x) | (local[:, 1] >= self.world_dimensions.y)
+        )
+
+    def get_local_points(self, points: np.ndarray) -> np.ndarray:
+        return (points.astype(np.float32) - np.array(self.origin[:2], dtype=np.float32)).astype(np.float64)
+
+
+# GridStorage with the samples of every cell in a contiguous (capacity, 2) float64 buffer, of
+# which the first 'counts[x][y]' rows are used, grown by doubling. Cells are found without
+# creating Vectors and the distances to all samples of a cell are tested at once.
+#
+# 'is_valid_sample' tests the cell of the sample first, as a sample that is too close to another
+# one most likely is so in its own cell, and only then the surrounding cells, all at once.
+class NumpyGridStorage(GridStorage):
+    def __init__(self, world_dimensions: Vector, origin: Vector, dsep, capacity=16):
+        self.world_dimensions: Vector = world_dimensions
+        self.origin: Vector = origin
+        self.dsep = dsep
+        self.dsep_sq = self.dsep ** 2
+        self.grid_dimensions = Vector((world_dimensions.x / dsep, world_dimensions.y / dsep))
+        self.grid_shape = (math.ceil(self.grid_dimensions.x), math.ceil(self.grid_dimensions.y))
+        self.capacity = capacity
+        self.buffers = [[None] * self.grid_shape[1] for _ in range(self.grid_shape[0])]
+        self.counts = [[0] * self.grid_shape[1] for _ in range(self.grid_shape[0])]
+        self.sample_index = None
+        self.linked_grids: list[GridStorage] = []
+
+    def add_polyline(self, line):
+        points = as_point_array(line)
+        if len(points) == 0:
+            return
+        cells = self.get_point_cells(points)
+        # Consecutive points of a polyline mostly share a cell, so they are added in runs.
+        changes = np.flatnonzero((cells[1:] != cells[:-1]).any(axis=1)) + 1
+        starts = [0, *changes.tolist()]
+        ends = [*changes.tolist(), len(points)]
+        for start, end, (x, y) in zip(starts, ends, cells[starts].tolist()):
+            self.add_to_cell(x, y, points[start:end])
+
+    def add_sample(self, v, coords=None):
+        if coords is None:
+            x, y = self.get_sample_cell(v)
+        else:
+            x, y = int(coords.x), int(coords.y)
+        self.add_to_cell(x, y, ((v.x, v.y),))
+
+    def add_to_cell(self, x, y, points):
+        count = self.counts[x][y]
+        buffer = self.buffers[x][y]
+        if buffer is None or count + len(points) > len(buffer):
+            grown = np.empty((max(self.capacity, 2 * (count + len(points))), 2))
+            if count:
+                grown[:count] = buffer[:count]
+            buffer = self.buffers[x][y] = grown
+        buffer[count:count + len(points)] = points
+        self.counts[x][y] = count + len(points)
+        self.sample_index = None
+
+    def samples_to_arrays(self):
+        counts = np.array(self.counts, dtype=np.int64).reshape(-1)
+        cells = [
+            self.buffers[x][y][:count]
+            for x, row in enumerate(self.counts)
+            for y, count in enumerate(row)
+            if count
+        ]
+        return np.concatenate(cells) if cells else np.zeros((0, 2)), counts
+
+    def set_samples(self, points: np.ndarray, counts: np.ndarray):
+        points = np.asarray(points, dtype=np.float64)
+        start = 0
+        counts = iter(counts.tolist())
+        for x in range(self.grid_shape[0]):
+            for y in range(self.grid_shape[1]):
+                count = next(counts)
+                self.buffers[x][y] = points[start:start + count].copy() if count else None
+                self.counts[x][y] = count
+                start += count
+        self.sample_index = None
+
+    def is_valid_sample(self, v, d_sq=None) -> bool:
+        if d_sq is None:
+            d_sq = self.dsep_sq
+        cx, cy = self.get_sample_cell(v)
+        x = v.x
+        y = v.y
+        if self.counts[cx][cy] and not self.points_far_from(self.get_cell_array(cx, cy), x, y, d_sq):
+            return False
+
+        arrays = [
+            self.buffers[i][j][:self.counts[i][j]]
+            for i in range(max(0, cx - 1), min(self.grid_shape[0], cx + 2))
+            for j in range(max(0, cy - 1), min(self.grid_shape[1], cy + 2))
+            if self.counts[i][j] and (i != cx or j != cy)
+        ]
+        if arrays and not self.points_far_from(np.concatenate(arrays), x, y, d_sq):
+            return False
+        return all(grid.is_valid_sample(v, d_sq) for grid in self.linked_grids)
+
+    # Whether all points but those equal to (x, y) are at least sqrt(d_sq) away from it.
+    @staticmethod
+    def points_far_from(points: np.ndarray, x, y, d_sq) -> bool:
+        dx = points[:, 0] - x
+        dy = points[:, 1] - y
+        distance_sq = dx * dx + dy * dy
+        return not ((distance_sq < d_sq) & ((dx != 0) | (dy != 0))).any()
+
+    def vector_far_from_vectors(self, v, cell, d_sq) -> bool:
+        return self.points_far_from(np.asarray(cell, dtype=np.float64).reshape(-1, 2), v.x, v.y, d_sq)
+
+    def get_nearby_points(self, v, distance):
+        return [Vector(p) for p in self.get_nearby_point_array(v, distance).tolist()]
+
+    # View of the samples of a cell, valid until the next sample is added to it.
+    def get_cell_array(self, x, y) -> np.ndarray:
+        count = self.counts[x][y]
+        if count == 0:
+            return np.zeros((0, 2))
+        return self.buffers[x][y][:count]
+
+
+# NumpyGridStorage whose cells are hashed by their coordinates and only exist once they hold a
+# sample, so memory scales with the occupied cells rather than the area of the domain, and
+# construction takes constant time for any extent.
+#
+# Points outside of the domain are stored in the cells they actually fall into, rather than in
+# the first cell, so the grid is unbounded and samples outside of the domain are only tested
+# against nearby samples. Generation results therefore differ from a GridStorage where
+# streamlines leave the domain.
+#
+# 'samples_to_arrays' returns the number of samples of the occupied cells only.
+class SparseGridStorage(NumpyGridStorage):
+    def __init__(self, world_dimensions: Vector, origin: Vector, dsep, capacity=16):
+        self.world_dimensions: Vector = world_dimensions
+        self.origin: Vector = origin
+        self.dsep = dsep
+        self.dsep_sq = self.dsep ** 2
+        self.grid_dimensions = Vector((world_dimensions.x / dsep, world_dimensions.y / dsep))
+        self.grid_shape = (math.ceil(self.grid_dimensions.x), math.ceil(self.grid_dimensions.y))
+        self.capacity = capacity
+        # (buffer, count) of every occupied cell, keyed by (x, y).
+        self.cells = {}
+        self.sample_index = None
+        self.linked_grids: list[GridStorage] = []
+
+    def get_sample_cell(self, world_v: Vector):
+        v = world_v - self.origin
+        return math.floor(v.x / self.dsep), math.floor(v.y / self.dsep)
+
+    def get_point_cells(self, points: np.ndarray) -> np.ndarray:
+        return np.floor(self.get_local_points(points) / self.dsep).astype(int)
+
+    def add_to_cell(self, x, y, points):
+        buffer, count = self.cells.get((x, y), (None, 0))
+        if buffer is None or count + len(points) > len(buffer):
+            grown = np.empty((max(self.capacity, 2 * (count + len(points))), 2))
+            if count:
+                grown[:count] = buffer[:count]
+            buffer = grown
+        buffer[count:count + len(points)] = points
+        self.cells[(x, y)] = (buffer, count + len(points))
+        self.sample_index = None
+
+    def samples_to_arrays(self):
+        keys = sorted(self.cells)
+        if not keys:
+            return np.zeros((0, 2)), np.zeros(0, dtype=np.int64)
+        counts = np.array([self.cells[key][1] for key in keys], dtype=np.int64)
+        return np.concatenate([self.get_cell_array(*key) for key in keys]), counts
+
+    # Counts are ignored, as the cells of the samples follow from their coordinates.
+    def set_samples(self, points: np.ndarray, counts: np.ndarray):
+        self.cells = {}
+        self.sample_index = None
+        self.add_polyline(np.asarray(points, dtype=np.float64))
+
+    def is_valid_sample(self, v, d_sq=None) -> bool:
+        if d_sq is None:
+            d_sq = self.dsep_sq
+        cx, cy = self.get_sample_cell(v)
+        x = v.x
+        y = v.y
+        if (cx, cy) in self.cells and not self.points_far_from(self.get_cell_array(cx, cy), x, y, d_sq):
+            return False
+
+        arrays = [
+            self.get_cell_array(cx + i, cy + j)
+            for i in range(-1, 2)
+            for j in range(-1, 2)
+            if (i != 0 or j != 0) and (cx + i, cy + j) in self.cells
+        ]
+        if arrays and not self.points_far_from(np.concatenate(arrays), x, y, d_sq):
+            return False
+        return all(grid.is_valid_sample(v, d_sq) for grid in self.linked_grids)
+
+    # Occupied cells are found by binary search in the keys of the sample index.
+    def get_cell_samples(self, cells: np.ndarray):
+        samples, starts, counts, keys = self.get_sample_index()
+        if len(keys) == 0:
+            return samples, np.zeros(len(cells), dtype=np.int64), np.zeros(len(cells), dtype=np.int64)
+        cell_keys = self.cell_keys(cells)
+        found = np.minimum(np.searchsorted(keys, cell_keys), len(keys) - 1)
+        occupied = keys[found] == cell_keys
+        return samples, starts[found], np.where(occupied, counts[found], 0)
+
+    # Adds the keys of the occupied cells, in the order of 'samples_to_arrays'.
+    def get_sample_index(self):
+        if self.sample_index is None:
+            samples, counts = self.samples_to_arrays()
+            keys = self.cell_keys(np.array(sorted(self.cells), dtype=np.int64).reshape(-1, 2))
+            self.sample_index = (samples, np.cumsum(counts) - counts, counts, keys)
+        return self.sample_index
+
+    # Integer keys of cells, ordered like the cells by x, then y.
+    @staticmethod
+    def cell_keys(cells: np.ndarray) -> np.ndarray:
+        cells = cells.astype(np.int64)
+        return cells[:, 0] * 2 ** 32 + (cells[:, 1] + 2 ** 31)
+
+    def get_nearby_point_array(self, v, distance) -> np.ndarray:
+        radius = max(1, math.ceil((distance / self.dsep) - 0.5))
+        cx, cy = self.get_sample_cell(v)
+        arrays = [
+            self.get_cell_array(x, y)
+            for x in range(cx - radius, cx + radius + 1)
+            for y in range(cy - radius, cy + radius + 1)
+            if (x, y) in self.cells
+        ]
+        arrays.extend(grid.get_nearby_point_array(v, distance) for grid in self.linked_grids)
+        if not arrays:
+            return np.zeros((0, 2))
+        return np.concatenate(arrays)
+
+    def get_cell_array(self, x, y) -> np.ndarray:
+        buffer, count = self.cells.get((x, y), (None, 0))
+        if count == 0:
+            return np.zeros((0, 2))
+        return buffer[:count]
+
+
+# Spatial hash of the points of a single streamline while it is traced, to detect the streamline
+# colliding with itself. Points are stored with their position along the streamline, counted in
+# steps from the seed, negative for the backward front. Points closer than 'look_back' steps to
+# a tested point along the streamline are its direct neighbours and are never a collision.
+#
+# Points enter the hash only once their front has moved on by 'look_back' steps, so the cells
+# around the front hold hardly any points it has to skip. Cells are twice the collision distance
+# wide, so the 2 x 2 cells closest to a point cover all points that can collide with it.
+class StreamlinePointHash:
+    def __init__(self, d_sq, look_back):
+        self.d_sq = d_sq
+        self.cell_size = 2 * math.sqrt(d_sq)
+        self.look_back = look_back
+        self.cells = {}
+        self.pending = {True: deque([]), False: deque([])}
+
+    def add(self, x, y, position):
+        if self.d_sq <= 0:
+            return
+        pending = self.pending[position >= 0]
+        pending.append((x, y, position))
+        if len(pending) > self.look_back:
+            x, y, position = pending.popleft()
+            key = (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+            self.cells.setdefault(key, []).append((x, y, position))
+
+    # Returns whether (x, y) at position is closer than sqrt(d_sq) to any other point of the streamline.
+    def collides(self, x, y, position) -> bool:
+        if self.d_sq <= 0:
+            return False
+        cx = math.floor(x / self.cell_size - 0.5)
+        cy = math.floor(y / self.cell_size - 0.5)
+        for key in ((cx, cy), (cx + 1, cy), (cx, cy + 1), (cx + 1, cy + 1)):
+            for sx, sy, other in self.cells.get(key, ()):
+                if abs(other - position) > self.look_back and (sx - x) ** 2 + (sy - y) ** 2 < self.d_sq:
+                    return True
+        return False
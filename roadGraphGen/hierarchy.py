@@ -0,0 +1,85 @@
+import numpy as np
+
+from collections import deque
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.grid_storage import GridStorage
+from roadGraphGen.roadGraphGen.integrator import FieldIntegrator
+from roadGraphGen.roadGraphGen.streamline_parameters import StreamlineParameters
+from roadGraphGen.roadGraphGen.streamlines import StreamlineGenerator
+
+
+# Multi-level road generation, e.g. main roads at a large dsep, followed by secondary and local
+# roads at smaller ones. Every level is traced by its own StreamlineGenerator, whose grids are
+# linked to the grids of the previous level (see StreamlineGenerator.add_existing_streamlines),
+# so its seeds and streamlines keep their distance to all coarser roads and its dangling ends
+# join onto them, without copying the coarser samples.
+#
+# A level can be restricted to part of the domain, so fine levels are only traced where needed.
+#
+# The streamlines of all levels are merged in level order into the same attributes a
+# StreamlineGenerator provides, so a Graph can be built from the hierarchy directly.
+# 'streamline_levels' holds the level of every streamline of all_streamlines.
+class StreamlineHierarchy:
+    def __init__(self, integrator: FieldIntegrator, origin: Vector, world_dimensions: Vector, seed: int,
+                 grid_class=GridStorage):
+        self.integrator = integrator
+        self.grid_class = grid_class
+        self.origin = origin
+        self.world_dimensions = world_dimensions
+        self.seed = seed if seed >= 0 else int(np.random.default_rng().integers(10000, 100000000))
+        # (parameters, origin, world_dimensions) of every level.
+        self.level_domains = []
+        self.levels: list[StreamlineGenerator] = []
+        self.clear_streamlines()
+
+    def clear_streamlines(self):
+        self.all_streamlines = deque([])
+        self.streamlines_major = deque([])
+        self.streamlines_minor = deque([])
+        self.all_streamlines_simple = deque([])
+        self.streamline_levels = []
+
+    # Adds a level traced after all previous ones, optionally only in the given part of the domain.
+    def add_level(self, parameters: StreamlineParameters, origin: Vector = None, world_dimensions: Vector = None):
+        self.level_domains.append((
+            parameters,
+            self.origin if origin is None else origin,
+            self.world_dimensions if world_dimensions is None else world_dimensions
+        ))
+
+    # Parameters of the finest level, which the graph is built with.
+    @property
+    def parameters(self) -> StreamlineParameters:
+        return self.level_domains[-1][0]
+
+    def get_level_seeds(self):
+        sequence = np.random.SeedSequence(int(self.seed))
+        return [int(child.generate_state(1)[0]) for child in sequence.spawn(len(self.level_domains))]
+
+    def create_all_streamlines(self, batch_size=None):
+        self.levels = []
+        for (parameters, origin, world_dimensions), seed in zip(self.level_domains, self.get_level_seeds()):
+            generator = StreamlineGenerator(
+                integrator=self.integrator,
+                origin=origin,
+                world_dimensions=world_dimensions,
+                parameters=parameters,
+                seed=seed,
+                grid_class=self.grid_class
+            )
+            # The grids of the previous level are linked to the grids of all coarser levels.
+            if self.levels:
+                generator.add_existing_streamlines(self.levels[-1])
+            generator.create_all_streamlines(batch_size)
+            self.levels.append(generator)
+        self.merge_levels()
+
+    def merge_levels(self):
+        self.clear_streamlines()
+        for level, generator in enumerate(self.levels):
+            self.all_streamlines.extend(generator.all_streamlines)
+            self.streamlines_major.extend(generator.streamlines_major)
+            self.streamlines_minor.extend(generator.streamlines_minor)
+            self.all_streamlines_simple.extend(generator.all_streamlines_simple)
+            self.streamline_levels.extend([level] * len(generator.all_streamlines))
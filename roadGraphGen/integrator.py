@@ -1,38 +1,72 @@
+import math
+import numpy as np
+
+from collections import OrderedDict
 from mathutils import Vector
 
+from roadGraphGen.roadGraphGen.field_raster import TensorFieldRaster
 from roadGraphGen.roadGraphGen.streamline_parameters import StreamlineParameters
 from roadGraphGen.roadGraphGen.tensor_field import TensorField
 
 
 # Integrators are used for iterative approximate discretization/integration of stream-
 # lines.
+# Optionally a precomputed TensorFieldRaster of the field can be given, which is then sampled
+# instead of the analytic tensor field.
+#
+# 'integrate_points' integrates an (N, 2) array of points at once, with 'majors' an (N,) bool
+# array selecting the major or minor eigenvector per point. The default implementation calls
+# 'integrate' for every point, subclasses override it with vectorized versions.
 class FieldIntegrator:
-    def __init__(self, field: TensorField):
+    def __init__(self, field: TensorField, raster: TensorFieldRaster = None):
         self.field = field
+        self.raster = raster
 
     def integrate(self, point: Vector, major: bool):
         pass
 
+    def integrate_points(self, points: np.ndarray, majors: np.ndarray) -> np.ndarray:
+        out = np.zeros((len(points), 2))
+        for i in range(len(points)):
+            out[i] = self.integrate(Vector(points[i]), bool(majors[i])).xy
+        return out
+
     def sample_field_vector(self, point: Vector, major: bool) -> Vector:
+        if self.raster is not None:
+            return self.raster.sample_field_vector(point, major)
         tensor = self.field.sample_point(point)
         if major:
             return tensor.get_major()
         return tensor.get_minor()
 
+    # Returns an (N,) bool array, True where the field is degenerate and streamlines can not
+    # continue, which is far cheaper than integrating the points.
+    def degenerate_points(self, points: np.ndarray) -> np.ndarray:
+        sampler = self.field if self.raster is None else self.raster
+        return sampler.sample_tensors(points).r == 0
+
+    def sample_field_vectors(self, points: np.ndarray, majors: np.ndarray) -> np.ndarray:
+        sampler = self.field if self.raster is None else self.raster
+        r, theta, major, minor = sampler.sample_points(points)
+        return np.where(majors[:, None], major, minor)
+
 
 class EulerIntegrator(FieldIntegrator):
-    def __init__(self, field: TensorField, parameters: StreamlineParameters):
-        super().__init__(field)
+    def __init__(self, field: TensorField, parameters: StreamlineParameters, raster: TensorFieldRaster = None):
+        super().__init__(field, raster)
         self.parameters = parameters
 
     def integrate(self, point: Vector, major: bool) -> Vector:
         return self.sample_field_vector(point, major).xy * self.parameters.dstep
 
+    def integrate_points(self, points: np.ndarray, majors: np.ndarray) -> np.ndarray:
+        return self.sample_field_vectors(points, majors) * self.parameters.dstep
+
 
 # The classic Runge-Kutta method, RK4.
 class RK4Integrator(FieldIntegrator):
-    def __init__(self, field: TensorField, parameters: StreamlineParameters):
-        super().__init__(field)
+    def __init__(self, field: TensorField, parameters: StreamlineParameters, raster: TensorFieldRaster = None):
+        super().__init__(field, raster)
         self.parameters = parameters
 
     def integrate(self, point: Vector, major: bool) -> Vector:
@@ -42,3 +76,152 @@ class RK4Integrator(FieldIntegrator):
         k4 = self.sample_field_vector(
             point + Vector((self.parameters.dstep, self.parameters.dstep)), major)
         return (k1 + (k23 * 4) + k4) * (self.parameters.dstep / 6)
+
+    def integrate_points(self, points: np.ndarray, majors: np.ndarray) -> np.ndarray:
+        # All three stages are sampled in a single batch.
+        n = len(points)
+        dstep = self.parameters.dstep
+        k = self.sample_field_vectors(
+            np.concatenate((points, points + dstep / 2, points + dstep)), np.tile(majors, 3))
+        return (k[:n] + (k[n:2 * n] * 4) + k[2 * n:]) * (dstep / 6)
+
+
+# Adaptive Bogacki-Shampine 3(2) integrator with local error control.
+# The field is integrated along tracks of steps between parameters.min_step and max_step long,
+# sized to keep the local error estimate below parameters.tolerance. Tracks are resampled with
+# cubic Hermite interpolation, so every call of 'integrate' returns the displacement to the
+# next point of a track, dstep further along it, and long steps along straight stretches of
+# the field take a fraction of the samples of fixed step integration.
+#
+# A track is continued when 'integrate' is called at the point its last displacement led to,
+# and restarted in the opposite direction when called at the point the negated displacement
+# led to, as streamline tracing does after flipping the direction. Any other point starts a
+# new track. 'evaluations' counts the samples of the field.
+class AdaptiveIntegrator(FieldIntegrator):
+    def __init__(self, field: TensorField, parameters: StreamlineParameters, raster: TensorFieldRaster = None,
+                 max_tracks=16):
+        super().__init__(field, raster)
+        self.parameters = parameters
+        self.max_tracks = max_tracks
+        self.tracks = OrderedDict()
+        self.evaluations = 0
+
+    def integrate(self, point: Vector, major: bool) -> Vector:
+        track = self.get_track(point.x, point.y, major)
+        if track is None:
+            return Vector((0.0, 0.0))
+        x, y = track.next_point()
+        d = Vector((x - point.x, y - point.y))
+        self.remember(track, tuple(point + d), tuple(point + d * -1), major, (-d.x, -d.y))
+        self.forget(self.max_tracks)
+        return d
+
+    def integrate_points(self, points: np.ndarray, majors: np.ndarray) -> np.ndarray:
+        out = np.zeros((len(points), 2))
+        for i, ((px, py), major) in enumerate(zip(points.tolist(), majors.tolist())):
+            track = self.get_track(px, py, major)
+            if track is None:
+                continue
+            x, y = track.next_point()
+            dx = x - px
+            dy = y - py
+            self.remember(track, (px + dx, py + dy), (px - dx, py - dy), major, (-dx, -dy))
+            out[i] = (dx, dy)
+        # Keep at least the tracks of all points of this batch.
+        self.forget(max(self.max_tracks, len(points)))
+        return out
+
+    # Returns the track to continue at point, or a new one. None if the field is degenerate there.
+    def get_track(self, x, y, major):
+        track, heading = self.tracks.pop((x, y, major), (None, None))
+        if track is None:
+            track = AdaptiveTrack(self, x, y, major, heading)
+        return None if track.degenerate else track
+
+    def remember(self, track, forward_point, backward_point, major, backward_heading):
+        self.tracks[(*forward_point, major)] = (track, None)
+        self.tracks[(*backward_point, major)] = (None, backward_heading)
+
+    # Drops the least recently continued tracks beyond the given number.
+    def forget(self, n_tracks):
+        while len(self.tracks) > 2 * n_tracks:
+            self.tracks.popitem(last=False)
+
+    # Samples the unit field vector at (x, y), pointing along heading if given.
+    def direction(self, x, y, major, heading=None):
+        self.evaluations += 1
+        v = self.sample_field_vector(Vector((x, y)), major)
+        if heading is not None and v.x * heading[0] + v.y * heading[1] < 0:
+            return (-v.x, -v.y)
+        return (v.x, v.y)
+
+
+# Integration state of an AdaptiveIntegrator along one field line.
+# The current step leads from start to end with the unit directions k_start and k_end, 'length'
+# long, and 't' is the position of the last resampled point within it.
+class AdaptiveTrack:
+    def __init__(self, integrator: AdaptiveIntegrator, x, y, major, heading=None):
+        self.integrator = integrator
+        self.major = major
+        self.step = integrator.parameters.max_step
+        self.start = self.end = (x, y)
+        self.k_start = self.k_end = integrator.direction(x, y, major, heading)
+        self.degenerate = self.k_end == (0.0, 0.0)
+        self.length = 0.0
+        self.t = 0.0
+
+    def next_point(self):
+        self.t += self.integrator.parameters.dstep
+        while self.t > self.length and not self.degenerate:
+            self.t -= self.length
+            self.advance()
+        if self.degenerate:
+            return self.end
+        return self.interpolate(self.t / self.length)
+
+    # Takes the next adaptive step from the end of the current one.
+    def advance(self):
+        parameters = self.integrator.parameters
+        direction = self.integrator.direction
+        x, y = self.end
+        k1 = self.k_end
+        if k1 == (0.0, 0.0):
+            self.degenerate = True
+            return
+
+        h = self.step
+        while True:
+            k2 = direction(x + h / 2 * k1[0], y + h / 2 * k1[1], self.major, k1)
+            k3 = direction(x + 3 * h / 4 * k2[0], y + 3 * h / 4 * k2[1], self.major, k1)
+            x1 = x + h * (2 / 9 * k1[0] + 1 / 3 * k2[0] + 4 / 9 * k3[0])
+            y1 = y + h * (2 / 9 * k1[1] + 1 / 3 * k2[1] + 4 / 9 * k3[1])
+            k4 = direction(x1, y1, self.major, k1)
+            # Difference to the embedded second order solution.
+            error = h * math.hypot(
+                -5 / 72 * k1[0] + 1 / 12 * k2[0] + 1 / 9 * k3[0] - 1 / 8 * k4[0],
+                -5 / 72 * k1[1] + 1 / 12 * k2[1] + 1 / 9 * k3[1] - 1 / 8 * k4[1]
+            )
+            factor = 5.0 if error == 0 else min(5.0, max(0.2, 0.9 * (parameters.tolerance / error) ** (1 / 3)))
+            if error <= parameters.tolerance or h <= parameters.min_step:
+                break
+            h = max(parameters.min_step, h * factor)
+
+        self.start = (x, y)
+        self.end = (x1, y1)
+        self.k_start = k1
+        self.k_end = k4
+        self.length = h
+        self.step = min(parameters.max_step, max(parameters.min_step, h * factor))
+
+    # Cubic Hermite interpolation of the current step at s in [0, 1].
+    def interpolate(self, s):
+        s2 = s * s
+        s3 = s2 * s
+        h00 = 2 * s3 - 3 * s2 + 1
+        h10 = (s3 - 2 * s2 + s) * self.length
+        h01 = -2 * s3 + 3 * s2
+        h11 = (s3 - s2) * self.length
+        return (
+            h00 * self.start[0] + h10 * self.k_start[0] + h01 * self.end[0] + h11 * self.k_end[0],
+            h00 * self.start[1] + h10 * self.k_start[1] + h01 * self.end[1] + h11 * self.k_end[1]
+        )
@@ -0,0 +1,151 @@
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.integrator import FieldIntegrator
+from roadGraphGen.roadGraphGen.polyline import Polyline
+from roadGraphGen.roadGraphGen.streamline_parameters import StreamlineParameters
+from roadGraphGen.roadGraphGen.streamlines import StreamlineGenerator
+from roadGraphGen.roadGraphGen.tensor_field import as_point_array
+
+
+# Domain decomposed parallel streamline generation.
+# The domain of a StreamlineGenerator is split into tiles[0] x tiles[1] tiles, each extended
+# by a halo of at least dsep on every side, which are traced by independent Streamline-
+# Generators in a pool of worker processes. Every tile draws from its own random generator,
+# seeded from the global seed, so the result does not depend on the number of workers.
+#
+# The tiles are stitched in order into the given generator: streamlines are cut where they
+# come closer than dtest to a streamline of the same direction that is already part of the
+# merged grids, which happens where the halos overlap neighbouring tiles. Afterwards the
+# generator fills the remaining gaps and joins the dangling streamlines.
+#
+# Every tile keeps the full seed_tries, the number of consecutive failed seed draws after which
+# it gives up, so it leaves as little free area as a single generator would in the same area.
+#
+# Streamlines are returned from the workers as arrays, as mathutils Vectors can not be pickled.
+class ParallelStreamlineGenerator:
+    def __init__(self, generator: StreamlineGenerator, tiles=(2, 2), workers=None, halo=None):
+        self.generator = generator
+        self.tiles = tiles
+        self.workers = workers
+        self.halo = max(halo or 0, generator.parameters.dsep)
+
+    # Returns the (origin, dimensions) of all tiles including their halos, row by row.
+    def get_tile_domains(self):
+        origin = self.generator.origin
+        world_dimensions = self.generator.world_dimensions
+        tile_width = world_dimensions.x / self.tiles[0]
+        tile_height = world_dimensions.y / self.tiles[1]
+
+        domains = []
+        for j in range(self.tiles[1]):
+            for i in range(self.tiles[0]):
+                min_x = max(origin.x, origin.x + i * tile_width - self.halo)
+                min_y = max(origin.y, origin.y + j * tile_height - self.halo)
+                max_x = min(origin.x + world_dimensions.x, origin.x + (i + 1) * tile_width + self.halo)
+                max_y = min(origin.y + world_dimensions.y, origin.y + (j + 1) * tile_height + self.halo)
+                domains.append(((min_x, min_y), (max_x - min_x, max_y - min_y)))
+        return domains
+
+    def get_tile_seeds(self):
+        sequence = np.random.SeedSequence(int(self.generator.seed))
+        return [int(child.generate_state(1)[0]) for child in sequence.spawn(self.tiles[0] * self.tiles[1])]
+
+    def create_all_streamlines(self, batch_size=None):
+        generator = self.generator
+        tasks = [
+            (origin, dimensions, seed, batch_size)
+            for (origin, dimensions), seed in zip(self.get_tile_domains(), self.get_tile_seeds())
+        ]
+        sampler = generator.seed_sampler
+        sampling = None if sampler is None else (sampler.subdivisions, sampler.max_failures)
+        state = (generator.integrator, generator.parameters, generator.SEED_AT_ENDPOINTS, sampling, generator.grid_class)
+
+        if self.workers == 1:
+            results = [trace_tile_with(state, task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=state) as executor:
+                results = list(executor.map(trace_tile, tasks))
+
+        # Only points within dtest of the domain of a tile stitched before can be too close to it,
+        # as its streamlines end at most one step outside of it.
+        stitched = []
+        margin = generator.parameters.dtest + generator.parameters.dstep
+        for (origin, dimensions), streamlines in zip(self.get_tile_domains(), results):
+            for major, points in streamlines:
+                for piece in self.cut_streamline(points, major, stitched):
+                    generator.add_streamline(piece, major)
+            stitched.append((
+                origin[0] - margin, origin[1] - margin,
+                origin[0] + dimensions[0] + margin, origin[1] + dimensions[1] + margin
+            ))
+
+        generator.create_all_streamlines(batch_size, join_dangling=False)
+        generator.join_dangling_streamlines()
+
+    # Splits streamline at all points closer than dtest to the streamlines of the same direction
+    # in the grid of the merged generator. Only points inside one of the regions are tested.
+    def cut_streamline(self, points: np.ndarray, major: bool, regions):
+        points = as_point_array(points)
+        if len(points) == 0:
+            return []
+        # Regions are tested on the single precision coordinates of Vectors.
+        x, y = points.astype(np.float32).astype(np.float64).T
+        tested = np.zeros(len(points), dtype=bool)
+        for region in regions:
+            tested |= (region[0] <= x) & (x <= region[2]) & (region[1] <= y) & (y <= region[3])
+        # Points are tested one at a time, as every piece added changes the grid, which would
+        # rebuild the sample index of 'is_valid_samples' for every streamline.
+        grid = self.generator.grid(major)
+        kept = ~tested
+        kept[tested] = [
+            grid.is_valid_sample(Vector(p), self.generator.parameters_sq.dtest) for p in points[tested].tolist()
+        ]
+
+        # Pieces are the runs of kept points.
+        changes = (np.flatnonzero(kept[1:] != kept[:-1]) + 1).tolist()
+        starts = [0, *changes]
+        ends = [*changes, len(points)]
+        return [Polyline(points[start:end]) for start, end in zip(starts, ends) if kept[start]]
+
+
+# State shared by all tiles traced in a worker process: (integrator, parameters, seed_at_endpoints,
+# sampling, grid_class), sampling being the (subdivisions, max_failures) of free space sampling or None.
+worker_state = None
+
+
+def init_worker(integrator: FieldIntegrator, parameters: StreamlineParameters, seed_at_endpoints: bool, sampling,
+                grid_class):
+    global worker_state
+    worker_state = (integrator, parameters, seed_at_endpoints, sampling, grid_class)
+
+
+def trace_tile(task):
+    return trace_tile_with(worker_state, task)
+
+
+# Traces all streamlines of one tile, task being (origin, dimensions, seed, batch_size).
+# Returns a list of (major, points) in order of creation.
+def trace_tile_with(state, task):
+    integrator, parameters, seed_at_endpoints, sampling, grid_class = state
+    origin, dimensions, seed, batch_size = task
+    generator = StreamlineGenerator(
+        integrator=integrator,
+        origin=Vector(origin),
+        world_dimensions=Vector(dimensions),
+        parameters=parameters.copy(),
+        seed=seed,
+        grid_class=grid_class
+    )
+    generator.SEED_AT_ENDPOINTS = seed_at_endpoints
+    if sampling is not None:
+        generator.enable_free_space_sampling(*sampling)
+    generator.create_all_streamlines(batch_size, join_dangling=False)
+
+    majors = {id(streamline) for streamline in generator.streamlines_major}
+    return [
+        (id(streamline) in majors, streamline.xy.copy())
+        for streamline in generator.all_streamlines
+    ]
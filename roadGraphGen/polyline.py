@@ -0,0 +1,119 @@
+import numpy as np
+
+from mathutils import Vector
+
+
+# Compact polyline of 2D points, stored in a growable float64 array instead of a deque of
+# mathutils Vectors, which take several times the memory per point.
+#
+# The points occupy buffer[start:end]. Free space is kept at both ends of the buffer, so points
+# can be appended at either end in amortized O(1), as streamlines are traced in both directions
+# from their seed. When an end runs full, the buffer is reallocated with free space of half the
+# number of points at both ends. 'trim' reduces the free space again once a polyline is done.
+#
+# Indexing with an integer and iterating return Vectors, created on demand, so the polyline can
+# be used like a deque[Vector]. 'xy' and slicing return views of the buffer without copying,
+# which are valid until the next point is added, np.asarray returns a copy of the points.
+class Polyline:
+    def __init__(self, points=None, slack=16):
+        if points is None:
+            points = np.zeros((0, 2))
+        elif not isinstance(points, np.ndarray):
+            points = np.array([(p[0], p[1]) for p in points], dtype=np.float64).reshape(-1, 2)
+        self.buffer = np.empty((0, 2))
+        self.start = self.end = 0
+        self.reallocate(points, slack)
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def xy(self) -> np.ndarray:
+        return self.buffer[self.start:self.end]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.xy, dtype=dtype)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.xy[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("polyline index out of range")
+        x, y = self.buffer[self.start + index]
+        return Vector((x, y))
+
+    def __iter__(self):
+        for x, y in self.xy.tolist():
+            yield Vector((x, y))
+
+    def __reversed__(self):
+        for x, y in self.xy[::-1].tolist():
+            yield Vector((x, y))
+
+    def __contains__(self, point) -> bool:
+        xy = self.xy
+        return bool(((xy[:, 0] == point[0]) & (xy[:, 1] == point[1])).any())
+
+    # The points as a list of Vectors, for code that needs Vector objects of its own.
+    def vectors(self) -> list[Vector]:
+        return list(self)
+
+    def append(self, point):
+        if self.end == len(self.buffer):
+            self.grow()
+        self.buffer[self.end] = (point[0], point[1])
+        self.end += 1
+
+    def appendleft(self, point):
+        if self.start == 0:
+            self.grow()
+        self.start -= 1
+        self.buffer[self.start] = (point[0], point[1])
+
+    def extend(self, points):
+        for point in points:
+            self.append(point)
+
+    def reverse(self):
+        self.buffer[self.start:self.end] = self.xy[::-1].copy()
+
+    def copy(self) -> 'Polyline':
+        return Polyline(self.xy.copy())
+
+    # Returns the polyline with points inserted evenly into every segment longer than step, so
+    # consecutive points are at most step apart. All points are kept.
+    def resampled(self, step) -> 'Polyline':
+        xy = self.xy
+        if len(xy) < 2:
+            return Polyline(xy.copy(), slack=0)
+        difference = np.diff(xy, axis=0)
+        counts = np.maximum(1, np.ceil(np.hypot(*difference.T) / step).astype(int))
+        segments = np.repeat(np.arange(len(difference)), counts)
+        fractions = (np.arange(len(segments)) - np.repeat(np.cumsum(counts) - counts, counts)) / counts[segments]
+        points = xy[segments] + difference[segments] * fractions[:, None]
+        return Polyline(np.concatenate((points, xy[-1:])), slack=0)
+
+    def grow(self):
+        self.reallocate(self.xy, max(16, len(self) // 2))
+
+    # Reduces the free space at both ends to slack points.
+    def trim(self, slack=16):
+        if len(self.buffer) > len(self) + 2 * slack:
+            self.reallocate(self.xy, slack)
+
+    def reallocate(self, points: np.ndarray, slack):
+        n = len(points)
+        buffer = np.empty((n + 2 * slack, 2))
+        buffer[slack:slack + n] = points
+        self.buffer = buffer
+        self.start = slack
+        self.end = slack + n
+
+    # Only the points are pickled, not the free space.
+    def __getstate__(self):
+        return {'points': self.xy.copy()}
+
+    def __setstate__(self, state):
+        self.__init__(state['points'])
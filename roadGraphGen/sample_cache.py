@@ -0,0 +1,54 @@
+import math
+
+from collections import OrderedDict
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.tensor import Tensor
+
+
+# Bounded least recently used cache of tensor field samples.
+# Points are quantized to a grid of spacing 'quantum' to form the keys, so points closer than
+# the quantum share a sample. Tensors are stored as plain tuples and a new Tensor is returned
+# for every hit, as Tensors are mutable.
+#
+# 'hits' and 'misses' count the lookups since the cache was created.
+class SampleCache:
+    def __init__(self, size, quantum):
+        self.size = size
+        self.quantum = quantum
+        self.samples = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.samples)
+
+    def get_key(self, point: Vector):
+        return (round(point.x / self.quantum), round(point.y / self.quantum))
+
+    def get(self, key):
+        sample = self.samples.get(key)
+        if sample is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.samples.move_to_end(key)
+        return Tensor(sample[0], [sample[1], sample[2]])
+
+    def put(self, key, tensor: Tensor):
+        self.samples[key] = (tensor.r, tensor.matrix[0], tensor.matrix[1])
+        if len(self.samples) > self.size:
+            self.samples.popitem(last=False)
+
+    def clear(self):
+        self.samples.clear()
+
+    # Drops all samples inside the axis aligned box region (min_x, min_y, max_x, max_y).
+    def invalidate_region(self, region):
+        min_x, min_y, max_x, max_y = region
+        if all(math.isinf(v) for v in region):
+            self.clear()
+            return
+        q = self.quantum
+        for key in [k for k in self.samples if min_x <= k[0] * q <= max_x and min_y <= k[1] * q <= max_y]:
+            del self.samples[key]
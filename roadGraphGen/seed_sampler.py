@@ -0,0 +1,108 @@
+import math
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.tensor_field import as_point_array
+
+
+# Seed sampler of the StreamlineGenerator that only draws from space that can still hold a
+# seed, instead of rejecting uniform random points against the grid.
+#
+# The domain is divided into square subcells, 'subdivisions' per dsep. For both major and
+# minor streamlines, a subcell is blocked once it lies entirely within dsep of a point of a
+# streamline of the same direction, as no seed inside it can be valid anymore. Seeds are drawn
+# uniformly from a random free subcell and tested against the grid as before. A subcell that
+# fails 'max_failures' times, because it is only partially covered, is blocked as well.
+# Sampling ends when no free subcell is left.
+#
+# Free subcells are kept in a list, from which blocked subcells are removed lazily when drawn.
+class FreeSpaceSampler:
+    def __init__(self, origin: Vector, world_dimensions: Vector, dsep, subdivisions=8, max_failures=3):
+        self.origin = origin.copy()
+        self.world_dimensions = world_dimensions.copy()
+        self.dsep = dsep
+        self.subdivisions = subdivisions
+        self.max_failures = max_failures
+        self.cell_size = dsep / subdivisions
+        self.dimensions = (
+            max(1, math.ceil(world_dimensions.x / self.cell_size)),
+            max(1, math.ceil(world_dimensions.y / self.cell_size))
+        )
+
+        # Subcell offsets that can be covered by the dsep disc of a point.
+        r = math.ceil(dsep / self.cell_size)
+        offsets = np.arange(-r, r + 1)
+        grid_x, grid_y = np.meshgrid(offsets, offsets, indexing='ij')
+        self.offsets = np.stack((grid_x.ravel(), grid_y.ravel()), axis=1)
+
+        self.clear()
+
+    def clear(self):
+        n = self.dimensions[0] * self.dimensions[1]
+        self.blocked = {True: np.zeros(n, dtype=bool), False: np.zeros(n, dtype=bool)}
+        self.failures = {True: np.zeros(n, dtype=np.int32), False: np.zeros(n, dtype=np.int32)}
+        self.free = {True: list(range(n)), False: list(range(n))}
+
+    # Returns the number of subcells not known to be blocked, including lazily removed ones.
+    def free_count(self, major: bool):
+        return len(self.free[major])
+
+    # Blocks all subcells entirely within dsep of the points of streamline.
+    def stamp(self, major: bool, streamline):
+        points = as_point_array(streamline)
+        # Points closer than half a subcell barely add to the covered area.
+        spacing = self.mean_spacing(points)
+        stride = max(1, int(self.cell_size / 2 / spacing)) if spacing > 0 else 1
+        points = np.concatenate((points[::stride], points[-1:]))
+
+        local = (points - (self.origin.x, self.origin.y)) / self.cell_size
+        cells = np.floor(local).astype(int)[:, None, :] + self.offsets[None, :, :]
+        # Distance to the farthest corner of every candidate subcell.
+        low = cells - local[:, None, :]
+        farthest = np.maximum(np.abs(low), np.abs(low + 1)) * self.cell_size
+        covered = np.einsum('ijk,ijk->ij', farthest, farthest) < self.dsep ** 2
+        covered &= (
+            (cells[..., 0] >= 0) & (cells[..., 0] < self.dimensions[0])
+            & (cells[..., 1] >= 0) & (cells[..., 1] < self.dimensions[1])
+        )
+        self.blocked[major][cells[covered][:, 0] * self.dimensions[1] + cells[covered][:, 1]] = True
+
+    def mean_spacing(self, points: np.ndarray):
+        if len(points) < 2:
+            return 0.0
+        return float(np.hypot(*np.diff(points, axis=0).T).mean())
+
+    # Draws seeds from free subcells until is_valid(seed) holds. Returns None if there are no
+    # free subcells left.
+    def get_seed(self, major: bool, rng: np.random.Generator, is_valid):
+        free = self.free[major]
+        blocked = self.blocked[major]
+        failures = self.failures[major]
+        while free:
+            k = int(rng.integers(len(free)))
+            cell = free[k]
+            if not blocked[cell]:
+                seed = self.sample_cell(cell, rng)
+                if is_valid(seed):
+                    return seed
+                failures[cell] += 1
+                if failures[cell] < self.max_failures:
+                    continue
+                blocked[cell] = True
+            # Swap remove the blocked subcell.
+            free[k] = free[-1]
+            free.pop()
+        return None
+
+    # Returns a uniformly distributed point of the part of the subcell inside the domain.
+    def sample_cell(self, cell, rng: np.random.Generator):
+        i, j = divmod(cell, self.dimensions[1])
+        min_x = i * self.cell_size
+        min_y = j * self.cell_size
+        width = min(self.cell_size, self.world_dimensions.x - min_x)
+        height = min(self.cell_size, self.world_dimensions.y - min_y)
+        return Vector((
+            self.origin.x + min_x + rng.random() * width,
+            self.origin.y + min_y + rng.random() * height
+        ))
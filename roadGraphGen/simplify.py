@@ -1,59 +1,250 @@
+import numpy as np
+
 from collections import deque
+from itertools import islice
 from mathutils import Vector
 
+from roadGraphGen.roadGraphGen.tensor_field import as_point_array
+
 
 # This file offers a custom implementation of the Douglas-Peucker polyline simplification
 # algorithm to work with mathutils Vectors. The implementation is based on the simplify.js
-# JavaScript library.
+# JavaScript library, including its radial distance prefilter, which is skipped for the
+# highest quality as in simplify.js.
+#
+# Points can be given as a deque[Vector] or a Polyline. The algorithm runs on an array of their
+# coordinates, so a Polyline does not create a Vector for every point, and the result consists
+# of the points at the selected indices, i.e. the points themselves for a deque.
+#
+# Instead of recursing into both halves of a split segment, all segments of a level of the
+# recursion are split at once, the distances of the points of all of them being computed in
+# one pass. The points kept are the same as of the recursion of simplify.js.
 def get_square_segment_distance(p: Vector, p1: Vector, p2: Vector):
-    x = p1.x
-    y = p1.y
-    dx = p2.x - x
-    dy = p2.y - y
+    return square_segment_distance(p.x, p.y, p1.x, p1.y, p2.x, p2.y)
+
+
+def square_segment_distance(px: float, py: float, x: float, y: float, x2: float, y2: float):
+    dx = x2 - x
+    dy = y2 - y
 
     if dx != 0 or dy != 0:
-        t = ((p.x - x) * dx + (p.y - y) * dy) / (dx * dx + dy * dy)
+        t = ((px - x) * dx + (py - y) * dy) / (dx * dx + dy * dy)
         if t > 1:
-            x = p2.x
-            y = p2.y
+            x = x2
+            y = y2
         elif t > 0:
             x += dx * t
             y += dy * t
 
-    dx = p.x - x
-    dy = p.y - y
+    dx = px - x
+    dy = py - y
+    return dx * dx + dy * dy
+
+
+# 'square_segment_distance' of the points (px, py) to the segments from (x, y) to (x2, y2), all
+# arrays, computed in the same order of operations.
+def square_segment_distances(px: np.ndarray, py: np.ndarray, x: np.ndarray, y: np.ndarray,
+                             x2: np.ndarray, y2: np.ndarray) -> np.ndarray:
+    dx = x2 - x
+    dy = y2 - y
+    length_sq = dx * dx + dy * dy
+    t = np.divide((px - x) * dx + (py - y) * dy, length_sq, out=np.zeros_like(px), where=length_sq != 0)
+
+    x = np.where(t > 1, x2, np.where(t > 0, x + dx * t, x))
+    y = np.where(t > 1, y2, np.where(t > 0, y + dy * t, y))
+    dx = px - x
+    dy = py - y
     return dx * dx + dy * dy
 
 
-def simplify_dp_step(points: deque[Vector], first: int, last: int, sq_tolerance: float, simplified: deque[Vector]):
-    max_sq_dist = sq_tolerance
-    index = None
+# Returns the indices of the points kept by simplifying the ranges xy[firsts[k]:lasts[k] + 1]
+# of an (N, 2) array, in order. Ranges must not overlap.
+def simplify_douglas_peucker_ranges(xy: np.ndarray, firsts: np.ndarray, lasts: np.ndarray,
+                                    sq_tolerance: float) -> np.ndarray:
+    xs = np.ascontiguousarray(xy[:, 0])
+    ys = np.ascontiguousarray(xy[:, 1])
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[firsts] = True
+    keep[lasts] = True
+    # Segments with points between their ends, still to be split.
+    inner = lasts - firsts > 1
+    firsts, lasts = firsts[inner], lasts[inner]
+    while len(firsts):
+        counts = lasts - firsts - 1
+        starts = np.cumsum(counts) - counts
+        indices = np.arange(starts[-1] + counts[-1]) + np.repeat(firsts + 1 - starts, counts)
+        sq_dist = square_segment_distances(
+            xs[indices], ys[indices],
+            np.repeat(xs[firsts], counts), np.repeat(ys[firsts], counts),
+            np.repeat(xs[lasts], counts), np.repeat(ys[lasts], counts)
+        )
 
-    for i in range(first + 1, last):
-        sq_dist = get_square_segment_distance(points[i], points[first], points[last])
-        if sq_dist > max_sq_dist:
-            index = i
-            max_sq_dist = sq_dist
+        # The first point at the largest distance, as found by the loop of simplify.js.
+        max_sq_dist = np.maximum.reduceat(sq_dist, starts)
+        farthest = np.where(sq_dist == np.repeat(max_sq_dist, counts), indices, len(xy))
+        split = np.minimum.reduceat(farthest, starts)
+        splitting = max_sq_dist > sq_tolerance
+        split = split[splitting]
+        keep[split] = True
 
-    if max_sq_dist > sq_tolerance:
-        if index - first > 1:
-            simplify_dp_step(points, first, index, sq_tolerance, simplified)
-        simplified.append(points[index])
-        if last - index > 1:
-            simplify_dp_step(points, index, last, sq_tolerance, simplified)
+        firsts = np.concatenate((firsts[splitting], split))
+        lasts = np.concatenate((split, lasts[splitting]))
+        inner = lasts - firsts > 1
+        firsts, lasts = firsts[inner], lasts[inner]
+    return np.flatnonzero(keep)
 
 
-def simplify_douglas_peucker(points: deque[Vector], sq_tolerance: float) -> deque[Vector]:
-    last = len(points) - 1
-    simplified = deque([points[0]])
-    simplify_dp_step(points, 0, last, sq_tolerance, simplified)
-    simplified.append(points[last])
-    return simplified
+# Returns the indices of the points kept by simplifying xy[first:last + 1].
+def simplify_douglas_peucker_indices(xy: np.ndarray, first: int, last: int, sq_tolerance: float) -> np.ndarray:
+    return simplify_douglas_peucker_ranges(xy, np.array([first]), np.array([last]), sq_tolerance)
 
 
-def simplify(points: deque[Vector], tolerance=1.0) -> deque[Vector]:
+# Returns the indices of the points farther than the tolerance from the last point kept before
+# them, and of the last point.
+def simplify_radial_distance_indices(xy: np.ndarray, sq_tolerance: float) -> np.ndarray:
+    xs = xy[:, 0].tolist()
+    ys = xy[:, 1].tolist()
+    indices = [0]
+    prev_x, prev_y = xs[0], ys[0]
+    for i in range(1, len(xs)):
+        dx = xs[i] - prev_x
+        dy = ys[i] - prev_y
+        if dx * dx + dy * dy > sq_tolerance:
+            indices.append(i)
+            prev_x, prev_y = xs[i], ys[i]
+    if indices[-1] != len(xs) - 1:
+        indices.append(len(xs) - 1)
+    return np.array(indices)
+
+
+def simplify_indices(xy: np.ndarray, sq_tolerance: float, high_quality=True) -> np.ndarray:
+    if high_quality:
+        return simplify_douglas_peucker_indices(xy, 0, len(xy) - 1, sq_tolerance)
+    radial = simplify_radial_distance_indices(xy, sq_tolerance)
+    return radial[simplify_douglas_peucker_indices(xy[radial], 0, len(radial) - 1, sq_tolerance)]
+
+
+def simplify(points, tolerance=1.0, high_quality=True) -> deque[Vector]:
     if len(points) <= 2:
         return points
     sq_tolerance = tolerance * tolerance
 
-    return simplify_douglas_peucker(points, sq_tolerance)
+    indices = simplify_indices(as_point_array(points), sq_tolerance, high_quality)
+    return deque(points[i] for i in indices.tolist())
+
+
+# 'simplify' of all lines at once, the Douglas-Peucker passes covering the points of all lines.
+def simplify_all(lines, tolerance=1.0, high_quality=True) -> list[deque[Vector]]:
+    sq_tolerance = tolerance * tolerance
+    long = [line for line in lines if len(line) > 2]
+    if not long:
+        return list(lines)
+
+    arrays = [as_point_array(line) for line in long]
+    if high_quality:
+        selected = [np.arange(len(xy)) for xy in arrays]
+    else:
+        selected = [simplify_radial_distance_indices(xy, sq_tolerance) for xy in arrays]
+    lengths = np.array([len(indices) for indices in selected])
+    firsts = np.cumsum(lengths) - lengths
+    xy = np.concatenate([points[indices] for points, indices in zip(arrays, selected)])
+    kept = simplify_douglas_peucker_ranges(xy, firsts, firsts + lengths - 1, sq_tolerance)
+
+    line_kept = np.split(kept, np.searchsorted(kept, firsts[1:]))
+    simplified = iter([
+        deque(line[i] for i in indices[line_kept[k] - firsts[k]].tolist())
+        for k, (line, indices) in enumerate(zip(long, selected))
+    ])
+    return [next(simplified) if len(line) > 2 else line for line in lines]
+
+
+# Simplification of a polyline whose points arrive one at a time, e.g. from a front of a streamline
+# while it is traced, with every point within tolerance of the result as after 'simplify'.
+#
+# The points since the last vertex are kept in a window. A new point extends the segment from
+# the last vertex if all points of the window are within tolerance of the segment to it, else
+# the previous point becomes a vertex. Windows hold at most max_window points, which bounds the
+# memory and the time taken by a point. The result usually has more vertices than 'simplify'.
+class StreamingSimplifier:
+    def __init__(self, tolerance=1.0, max_window=64):
+        self.sq_tolerance = tolerance * tolerance
+        self.max_window = max_window
+        self.vertices: list[Vector] = []
+        # Points between the last vertex and the last point.
+        self.window: list[Vector] = []
+        self.last = None
+
+    def add(self, point: Vector):
+        if not self.vertices:
+            self.vertices.append(point)
+            return
+        if self.last is not None:
+            vertex = self.vertices[-1]
+            if len(self.window) < self.max_window and all(
+                square_segment_distance(p.x, p.y, vertex.x, vertex.y, point.x, point.y) <= self.sq_tolerance
+                for p in (*self.window, self.last)
+            ):
+                self.window.append(self.last)
+            else:
+                self.vertices.append(self.last)
+                self.window = []
+        self.last = point
+
+    # The simplified polyline of the points added so far.
+    def result(self) -> list[Vector]:
+        return self.vertices if self.last is None else [*self.vertices, self.last]
+
+
+# Joins the simplifications of the backward and the forward front of a streamline, which both
+# start at the seed, into the simplified streamline.
+def join_fronts(backward: StreamingSimplifier, forward: StreamingSimplifier) -> deque[Vector]:
+    result = deque(reversed(backward.result()))
+    result.extend(islice(forward.result(), 1, None))
+    return result
+
+
+# Simplifies a traced streamline like StreamingSimplifiers fed by its fronts while it was traced,
+# seed_index being the index of its seed.
+def simplify_fronts(points, seed_index: int, tolerance=1.0, max_window=64) -> deque[Vector]:
+    backward = StreamingSimplifier(tolerance, max_window)
+    forward = StreamingSimplifier(tolerance, max_window)
+    xy = as_point_array(points)
+    for x, y in xy[seed_index::-1].tolist():
+        backward.add(Vector((x, y)))
+    for x, y in xy[seed_index:].tolist():
+        forward.add(Vector((x, y)))
+    return join_fronts(backward, forward)
+
+
+# Updates 'simplified', the simplification of points, after n_start points were prepended and
+# n_end points appended to points. Only the new points and the first and last segment of
+# simplified are simplified again and spliced onto the unchanged inner segments, so every point
+# is still within tolerance of the result, as it would be after simplifying all points again.
+def simplify_ends(points, simplified: deque[Vector], n_start: int, n_end: int,
+                  tolerance=1.0) -> deque[Vector]:
+    if len(simplified) < 4:
+        return simplify(points, tolerance)
+    sq_tolerance = tolerance * tolerance
+
+    # The inner vertices are found by their coordinates, the first ones after the prepended points.
+    xy = as_point_array(points)
+    head = simplified[1]
+    tail = simplified[-2]
+    heads = np.flatnonzero((xy[n_start:, 0] == head.x) & (xy[n_start:, 1] == head.y))
+    tails = np.flatnonzero((xy[:len(xy) - n_end, 0] == tail.x) & (xy[:len(xy) - n_end, 1] == tail.y))
+    if len(heads) == 0 or len(tails) == 0 or tails[-1] <= heads[0] + n_start:
+        return simplify(points, tolerance)
+    first = int(heads[0]) + n_start
+    last = int(tails[-1])
+
+    if n_start > 0:
+        result = deque(points[i] for i in simplify_douglas_peucker_indices(xy, 0, first, sq_tolerance).tolist())
+    else:
+        result = deque([simplified[0], head])
+    result.extend(islice(simplified, 2, len(simplified) - 2))
+    if n_end > 0:
+        result.extend(
+            points[i] for i in simplify_douglas_peucker_indices(xy, last, len(xy) - 1, sq_tolerance).tolist())
+    else:
+        result.extend([tail, simplified[-1]])
+    return result
@@ -0,0 +1,442 @@
+import heapq
+import math
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.grid_storage import GridStorage, NumpyGridStorage
+from roadGraphGen.roadGraphGen.tensor_field import as_point_array
+
+
+# Interface of spatial indices of points and polyline segments, e.g. for separation tests while
+# tracing streamlines and for intersection detection.
+# Every point and segment is stored with an item, by default the number of points or segments
+# added before it. Point queries return an (N, 2) array of the points and an array of their items.
+# Implementations must override all methods.
+class SpatialIndex:
+    def add_point(self, x, y, item=None):
+        raise NotImplementedError
+
+    # Adds all points of an (N, 2) array, with items defaulting to consecutive numbers.
+    def add_points(self, points: np.ndarray, items=None):
+        raise NotImplementedError
+
+    def add_segment(self, x1, y1, x2, y2, item=None):
+        raise NotImplementedError
+
+    # Points closer than radius to (x, y).
+    def query_radius(self, x, y, radius):
+        raise NotImplementedError
+
+    # Points inside the box from (min_x, min_y) to (max_x, max_y), bounds included.
+    def query_box(self, min_x, min_y, max_x, max_y):
+        raise NotImplementedError
+
+    # The k points closest to (x, y), closest first.
+    def nearest(self, x, y, k=1):
+        raise NotImplementedError
+
+    # Whether any point other than (x, y) itself is closer than sqrt(d_sq) to (x, y).
+    def any_within(self, x, y, d_sq) -> bool:
+        raise NotImplementedError
+
+    # Items of all segments intersecting the segment from (x1, y1) to (x2, y2), touching included.
+    def query_segments(self, x1, y1, x2, y2) -> list:
+        raise NotImplementedError
+
+
+class QuadtreeNode:
+    __slots__ = ('cx', 'cy', 'half', 'depth', 'children', 'xs', 'ys', 'items', 'arrays', 'segments')
+
+    def __init__(self, cx, cy, half, depth):
+        self.cx = cx
+        self.cy = cy
+        self.half = half
+        self.depth = depth
+        # Four children, indexed by (x >= cx) + 2 * (y >= cy), or None for leaves.
+        self.children = None
+        # Points of leaves.
+        self.xs = []
+        self.ys = []
+        self.items = []
+        # (points, items) arrays of the points of leaves, built on demand by 'get_arrays' and
+        # dropped when a point is added.
+        self.arrays = None
+        # (x1, y1, x2, y2, item) of the segments whose bounding box lies within this node, but not
+        # within a single child.
+        self.segments = []
+
+    def split(self):
+        quarter = self.half / 2
+        self.children = [
+            QuadtreeNode(self.cx + (quarter if i & 1 else -quarter), self.cy + (quarter if i & 2 else -quarter),
+                         quarter, self.depth + 1)
+            for i in range(4)
+        ]
+        for x, y, item in zip(self.xs, self.ys, self.items):
+            child = self.children[(x >= self.cx) + 2 * (y >= self.cy)]
+            child.xs.append(x)
+            child.ys.append(y)
+            child.items.append(item)
+        self.xs = self.ys = self.items = self.arrays = None
+
+    def get_arrays(self):
+        if self.arrays is None:
+            self.arrays = (
+                np.array([self.xs, self.ys], dtype=np.float64).T.reshape(-1, 2),
+                np.array(self.items, dtype=np.int64)
+            )
+        return self.arrays
+
+    # Squared distance of (x, y) to the square of the node, 0 inside.
+    def distance_sq(self, x, y):
+        dx = max(abs(x - self.cx) - self.half, 0)
+        dy = max(abs(y - self.cy) - self.half, 0)
+        return dx * dx + dy * dy
+
+    def overlaps_box(self, min_x, min_y, max_x, max_y):
+        return (
+            min_x <= self.cx + self.half and max_x >= self.cx - self.half
+            and min_y <= self.cy + self.half and max_y >= self.cy - self.half
+        )
+
+
+# Point region quadtree over the square enclosing the domain given by origin and dimensions.
+# Leaves are split once they hold more than 'capacity' points, up to max_depth. Segments are
+# stored at the deepest node containing their bounding box, as in an MX-CIF quadtree.
+# Points and segments outside of the square are kept in an overflow node, tested by every query.
+#
+# 'add_points' into an empty tree bulk loads the points, partitioning them with NumPy instead of
+# inserting them one by one.
+class Quadtree(SpatialIndex):
+    def __init__(self, origin: Vector, dimensions: Vector, capacity=32, max_depth=16):
+        half = max(dimensions.x, dimensions.y) / 2
+        self.root = QuadtreeNode(origin.x + half, origin.y + half, half, 0)
+        self.overflow = QuadtreeNode(0, 0, 0, 0)
+        self.capacity = capacity
+        self.max_depth = max_depth
+        self.n_points = 0
+        self.n_segments = 0
+
+    def __len__(self):
+        return self.n_points
+
+    def contains(self, x, y):
+        return abs(x - self.root.cx) <= self.root.half and abs(y - self.root.cy) <= self.root.half
+
+    def add_point(self, x, y, item=None):
+        if item is None:
+            item = self.n_points
+        self.n_points += 1
+        if not self.contains(x, y):
+            node = self.overflow
+        else:
+            node = self.root
+            while node.children is not None:
+                node = node.children[(x >= node.cx) + 2 * (y >= node.cy)]
+        node.xs.append(x)
+        node.ys.append(y)
+        node.items.append(item)
+        node.arrays = None
+        if node is not self.overflow and len(node.xs) > self.capacity and node.depth < self.max_depth:
+            node.split()
+
+    def add_points(self, points: np.ndarray, items=None):
+        points = as_point_array(points)
+        if items is None:
+            items = range(self.n_points, self.n_points + len(points))
+        items = np.asarray(items)
+        if self.n_points > 0:
+            for (x, y), item in zip(points.tolist(), items.tolist()):
+                self.add_point(x, y, item)
+            return
+
+        self.n_points = len(points)
+        inside = (np.abs(points[:, 0] - self.root.cx) <= self.root.half) & (
+            np.abs(points[:, 1] - self.root.cy) <= self.root.half)
+        self.overflow.xs = points[~inside, 0].tolist()
+        self.overflow.ys = points[~inside, 1].tolist()
+        self.overflow.items = items[~inside].tolist()
+        self.overflow.arrays = None
+        self.bulk_load(self.root, points[inside], items[inside])
+
+    def bulk_load(self, node: QuadtreeNode, points: np.ndarray, items: np.ndarray):
+        if len(points) <= self.capacity or node.depth >= self.max_depth:
+            node.xs = points[:, 0].tolist()
+            node.ys = points[:, 1].tolist()
+            node.items = items.tolist()
+            node.arrays = None
+            return
+        node.split()
+        quadrants = (points[:, 0] >= node.cx) + 2 * (points[:, 1] >= node.cy)
+        for i, child in enumerate(node.children):
+            mask = quadrants == i
+            self.bulk_load(child, points[mask], items[mask])
+
+    def add_segment(self, x1, y1, x2, y2, item=None):
+        if item is None:
+            item = self.n_segments
+        self.n_segments += 1
+        min_x, max_x = min(x1, x2), max(x1, x2)
+        min_y, max_y = min(y1, y2), max(y1, y2)
+        if not (self.contains(min_x, min_y) and self.contains(max_x, max_y)):
+            self.overflow.segments.append((x1, y1, x2, y2, item))
+            return
+        node = self.root
+        while node.children is not None:
+            low = (min_x >= node.cx) + 2 * (min_y >= node.cy)
+            if low != (max_x >= node.cx) + 2 * (max_y >= node.cy):
+                break
+            node = node.children[low]
+        node.segments.append((x1, y1, x2, y2, item))
+
+    # Yields all nodes overlapping the box, the overflow node first.
+    def nodes_in_box(self, min_x, min_y, max_x, max_y):
+        yield self.overflow
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.overlaps_box(min_x, min_y, max_x, max_y):
+                yield node
+                if node.children is not None:
+                    stack.extend(node.children)
+
+    # Leaves entirely inside of the box are taken as a whole, without testing their points.
+    def query_box(self, min_x, min_y, max_x, max_y):
+        points = []
+        items = []
+        for node in self.nodes_in_box(min_x, min_y, max_x, max_y):
+            if node.children is not None or not node.xs:
+                continue
+            node_points, node_items = node.get_arrays()
+            if node is self.overflow or not (
+                node.cx - node.half >= min_x and node.cx + node.half <= max_x
+                and node.cy - node.half >= min_y and node.cy + node.half <= max_y
+            ):
+                inside = (
+                    (node_points[:, 0] >= min_x) & (node_points[:, 0] <= max_x)
+                    & (node_points[:, 1] >= min_y) & (node_points[:, 1] <= max_y)
+                )
+                node_points = node_points[inside]
+                node_items = node_items[inside]
+            points.append(node_points)
+            items.append(node_items)
+        if not points:
+            return np.zeros((0, 2)), np.zeros(0, dtype=np.int64)
+        return np.concatenate(points), np.concatenate(items)
+
+    def query_radius(self, x, y, radius):
+        points, items = self.query_box(x - radius, y - radius, x + radius, y + radius)
+        inside = (points[:, 0] - x) ** 2 + (points[:, 1] - y) ** 2 < radius * radius
+        return points[inside], items[inside]
+
+    # Called every integration step, so nodes are only visited until a point is found.
+    def any_within(self, x, y, d_sq) -> bool:
+        stack = [self.overflow, self.root]
+        while stack:
+            node = stack.pop()
+            if node.children is not None:
+                for child in node.children:
+                    if child.distance_sq(x, y) < d_sq:
+                        stack.append(child)
+                continue
+            for sx, sy in zip(node.xs, node.ys):
+                if (sx != x or sy != y) and (sx - x) ** 2 + (sy - y) ** 2 < d_sq:
+                    return True
+        return False
+
+    # Best first search over nodes and points, ordered by their distance to (x, y).
+    def nearest(self, x, y, k=1):
+        heap = [(0.0, 0, self.overflow), (self.root.distance_sq(x, y), 1, self.root)]
+        counter = 2
+        found = []
+        while heap and len(found) < k:
+            distance_sq, _, entry = heapq.heappop(heap)
+            if not isinstance(entry, QuadtreeNode):
+                found.append(entry)
+                continue
+            if entry.children is not None:
+                for child in entry.children:
+                    heapq.heappush(heap, (child.distance_sq(x, y), counter, child))
+                    counter += 1
+                continue
+            for sx, sy, item in zip(entry.xs, entry.ys, entry.items):
+                heapq.heappush(heap, ((sx - x) ** 2 + (sy - y) ** 2, counter, (sx, sy, item)))
+                counter += 1
+        points = np.array([(sx, sy) for sx, sy, _ in found], dtype=np.float64).reshape(-1, 2)
+        return points, np.array([item for _, _, item in found], dtype=np.int64)
+
+    def query_segments(self, x1, y1, x2, y2) -> list:
+        min_x, max_x = min(x1, x2), max(x1, x2)
+        min_y, max_y = min(y1, y2), max(y1, y2)
+        items = []
+        for node in self.nodes_in_box(min_x, min_y, max_x, max_y):
+            for sx1, sy1, sx2, sy2, item in node.segments:
+                if (
+                    min(sx1, sx2) <= max_x and max(sx1, sx2) >= min_x
+                    and min(sy1, sy2) <= max_y and max(sy1, sy2) >= min_y
+                    and segments_intersect(x1, y1, x2, y2, sx1, sy1, sx2, sy2)
+                ):
+                    items.append(item)
+        return items
+
+
+def orientation(ax, ay, bx, by, cx, cy):
+    cross = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    return (cross > 0) - (cross < 0)
+
+
+# Whether the segments from a1 to a2 and from b1 to b2 intersect, touching and collinear overlap
+# included. The bounding boxes of the segments must overlap.
+def segments_intersect(ax1, ay1, ax2, ay2, bx1, by1, bx2, by2):
+    o1 = orientation(ax1, ay1, ax2, ay2, bx1, by1)
+    o2 = orientation(ax1, ay1, ax2, ay2, bx2, by2)
+    o3 = orientation(bx1, by1, bx2, by2, ax1, ay1)
+    o4 = orientation(bx1, by1, bx2, by2, ax2, ay2)
+    # Collinear segments with overlapping bounding boxes overlap.
+    return (o1 != o2 and o3 != o4) or (o1 == o2 == o3 == o4 == 0)
+
+
+# Streamline sample storage of a StreamlineGenerator on a Quadtree, selectable as its grid_class.
+# Separation tests are radius queries, so their cost depends on the number of nearby samples
+# rather than on the ratio of the test distance and dsep.
+#
+# Queries return the same samples in the same order as a GridStorage with cells of dsep would,
+# i.e. ordered by cell and insertion, so streamlines do not depend on the storage. Samples
+# outside of the domain, which a GridStorage keeps in its first cell, are kept apart from the tree.
+#
+# The segments between consecutive points of the polylines added are stored in the tree as well,
+# items being the number of their first sample. 'set_samples' restores samples without polylines,
+# and so without segments.
+class QuadtreeStorage(GridStorage):
+    def __init__(self, world_dimensions: Vector, origin: Vector, dsep, capacity=32):
+        self.world_dimensions: Vector = world_dimensions
+        self.origin: Vector = origin
+        self.dsep = dsep
+        self.dsep_sq = self.dsep ** 2
+        self.grid_dimensions = Vector((world_dimensions.x / dsep, world_dimensions.y / dsep))
+        self.grid_shape = (math.ceil(self.grid_dimensions.x), math.ceil(self.grid_dimensions.y))
+        self.capacity = capacity
+        self.linked_grids: list[GridStorage] = []
+        self.clear()
+
+    def clear(self):
+        self.tree = Quadtree(self.origin, self.world_dimensions, self.capacity)
+        # Leaf holding the samples outside of the domain.
+        self.outside = QuadtreeNode(0, 0, 0, 0)
+        self.n_samples = 0
+        self.sample_index = None
+
+    def add_sample(self, v, coords=None):
+        local = v - self.origin
+        if local.x < 0 or local.y < 0 or local.x >= self.world_dimensions.x or local.y >= self.world_dimensions.y:
+            self.outside.xs.append(v.x)
+            self.outside.ys.append(v.y)
+            self.outside.items.append(self.n_samples)
+            self.outside.arrays = None
+        else:
+            self.tree.add_point(v.x, v.y, self.n_samples)
+        self.n_samples += 1
+        self.sample_index = None
+
+    def add_polyline(self, line):
+        points = as_point_array(line)
+        first = self.n_samples
+        self.add_samples(points)
+        # Segments between consecutive points, with the item of their first point.
+        for i, ((x1, y1), (x2, y2)) in enumerate(zip(points[:-1].tolist(), points[1:].tolist())):
+            self.tree.add_segment(x1, y1, x2, y2, first + i)
+
+    # Samples of other grids are not polylines, so no segments are added for them.
+    def add_all(self, grid_storage: GridStorage):
+        self.add_samples(grid_storage.samples_to_arrays()[0])
+
+    # Adds the points of an (N, 2) array as samples, without segments.
+    def add_samples(self, points: np.ndarray):
+        items = np.arange(self.n_samples, self.n_samples + len(points))
+        outside = self.points_out_of_bounds(points)
+        if outside.any():
+            self.outside.xs.extend(points[outside, 0].tolist())
+            self.outside.ys.extend(points[outside, 1].tolist())
+            self.outside.items.extend(items[outside].tolist())
+            self.outside.arrays = None
+        self.tree.add_points(points[~outside], items[~outside])
+        self.n_samples += len(points)
+        self.sample_index = None
+
+    # Items of the first points of all polyline segments intersecting the segment from (x1, y1)
+    # to (x2, y2), e.g. to find the streamlines a new one crosses.
+    def query_segments(self, x1, y1, x2, y2) -> list:
+        return self.tree.query_segments(x1, y1, x2, y2)
+
+    def all_samples(self):
+        points, items = self.tree.query_box(-math.inf, -math.inf, math.inf, math.inf)
+        outside_points, outside_items = self.outside.get_arrays()
+        return np.concatenate((points, outside_points)), np.concatenate((items, outside_items))
+
+    # Returns the samples ordered by cell and insertion, with the number of samples of every cell,
+    # like GridStorage.
+    def samples_to_arrays(self):
+        points, items = self.all_samples()
+        cells = self.get_point_cells(points)
+        order = np.lexsort((items, cells[:, 1], cells[:, 0]))
+        counts = np.bincount(cells[:, 0] * self.grid_shape[1] + cells[:, 1],
+                             minlength=self.grid_shape[0] * self.grid_shape[1])
+        return points[order], counts.astype(np.int64)
+
+    def set_samples(self, points: np.ndarray, counts: np.ndarray):
+        self.clear()
+        self.add_samples(np.asarray(points, dtype=np.float64))
+
+    def is_valid_sample(self, v, d_sq=None) -> bool:
+        if d_sq is None:
+            d_sq = self.dsep_sq
+        cx, cy = self.get_sample_cell(v)
+        local = v - self.origin
+        if local.x < 0 or local.y < 0 or local.x >= self.world_dimensions.x or local.y >= self.world_dimensions.y:
+            # A GridStorage tests samples outside of the domain against the cells around the first one.
+            if not NumpyGridStorage.points_far_from(self.get_samples_in_cells(0, 1, 0, 1), v.x, v.y, d_sq):
+                return False
+        elif self.tree.any_within(v.x, v.y, d_sq):
+            return False
+        elif cx <= 1 and cy <= 1 and self.outside.xs and not NumpyGridStorage.points_far_from(
+                self.outside.get_arrays()[0], v.x, v.y, d_sq):
+            return False
+        return all(grid.is_valid_sample(v, d_sq) for grid in self.linked_grids)
+
+    def get_nearby_points(self, v, distance):
+        return [Vector(p) for p in self.get_nearby_point_array(v, distance).tolist()]
+
+    def get_nearby_point_array(self, v, distance) -> np.ndarray:
+        radius = max(1, math.ceil((distance / self.dsep) - 0.5))
+        cx, cy = self.get_sample_cell(v)
+        arrays = [self.get_samples_in_cells(cx - radius, cx + radius, cy - radius, cy + radius)]
+        arrays.extend(grid.get_nearby_point_array(v, distance) for grid in self.linked_grids)
+        return np.concatenate(arrays)
+
+    def get_cell_array(self, x, y) -> np.ndarray:
+        return self.get_samples_in_cells(x, x, y, y)
+
+    # Samples of the cells from min_x to max_x and min_y to max_y of a GridStorage with cells of
+    # dsep, in its order.
+    def get_samples_in_cells(self, min_x, max_x, min_y, max_y) -> np.ndarray:
+        min_x, min_y = max(0, min_x), max(0, min_y)
+        max_x, max_y = min(self.grid_shape[0] - 1, max_x), min(self.grid_shape[1] - 1, max_y)
+        if min_x > max_x or min_y > max_y:
+            return np.zeros((0, 2))
+        # Cells are computed in single precision, so the box is a little larger than the cells.
+        margin = self.dsep * 1e-3
+        points, items = self.tree.query_box(
+            self.origin.x + min_x * self.dsep - margin, self.origin.y + min_y * self.dsep - margin,
+            self.origin.x + (max_x + 1) * self.dsep + margin, self.origin.y + (max_y + 1) * self.dsep + margin
+        )
+        if min_x == 0 and min_y == 0 and self.outside.xs:
+            outside_points, outside_items = self.outside.get_arrays()
+            points = np.concatenate((points, outside_points))
+            items = np.concatenate((items, outside_items))
+        cells = self.get_point_cells(points)
+        inside = (
+            (cells[:, 0] >= min_x) & (cells[:, 0] <= max_x) & (cells[:, 1] >= min_y) & (cells[:, 1] <= max_y)
+        )
+        order = np.lexsort((items[inside], cells[inside, 1], cells[inside, 0]))
+        return points[inside][order]
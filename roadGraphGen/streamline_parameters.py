@@ -10,6 +10,9 @@
 # seed_tries: upper limit for attempts to sample random seed
 # simplify_tolerance: tolerance for polyline simplification (see Douglas-Peucker)
 # collide_early: change of early collision, 0-1
+# tolerance: local error tolerance per step of adaptive integrators
+# min_step: lower limit for the step size of adaptive integrators
+# max_step: upper limit for the step size of adaptive integrators
 class StreamlineParameters:
     def __init__(
             self,
@@ -22,7 +25,10 @@ class StreamlineParameters:
             path_iterations,
             seed_tries,
             simplify_tolerance,
-            collide_early):
+            collide_early,
+            tolerance=0.01,
+            min_step=0.25,
+            max_step=25):
         self.dsep = dsep
         self.dtest = dtest
         self.dstep = dstep
@@ -33,6 +39,9 @@ class StreamlineParameters:
         self.seed_tries = seed_tries
         self.simplify_tolerance = simplify_tolerance
         self.collide_early = collide_early
+        self.tolerance = tolerance
+        self.min_step = min_step
+        self.max_step = max_step
 
     def copy(self):
         return StreamlineParameters(
@@ -45,7 +54,10 @@ class StreamlineParameters:
             self.path_iterations,
             self.seed_tries,
             self.simplify_tolerance,
-            self.collide_early
+            self.collide_early,
+            self.tolerance,
+            self.min_step,
+            self.max_step
         )
 
     def copy_sq(self):
@@ -59,5 +71,8 @@ class StreamlineParameters:
             self.path_iterations ** 2,
             self.seed_tries ** 2,
             self.simplify_tolerance ** 2,
-            self.collide_early ** 2
+            self.collide_early ** 2,
+            self.tolerance ** 2,
+            self.min_step ** 2,
+            self.max_step ** 2
         )
@@ -2,12 +2,20 @@ import math
 import numpy as np
 
 from collections import deque
+from itertools import islice
 from mathutils import Vector
 
-from roadGraphGen.roadGraphGen.grid_storage import GridStorage
+from roadGraphGen.roadGraphGen.batch_tracing import LockstepTracer
+from roadGraphGen.roadGraphGen.checkpoint import load_checkpoint, save_checkpoint
+from roadGraphGen.roadGraphGen.grid_storage import GridStorage, StreamlinePointHash
 from roadGraphGen.roadGraphGen.integrator import FieldIntegrator
+from roadGraphGen.roadGraphGen.polyline import Polyline
+from roadGraphGen.roadGraphGen.seed_sampler import FreeSpaceSampler
 from roadGraphGen.roadGraphGen.streamline_parameters import StreamlineParameters
-from roadGraphGen.roadGraphGen.simplify import simplify
+from roadGraphGen.roadGraphGen.simplify import (
+    StreamingSimplifier, join_fronts, simplify, simplify_all, simplify_ends, simplify_fronts
+)
+from roadGraphGen.roadGraphGen.tensor_field import as_point_array, region_contains
 
 
 class StreamlineIntegration:
@@ -15,16 +23,36 @@ class StreamlineIntegration:
             self,
             seed: Vector,
             original_direction: Vector,
-            streamline: deque[Vector],
+            streamline: Polyline,
             previous_direction: Vector,
             previous_point: Vector,
-            valid: bool):
+            valid: bool,
+            point_hash: StreamlinePointHash,
+            position: int):
         self.seed = seed
         self.original_direction = original_direction
         self.streamline = streamline
         self.previous_direction = previous_direction
         self.previous_point = previous_point
         self.valid = valid
+        # Points of both fronts of the streamline and the position of previous_point along it,
+        # in steps from the seed, negative for the backward front.
+        self.point_hash = point_hash
+        self.position = position
+        self.position_step = 1 if position > 0 else -1
+        # StreamingSimplifier of the points of the front, if the streamline is simplified while
+        # it is traced.
+        self.simplifier = None
+
+    # Both fronts share the streamline, the forward front appends its points at the end, the
+    # backward front at the start.
+    def add_point(self, point: Vector):
+        if self.position_step > 0:
+            self.streamline.append(point)
+        else:
+            self.streamline.appendleft(point)
+        if self.simplifier is not None:
+            self.simplifier.add(point)
 
 
 # The StreamlineGenerator is responsible for streamline tracing/discretization, creating
@@ -34,6 +62,17 @@ class StreamlineIntegration:
 # required as input parameter.
 # Integration algorithm used is specified by the FieldIntegrator input parameter
 #   -> FieldIntegrator provides global tensor field to be sampled
+#
+# Streamlines are traced one at a time, or, with a batch size given to 'create_all_streamlines',
+# several at once by a LockstepTracer.
+#
+# Random seeds are drawn uniformly from the domain and rejected up to seed_tries times, or, after
+# 'enable_free_space_sampling', only from the space a FreeSpaceSampler considers free.
+#
+# After the tensor field has been edited, 'retrace_changed_region' removes only the stream-
+# lines passing through the changed region and fills the freed space with new streamlines.
+#
+# The state of the generator can be saved to and restored from a checkpoint file.
 class StreamlineGenerator:
     def __init__(
             self,
@@ -41,10 +80,25 @@ class StreamlineGenerator:
             origin: Vector,
             world_dimensions: Vector,
             parameters: StreamlineParameters,
-            seed: int):
+            seed: int,
+            grid_class=GridStorage):
 
         self.SEED_AT_ENDPOINTS = False
         self.NEAR_EDGE = 3
+        # Number of random seed points of the first chunk SEED_FARTHEST chooses from, growing
+        # fourfold with every chunk without a valid point.
+        self.SEED_CHUNK = 8
+        # Takes the valid random seed point farthest from existing streamlines of a chunk rather
+        # than the first one. Needs a grid_class with 'get_clearance', e.g. ClearanceGridStorage.
+        self.SEED_FARTHEST = False
+        # Simplifies streamlines without the radial distance prefilter of simplify.js.
+        self.SIMPLIFY_HIGH_QUALITY = True
+        # Simplifies streamlines while they are traced, with a StreamingSimplifier per front,
+        # instead of afterwards.
+        self.STREAMING_SIMPLIFICATION = False
+        # Keeps the traced points of streamlines. Otherwise streamlines are replaced by their
+        # simplification once their points are in the grid, see 'traced_points'.
+        self.KEEP_DENSE_STREAMLINES = True
 
         self.clear_streamlines()
 
@@ -52,7 +106,11 @@ class StreamlineGenerator:
         self.candidate_seeds_minor: deque[Vector] = deque([])
         self.streamlines_done = True
         self.last_streamline_major = True
+        self.joining = None
+        self.first_major = 0
+        self.first_minor = 0
         self.integrator = integrator
+        self.field_version = integrator.field.version
         self.origin = origin
         self.world_dimensions = world_dimensions
         self.parameters = parameters
@@ -68,9 +126,14 @@ class StreamlineGenerator:
         # Number of samples to ignore backwards when checking streamline collision with itself.
         self.n_streamline_look_back = 2 * self.n_streamline_step
 
-        self.major_grid = GridStorage(self.world_dimensions, self.origin, parameters.dsep)
-        self.minor_grid = GridStorage(self.world_dimensions, self.origin, parameters.dsep)
+        # Class of the grids of the streamline samples, e.g. GridStorage, NumpyGridStorage,
+        # SparseGridStorage, QuadtreeStorage or ClearanceGridStorage.
+        self.grid_class = grid_class
+        self.major_grid = grid_class(self.world_dimensions, self.origin, parameters.dsep)
+        self.minor_grid = grid_class(self.world_dimensions, self.origin, parameters.dsep)
         self.parameters_sq = self.parameters.copy_sq()
+        self.tracer = LockstepTracer(self)
+        self.seed_sampler = None
 
     def randomize_seed(self):
         rng = np.random.default_rng()
@@ -82,38 +145,100 @@ class StreamlineGenerator:
         self.streamlines_minor = deque([])
         self.all_streamlines_simple = deque([])
 
+    def enable_free_space_sampling(self, subdivisions=8, max_failures=3):
+        self.seed_sampler = FreeSpaceSampler(
+            self.origin, self.world_dimensions, self.parameters.dsep, subdivisions, max_failures)
+        self.stamp_streamlines()
+
+    def disable_free_space_sampling(self):
+        self.seed_sampler = None
+
+    # Blocks the space taken by all current streamlines in the free space sampler.
+    def stamp_streamlines(self):
+        self.seed_sampler.clear()
+        for major in [True, False]:
+            for streamline in self.streamlines(major):
+                self.seed_sampler.stamp(major, self.traced_points(streamline))
+
+    # Saves the state of the generator to a checkpoint file, see checkpoint.py.
+    # A generation driven by 'update' can be saved between two calls and resumed after
+    # 'load_checkpoint' with the same result, except while dangling streamlines are joined.
+    def save_checkpoint(self, path):
+        save_checkpoint(self, path)
+
+    def load_checkpoint(self, path):
+        load_checkpoint(self, path)
+
+    # Road level of every streamline of all_streamlines, see StreamlineHierarchy. The streamlines
+    # of a single generator form one level.
+    @property
+    def streamline_levels(self):
+        return [0] * len(self.all_streamlines)
+
     def streamlines(self, major: bool):
         return self.streamlines_major if major else self.streamlines_minor
 
     def grid(self, major: bool):
         return self.major_grid if major else self.minor_grid
 
-    def simplify_streamline(self, streamline: deque[Vector]):
-        return simplify(streamline, self.parameters.simplify_tolerance)
-
-    def join_dangling_streamlines(self):
+    def simplify_streamline(self, streamline: Polyline):
+        return simplify(streamline, self.parameters.simplify_tolerance, self.SIMPLIFY_HIGH_QUALITY)
+
+    # Points of streamline at most dstep apart, as traced, to find the streamlines in a region
+    # or to fill grids with. Streamlines replaced by their simplification are resampled at dstep,
+    # which is within simplify_tolerance of the traced points.
+    def traced_points(self, streamline: Polyline):
+        if self.KEEP_DENSE_STREAMLINES:
+            return streamline
+        return streamline.resampled(self.parameters.dstep)
+
+    # Joins the dangling ends of all streamlines, or of the streamlines starting at the given
+    # indices of streamlines_major and streamlines_minor.
+    def join_dangling_streamlines(self, first_major=0, first_minor=0):
+        for _ in self.join_dangling_steps(first_major, first_minor):
+            pass
+
+    # Generator variant of 'join_dangling_streamlines', yielding after every streamline.
+    # The simplified streamlines are updated at the joined ends only.
+    def join_dangling_steps(self, first_major=0, first_minor=0):
+        indices = {id(streamline): i for i, streamline in enumerate(self.all_streamlines)}
         for major in [True, False]:
-            for streamline in self.streamlines(major):
-                # Ignore circles.
-                if streamline[0] == streamline[-1]:
-                    continue
-
-                new_start = self.get_best_next_point(streamline[0], streamline[4])
-                if new_start is not None:
-                    for p in self.points_between(streamline[0], new_start, self.parameters.dstep):
-                        streamline.appendleft(p)
-                        self.grid(major).add_sample(p)
-
-                new_end = self.get_best_next_point(streamline[-1], streamline[-4])
-                if new_end is not None:
-                    for p in self.points_between(streamline[-1], new_end, self.parameters.dstep):
-                        streamline.append(p)
-                        self.grid(major).add_sample(p)
-
-        self.all_streamlines_simple = deque([])
-        for s in self.all_streamlines:
-            self.all_streamlines_simple.append(self.simplify_streamline(s))
-
+            for streamline in islice(self.streamlines(major), first_major if major else first_minor, None):
+                n_start, n_end = self.join_dangling_streamline(streamline, major)
+                if n_start > 0 or n_end > 0:
+                    streamline.trim(0)
+                    i = indices[id(streamline)]
+                    self.all_streamlines_simple[i] = simplify_ends(
+                        streamline, self.all_streamlines_simple[i], n_start, n_end, self.parameters.simplify_tolerance)
+                yield
+
+    # Extends both ends of streamline to the best next point, if any.
+    # Returns the number of points added at the start and at the end.
+    def join_dangling_streamline(self, streamline: Polyline, major: bool):
+        # Ignore circles.
+        if streamline[0] == streamline[-1]:
+            return 0, 0
+
+        points = self.traced_points(streamline)
+        n_start = 0
+        new_start = self.get_best_next_point(points[0], points[4])
+        if new_start is not None:
+            for p in self.points_between(streamline[0], new_start, self.parameters.dstep):
+                streamline.appendleft(p)
+                self.grid(major).add_sample(p)
+                n_start += 1
+
+        n_end = 0
+        new_end = self.get_best_next_point(points[-1], points[-4])
+        if new_end is not None:
+            for p in self.points_between(streamline[-1], new_end, self.parameters.dstep):
+                streamline.append(p)
+                self.grid(major).add_sample(p)
+                n_end += 1
+        return n_start, n_end
+
+    # Returns points dstep apart from v1 towards v2, up to the first one at which the field is
+    # degenerate.
     def points_between(self, v1: Vector, v2: Vector, dstep):
         d = math.sqrt((v1.x - v2.x) ** 2 + (v1.y - v2.y) ** 2)
         n_points = math.floor(d / dstep)
@@ -122,42 +247,42 @@ class StreamlineGenerator:
 
         step_vector = v2 - v1
 
-        out = []
-
-        i = 1
-        next = v1 + (step_vector * (i / n_points))
-        for i in range(1, n_points + 1):
-            if self.integrator.integrate(next, True).length_squared > 0.001:
-                out.append(next)
-            else:
-                return out
-            next = v1 + (step_vector * (i / n_points))
+        # The first point is repeated and v2 itself is left out, as the points were always generated.
+        out = [v1 + (step_vector * (1 / n_points))]
+        for i in range(1, n_points):
+            out.append(v1 + (step_vector * (i / n_points)))
 
+        degenerate = np.flatnonzero(self.integrator.degenerate_points(np.array([p.xy for p in out])))
+        if len(degenerate):
+            return out[:degenerate[0]]
         return out
 
+    # Finds the closest sample of either grid ahead of point, within dlookahead and at most
+    # joinangle away from the direction from previous_point, to join a dangling streamline end
+    # to. Samples closer than sqrt(2) * dstep are taken immediately.
     def get_best_next_point(self, point: Vector, previous_point: Vector):
-        nearby_points = self.major_grid.get_nearby_points(point, self.parameters.dlookahead)
-        nearby_points.extend(self.minor_grid.get_nearby_points(point, self.parameters.dlookahead))
         direction = point - previous_point
 
         closest_sample = None
         closest_distance = math.inf
-
-        for sample in nearby_points:
-            if sample != point and sample != previous_point:
-                difference_vector = sample - point
-                if difference_vector.dot(direction) < 0:
-                    continue
-
-                distance_to_sample = (point.x - sample.x) ** 2 + (point.y - sample.y) ** 2
-                if distance_to_sample < 2 * self.parameters_sq.dstep:
-                    closest_sample = sample
-                    break
-
-                angle_between = direction.angle(difference_vector)
-                if angle_between < self.parameters.joinangle and distance_to_sample < closest_distance:
-                    closest_distance = distance_to_sample
-                    closest_sample = sample
+        for grid in [self.major_grid, self.minor_grid]:
+            found = grid.get_nearest_in_cone(
+                point,
+                direction,
+                self.parameters.dlookahead,
+                self.parameters.joinangle,
+                2 * self.parameters_sq.dstep,
+                (point, previous_point)
+            )
+            if found is None:
+                continue
+            sample, distance_to_sample, near = found
+            if near:
+                closest_sample = sample
+                break
+            if distance_to_sample < closest_distance:
+                closest_distance = distance_to_sample
+                closest_sample = sample
 
         if closest_sample is not None:
             direction.normalize()
@@ -165,6 +290,8 @@ class StreamlineGenerator:
 
         return closest_sample
 
+    # Makes the streamlines of s, e.g. of a coarser road level, part of the grids of this generator,
+    # see GridStorage.extend. New streamlines keep their distance to them and may join onto them.
     def add_existing_streamlines(self, s: 'StreamlineGenerator'):
         self.major_grid.extend(s.major_grid)
         self.minor_grid.extend(s.minor_grid)
@@ -173,22 +300,98 @@ class StreamlineGenerator:
         self.major_grid = s.major_grid
         self.minor_grid = s.minor_grid
 
+    # Incremental alternative to 'create_all_streamlines', for callers that must not block.
+    # After 'start_streamlines', every call of 'update' creates one streamline and, once no seed
+    # is left, joins the dangling ends of one streamline at a time. Returns False when done.
+    # The result is the same as that of 'create_all_streamlines' without a batch size.
+    def start_streamlines(self):
+        self.streamlines_done = False
+        self.field_version = self.integrator.field.version
+        self.first_major = len(self.streamlines_major)
+        self.first_minor = len(self.streamlines_minor)
+        # The first streamline is major, as in 'create_all_streamlines'.
+        self.last_streamline_major = False
+        self.joining = None
+
     def update(self):
-        if not self.streamlines_done:
+        if self.streamlines_done:
+            return False
+        if self.joining is None:
             self.last_streamline_major = not self.last_streamline_major
             if not self.create_streamline(self.last_streamline_major):
-                self.streamlines_done = True
-                self.resolve()
-            return True
-        return False
+                self.joining = self.join_dangling_steps(self.first_major, self.first_minor)
+        elif next(self.joining, StopIteration) is StopIteration:
+            self.joining = None
+            self.streamlines_done = True
+        return True
 
     # Creates all possible streamlines at once.
-    def create_all_streamlines(self):
+    # With a batch_size, up to batch_size streamlines are traced together by the LockstepTracer,
+    # see 'create_streamline_batch'. The result does not depend on the batch size, but as the
+    # tracer works in double precision, it differs slightly from tracing without a batch size.
+    # Seeding at endpoints and free space sampling depend on every previous streamline, so they
+    # are never batched.
+    # Dangling ends of the new streamlines are joined unless join_dangling is False.
+    def create_all_streamlines(self, batch_size=None, join_dangling=True):
         self.streamlines_done = False
+        self.field_version = self.integrator.field.version
+        first_major = len(self.streamlines_major)
+        first_minor = len(self.streamlines_minor)
         major = True
-        while self.create_streamline(major):
-            major = not major
-        self.join_dangling_streamlines()
+        if batch_size is not None and not self.SEED_AT_ENDPOINTS and self.seed_sampler is None:
+            creating = True
+            while creating:
+                creating, major = self.create_streamline_batch(major, batch_size)
+        else:
+            while self.create_streamline(major):
+                major = not major
+        if join_dangling:
+            self.join_dangling_streamlines(first_major, first_minor)
+        self.streamlines_done = True
+
+    # Retraces the streamlines affected by changes of the tensor field since the last generation.
+    # Returns False if the field did not change.
+    def retrace_changed_region(self, batch_size=None):
+        region = self.integrator.field.get_dirty_region(self.field_version)
+        if region is None:
+            return False
+        if self.integrator.raster is not None:
+            self.integrator.raster.refresh()
+        self.remove_streamlines_in_region(region)
+        self.create_all_streamlines(batch_size)
+        return True
+
+    # Removes all streamlines with points inside region and rebuilds the grids from the others.
+    def remove_streamlines_in_region(self, region):
+        removed = set()
+        all_streamlines = deque([])
+        all_streamlines_simple = deque([])
+        for streamline, simple in zip(self.all_streamlines, self.all_streamlines_simple):
+            if any(region_contains(region, p) for p in self.traced_points(streamline)):
+                removed.add(id(streamline))
+            else:
+                all_streamlines.append(streamline)
+                all_streamlines_simple.append(simple)
+
+        self.all_streamlines = all_streamlines
+        self.all_streamlines_simple = all_streamlines_simple
+        self.streamlines_major = deque(s for s in self.streamlines_major if id(s) not in removed)
+        self.streamlines_minor = deque(s for s in self.streamlines_minor if id(s) not in removed)
+        self.candidate_seeds_major.clear()
+        self.candidate_seeds_minor.clear()
+
+        for major in [True, False]:
+            grid = self.grid_class(self.world_dimensions, self.origin, self.parameters.dsep)
+            grid.linked_grids = self.grid(major).linked_grids
+            for streamline in self.streamlines(major):
+                grid.add_polyline(self.traced_points(streamline))
+            if major:
+                self.major_grid = grid
+            else:
+                self.minor_grid = grid
+
+        if self.seed_sampler is not None:
+            self.stamp_streamlines()
 
     # Creates a single streamline.
     # Finds seed point and adds new seed candidates afterwards.
@@ -196,18 +399,83 @@ class StreamlineGenerator:
         seed = self.get_seed(major)
         if seed is None:
             return False
-        streamline = self.integrate_streamline(seed, major)
-        if self.valid_streamline(streamline):
-            self.grid(major).add_polyline(streamline)
-            self.streamlines(major).append(streamline)
-            self.all_streamlines.append(streamline)
-
-            self.all_streamlines_simple.append(self.simplify_streamline(streamline))
+        if self.STREAMING_SIMPLIFICATION:
+            forward = StreamingSimplifier(self.parameters.simplify_tolerance)
+            backward = StreamingSimplifier(self.parameters.simplify_tolerance)
+            streamline = self.integrate_streamline(seed, major, (forward, backward))
+            self.add_streamline(streamline, major, join_fronts(backward, forward))
+        else:
+            self.add_streamline(self.integrate_streamline(seed, major), major)
+        return True
 
-            if not streamline[0] == streamline[-1]:
-                self.candidate_seeds(not major).append(streamline[0])
-                self.candidate_seeds(not major).append(streamline[-1])
+    # Creates up to batch_size streamlines of alternating direction, starting with major, by
+    # tracing their seeds together. The tracer cuts the batch at the first streamline depending
+    # on an earlier one of the batch, for which the random generator is reset to before its
+    # seed, so it is drawn again with the earlier streamlines in place.
+    # Returns whether to continue creating streamlines and the direction of the next one.
+    def create_streamline_batch(self, major: bool, batch_size):
+        states = []
+        seeds = []
+        majors = []
+        collide_both = []
+        exhausted = False
+        for _ in range(max(1, batch_size)):
+            states.append(self.rng.bit_generator.state)
+            seed = self.get_seed(major)
+            if seed is None:
+                exhausted = True
+                break
+            seeds.append(seed)
+            majors.append(major)
+            collide_both.append(self.rng.random() < self.parameters.collide_early)
+            major = not major
 
+        streamlines = self.tracer.trace(seeds, majors, collide_both)
+        if self.STREAMING_SIMPLIFICATION:
+            # The same simplification as while tracing the streamlines one at a time.
+            simplified = [
+                simplify_fronts(streamline, self.seed_index(streamline, seed), self.parameters.simplify_tolerance)
+                for streamline, seed in zip(streamlines, seeds)
+            ]
+        else:
+            simplified = simplify_all(streamlines, self.parameters.simplify_tolerance, self.SIMPLIFY_HIGH_QUALITY)
+        for streamline, simple, streamline_major in zip(streamlines, simplified, majors):
+            self.add_streamline(streamline, streamline_major, simple)
+
+        if len(streamlines) < len(seeds):
+            self.rng.bit_generator.state = states[len(streamlines)]
+            return True, majors[len(streamlines)]
+        return not exhausted, major
+
+    # Index of the seed in a streamline traced from it, the first point equal to the seed.
+    def seed_index(self, streamline: Polyline, seed: Vector) -> int:
+        xy = streamline.xy
+        return int(np.flatnonzero((xy[:, 0] == seed.x) & (xy[:, 1] == seed.y))[0])
+
+    # Adds streamline if it is valid, and its endpoints as seed candidates.
+    # Streamlines are stored as Polylines without the free space left from tracing.
+    # simple is the simplified streamline, if it is already known.
+    # Returns whether the streamline was added.
+    def add_streamline(self, streamline, major: bool, simple=None):
+        if not self.valid_streamline(streamline):
+            return False
+        if not isinstance(streamline, Polyline):
+            streamline = Polyline(streamline)
+        streamline.trim(0)
+        self.grid(major).add_polyline(streamline)
+        if self.seed_sampler is not None:
+            self.seed_sampler.stamp(major, streamline)
+        if simple is None:
+            simple = self.simplify_streamline(streamline)
+        if not self.KEEP_DENSE_STREAMLINES:
+            streamline = Polyline(simple, slack=0)
+        self.streamlines(major).append(streamline)
+        self.all_streamlines.append(streamline)
+        self.all_streamlines_simple.append(simple)
+
+        if not streamline[0] == streamline[-1]:
+            self.candidate_seeds(not major).append(streamline[0])
+            self.candidate_seeds(not major).append(streamline[-1])
         return True
 
     def valid_streamline(self, s: deque[Vector]):
@@ -223,8 +491,18 @@ class StreamlineGenerator:
             self.rng.random() * self.world_dimensions.y + self.origin.y)
         )
 
+    # Returns n random seed points as an (n, 2) array, drawn like n calls of 'sample_point'.
+    def sample_points(self, n):
+        return (
+            self.rng.random((n, 2)) * (self.world_dimensions.x, self.world_dimensions.y)
+            + (self.origin.x, self.origin.y)
+        )
+
     # Retruns seed point from candidate seeds, if available, and checks validity.
     # Samples a new random point using self.sample_point otherwise.
+    #
+    # Seeds are tested one at a time, as the grids change with every streamline added, which
+    # would rebuild the sample index of 'is_valid_samples' for every seed.
     def get_seed(self, major: bool):
         if self.SEED_AT_ENDPOINTS and len(self.candidate_seeds(major)) > 0:
             while len(self.candidate_seeds(major)) > 0:
@@ -232,6 +510,13 @@ class StreamlineGenerator:
                 if self.is_valid_sample(major, seed, self.parameters_sq.dsep):
                     return seed
 
+        if self.seed_sampler is not None:
+            return self.seed_sampler.get_seed(
+                major, self.rng, lambda point: self.is_valid_sample(major, point, self.parameters_sq.dsep))
+
+        if self.SEED_FARTHEST:
+            return self.get_farthest_seed(major)
+
         seed = self.sample_point()
         i = 0
         while not self.is_valid_sample(major, seed, self.parameters_sq.dsep):
@@ -241,12 +526,39 @@ class StreamlineGenerator:
             i += 1
         return seed
 
+    # Draws random points in chunks until a chunk holds a valid point, and returns the valid one
+    # farthest from existing streamlines.
+    def get_farthest_seed(self, major: bool):
+        remaining = self.parameters.seed_tries + 1
+        chunk = self.SEED_CHUNK
+        while remaining > 0:
+            n = min(chunk, remaining)
+            points = self.sample_points(n)
+            valid = np.flatnonzero([
+                self.is_valid_sample(major, Vector(p), self.parameters_sq.dsep) for p in points.tolist()
+            ])
+            if len(valid):
+                return Vector(points[valid[np.argmax(self.grid(major).get_clearance(points[valid]))]])
+            remaining -= n
+            chunk *= 4
+        return None
+
     def is_valid_sample(self, major: bool, point: Vector, d_sq, both_grids=False):
         grid_valid = self.grid(major).is_valid_sample(point, d_sq)
         if both_grids:
             grid_valid = grid_valid and self.grid(not major).is_valid_sample(point, d_sq)
         return grid_valid
 
+    # 'is_valid_sample' of all points of an (N, 2) array at once, as a boolean mask. both_grids may
+    # be a mask as well, selecting the points that are tested against both grids.
+    def is_valid_samples(self, major: bool, points, d_sq, both_grids=False) -> np.ndarray:
+        points = as_point_array(points)
+        valid = self.grid(major).is_valid_samples(points, d_sq)
+        both = valid & both_grids
+        if both.any():
+            valid[both] = self.grid(not major).is_valid_samples(points[both], d_sq)
+        return valid
+
     def candidate_seeds(self, major: bool):
         return self.candidate_seeds_major if major else self.candidate_seeds_minor
 
@@ -267,7 +579,9 @@ class StreamlineGenerator:
 
     def streamline_integration_step(self, parameters: StreamlineIntegration, major: bool, collide_both: bool):
         if parameters.valid:
-            parameters.streamline.append(parameters.previous_point)
+            parameters.add_point(parameters.previous_point)
+            parameters.point_hash.add(parameters.previous_point.x, parameters.previous_point.y, parameters.position)
+            parameters.position += parameters.position_step
             next_direction: Vector = self.integrator.integrate(parameters.previous_point, major)
 
             if next_direction.length_squared < 0.01:
@@ -287,38 +601,53 @@ class StreamlineGenerator:
                     parameters.original_direction,
                     next_point,
                     next_direction)
+                and not parameters.point_hash.collides(next_point.x, next_point.y, parameters.position)
             ):
                 parameters.previous_point = next_point
                 parameters.previous_direction = next_direction
             else:
-                parameters.streamline.append(next_point)
+                parameters.add_point(next_point)
                 parameters.valid = False
 
-    def integrate_streamline(self, seed: Vector, major: bool) -> deque[Vector]:
+    # simplifiers, if given, are the StreamingSimplifiers of the forward and the backward front.
+    def integrate_streamline(self, seed: Vector, major: bool, simplifiers=None) -> Polyline:
         count = 0
         points_escaped = False
         collide_both = self.rng.random() < self.parameters.collide_early
 
+        point_hash = StreamlinePointHash(self.dcollideself_sq, self.n_streamline_look_back)
+        point_hash.add(seed.x, seed.y, 0)
+
+        streamline = Polyline([seed])
         d = self.integrator.integrate(seed, major)
         forward_parameters: StreamlineIntegration = StreamlineIntegration(
             seed=seed,
             original_direction=d,
-            streamline=deque([seed]),
+            streamline=streamline,
             previous_direction=d,
             previous_point=seed + d,
-            valid=True)
+            valid=True,
+            point_hash=point_hash,
+            position=1)
         forward_parameters.valid = self.point_in_bounds(forward_parameters.previous_point)
 
         negative_d = d * -1
         backwards_parameters: StreamlineIntegration = StreamlineIntegration(
             seed=seed,
             original_direction=negative_d,
-            streamline=deque([]),
+            streamline=streamline,
             previous_direction=negative_d,
             previous_point=seed + negative_d,
-            valid=True)
+            valid=True,
+            point_hash=point_hash,
+            position=-1)
         backwards_parameters.valid = self.point_in_bounds(backwards_parameters.previous_point)
 
+        if simplifiers is not None:
+            forward_parameters.simplifier, backwards_parameters.simplifier = simplifiers
+            for simplifier in simplifiers:
+                simplifier.add(seed)
+
         while count < self.parameters.path_iterations and (forward_parameters.valid or backwards_parameters.valid):
             self.streamline_integration_step(forward_parameters, major, collide_both)
             self.streamline_integration_step(backwards_parameters, major, collide_both)
@@ -332,13 +661,11 @@ class StreamlineGenerator:
                 points_escaped = True
 
             if points_escaped and sq_distance_between_points <= self.parameters_sq.dcirclejoin:
-                forward_parameters.streamline.append(forward_parameters.previous_point)
-                forward_parameters.streamline.append(backwards_parameters.previous_point)
-                backwards_parameters.streamline.append(backwards_parameters.previous_point)
+                forward_parameters.add_point(forward_parameters.previous_point)
+                forward_parameters.add_point(backwards_parameters.previous_point)
+                backwards_parameters.add_point(backwards_parameters.previous_point)
                 break
 
             count += 1
 
-        backwards_parameters.streamline.reverse()
-        backwards_parameters.streamline.extend(forward_parameters.streamline)
-        return backwards_parameters.streamline
+        return streamline
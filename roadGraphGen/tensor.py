@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 from mathutils import Vector
 
@@ -7,6 +8,7 @@ from mathutils import Vector
 # sented as a 2-element list consisiting of [cos(2 * theta), sin(2 * theta)], following
 # the definition of presented by Chen et al. (2008) and Zhang et al. (2007).
 class Tensor:
+    __slots__ = ('old_theta', 'r', 'matrix', '_theta')
 
     def __init__(self, r, matrix):
         self.old_theta = False
@@ -26,7 +28,10 @@ class Tensor:
         return self._theta
 
     def add(self, tensor: 'Tensor', smooth=False):
-        self.matrix = [v * self.r + tensor.matrix[i] * tensor.r for i, v in enumerate(self.matrix)]
+        self.matrix = [
+            self.matrix[0] * self.r + tensor.matrix[0] * tensor.r,
+            self.matrix[1] * self.r + tensor.matrix[1] * tensor.r
+        ]
 
         if smooth:
             self.r = math.hypot(*self.matrix)
@@ -75,3 +80,87 @@ class Tensor:
         if self.r == 0:
             return 0
         return math.atan2(self.matrix[1] / self.r, self.matrix[0] / self.r) / 2
+
+
+# Struct-of-arrays variant of Tensor, holding any number of tensors as NumPy columns: 'r' as
+# an (N,) array and 'matrix' as an (N, 2) array. Mirrors the semantics of Tensor, with all
+# operations applied to every tensor at once. 'theta' is computed lazily, like in Tensor.
+#
+# 'add' optionally takes the indices of the tensors to add to, in which case the added
+# TensorArray holds one tensor per index.
+class TensorArray:
+    __slots__ = ('r', 'matrix', '_theta')
+
+    def __init__(self, r, matrix):
+        self.r = np.asarray(r, dtype=np.float64)
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, 2)
+        self._theta = None
+
+    @classmethod
+    def zeros(cls, n) -> 'TensorArray':
+        return TensorArray(np.zeros(n), np.zeros((n, 2)))
+
+    def __len__(self):
+        return len(self.r)
+
+    def __getitem__(self, i) -> Tensor:
+        return Tensor(float(self.r[i]), self.matrix[i].tolist())
+
+    @property
+    def theta(self):
+        if self._theta is None:
+            self._theta = self.calculate_theta()
+        return self._theta
+
+    def add(self, tensors: 'TensorArray', smooth=False, indices=None):
+        if indices is None:
+            indices = slice(None)
+        matrix = self.matrix[indices] * self.r[indices, None] + tensors.matrix * tensors.r[:, None]
+        self.matrix[indices] = matrix
+
+        if smooth:
+            self.r[indices] = np.hypot(matrix[:, 0], matrix[:, 1])
+        else:
+            self.r[indices] = 2
+
+        self._theta = None
+        return self
+
+    def scale(self, s):
+        self.r = self.r * s
+        self._theta = None
+        return self
+
+    def rotate(self, theta):
+        if np.all(theta == 0):
+            return self
+
+        new_theta = self.theta + theta
+        new_theta = np.where(new_theta < math.pi, new_theta + math.pi, new_theta)
+        new_theta = np.where(new_theta >= math.pi, new_theta - math.pi, new_theta)
+
+        self.matrix[:, 0] = np.cos(2 * new_theta) * self.r
+        self.matrix[:, 1] = np.sin(2 * new_theta) * self.r
+        self._theta = new_theta
+        return self
+
+    # returns major eigenvectors of the tensors as an (N, 2) array
+    def get_major(self) -> np.ndarray:
+        return self.get_eigenvectors(self.theta)
+
+    # returns minor eigenvectors of the tensors as an (N, 2) array
+    def get_minor(self) -> np.ndarray:
+        return self.get_eigenvectors(self.theta + math.pi / 2)
+
+    def get_eigenvectors(self, angle: np.ndarray) -> np.ndarray:
+        vectors = np.stack((np.cos(angle), np.sin(angle)), axis=1)
+        vectors[self.r == 0] = 0
+        return vectors
+
+    def calculate_theta(self):
+        nonzero = self.r != 0
+        theta = np.zeros(len(self.r))
+        theta[nonzero] = np.arctan2(
+            self.matrix[nonzero, 1] / self.r[nonzero],
+            self.matrix[nonzero, 0] / self.r[nonzero]) / 2
+        return theta
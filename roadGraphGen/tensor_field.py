@@ -1,15 +1,69 @@
+import math
+import numpy as np
+
 from mathutils import Vector
 
 from roadGraphGen.roadGraphGen.basis_field import GridBasisField, RadialBasisField
-from roadGraphGen.roadGraphGen.tensor import Tensor
+from roadGraphGen.roadGraphGen.field_index import BasisFieldIndex
+from roadGraphGen.roadGraphGen.sample_cache import SampleCache
+from roadGraphGen.roadGraphGen.tensor import Tensor, TensorArray
 
 
 # The TensorField class serves as the global tensor field.
 # Holds any number of basis fields, performs point sampling and summation of basis fields.
+#
+# 'sample_point' samples a single point and returns a Tensor, 'sample_tensors' samples an
+# (N, 2) array of points at once and returns a TensorArray. 'sample_points' returns the
+# arrays (r, theta, major, minor) of the sampled tensors instead.
+#
+# The influence discs of the basis fields are kept in a BasisFieldIndex, so a sample only
+# evaluates the basis fields that can contribute to it. In smooth mode a field is considered
+# to contribute where its weight is at least 'smooth_epsilon'. The index is kept up to date
+# by add_field/remove_field/reset and changes to 'smooth' or 'smooth_epsilon', a basis field
+# that is modified in place requires a call to 'rebuild_index'.
+#
+# Single point samples can optionally be memoized in a SampleCache ('enable_sample_cache').
+#
+# Every change to the field increments 'version' and records the region it affects, as an
+# axis aligned box (min_x, min_y, max_x, max_y). Caches of the field ask for the region that
+# changed since the version they were built at ('get_dirty_region') to refresh only that part.
+# Basis field parameters should be changed through 'update_field' to be tracked.
 class TensorField:
-    def __init__(self):
-        self.basis_fields = []
-        self.smooth = False
+    def __init__(self, index_cell_size=250):
+        self.version = 0
+        self.changes = []
+        self.sample_cache = None
+        self.index = BasisFieldIndex(index_cell_size)
+        self._basis_fields = []
+        self._smooth = False
+        self._smooth_epsilon = 1e-6
+
+    @property
+    def basis_fields(self):
+        return self._basis_fields
+
+    @basis_fields.setter
+    def basis_fields(self, fields):
+        self._basis_fields = list(fields)
+        self.rebuild_index()
+
+    @property
+    def smooth(self):
+        return self._smooth
+
+    @smooth.setter
+    def smooth(self, smooth):
+        self._smooth = smooth
+        self.rebuild_index()
+
+    @property
+    def smooth_epsilon(self):
+        return self._smooth_epsilon
+
+    @smooth_epsilon.setter
+    def smooth_epsilon(self, epsilon):
+        self._smooth_epsilon = epsilon
+        self.rebuild_index()
 
     def add_grid(self, center: Vector, size, decay, theta):
         grid = GridBasisField(center, size, decay, theta)
@@ -21,13 +75,69 @@ class TensorField:
 
     def add_field(self, field):
         self.basis_fields.append(field)
+        self.index.add(field, field.get_influence_radius(self.smooth, self.smooth_epsilon))
+        self.mark_dirty(self.get_field_region(field))
 
+    # In non-smooth mode every field is weighted by a power of two of the number of fields after
+    # it, so removing a field halves the weights of the fields before it relative to those after
+    # it, changing the directions wherever they overlap.
     def remove_field(self, field):
+        region = self.get_field_region(field)
+        position = self.basis_fields.index(field)
+        if not self.smooth and position < len(self.basis_fields) - 1:
+            for other in self.basis_fields[:position]:
+                region = merge_regions(region, self.get_field_region(other))
         self.basis_fields.remove(field)
+        self.index.remove(field)
+        self.mark_dirty(region)
+
+    # Changes the given parameters of field, e.g. update_field(radial, center=Vector((10.0, 5.0))).
+    # Marks the regions influenced by the field before and after the change as dirty.
+    def update_field(self, field, **parameters):
+        region = self.get_field_region(field)
+        for name, value in parameters.items():
+            if isinstance(value, Vector):
+                value = value.copy()
+            setattr(field, name, value)
+        self.index.update(field, field.get_influence_radius(self.smooth, self.smooth_epsilon))
+        self.mark_dirty(merge_regions(region, self.get_field_region(field)))
 
     def reset(self):
         self.basis_fields = []
 
+    def rebuild_index(self):
+        self.index.clear()
+        for field in self.basis_fields:
+            self.index.add(field, field.get_influence_radius(self.smooth, self.smooth_epsilon))
+        self.mark_dirty(EVERYWHERE)
+
+    # Returns the bounding box of the influence disc of field.
+    def get_field_region(self, field):
+        radius = field.get_influence_radius(self.smooth, self.smooth_epsilon)
+        return (field.center.x - radius, field.center.y - radius, field.center.x + radius, field.center.y + radius)
+
+    def mark_dirty(self, region):
+        self.version += 1
+        self.changes.append((self.version, region))
+        if self.sample_cache is not None:
+            self.sample_cache.invalidate_region(region)
+
+    # Returns the region affected by all changes after 'version', None if nothing changed.
+    def get_dirty_region(self, version):
+        region = None
+        for change_version, change_region in reversed(self.changes):
+            if change_version <= version:
+                break
+            region = change_region if region is None else merge_regions(region, change_region)
+        return region
+
+    # Memoizes up to 'size' single point samples, with points quantized to 'quantum'.
+    def enable_sample_cache(self, size=100000, quantum=0.01):
+        self.sample_cache = SampleCache(size, quantum)
+
+    def disable_sample_cache(self):
+        self.sample_cache = None
+
     def get_center_points(self):
         return [field.center for field in self.basis_fields]
 
@@ -35,18 +145,111 @@ class TensorField:
         return self.basis_fields
 
     def sample_point(self, point: Vector):
+        if self.sample_cache is None:
+            return self.evaluate_point(point)
+
+        key = self.sample_cache.get_key(point)
+        tensor = self.sample_cache.get(key)
+        if tensor is None:
+            tensor = self.evaluate_point(point)
+            self.sample_cache.put(key, tensor)
+        return tensor
+
+    def evaluate_point(self, point: Vector):
         # check if point is valid in case of water etc. here
 
         if not self.basis_fields:
             return Tensor(1, [0, 0])
 
-        # summation of all underlying basis fields
+        fields = self.index.query(point)
+        if not fields:
+            if not self.smooth:
+                # The sum of tensors weighted with zero is a zero matrix with r = 2.
+                return Tensor(2, [0, 0])
+            # Without any field above the cutoff, the Gaussian tails still define the direction.
+            fields = self.basis_fields
+
+        # summation of all contributing basis fields
         tensor_acc = Tensor.zero()
-        for field in self.basis_fields:
-            tensor_acc.add(field.get_weighted_tensor(point, self.smooth), self.smooth)
+        if not self.smooth:
+            # Every field of the full sum is doubled once by each later field, contributing or not.
+            # Scaling by powers of two is exact, so the sum equals the one over all fields.
+            matrix = [0, 0]
+            for field in fields:
+                tensor = field.get_weighted_tensor(point, self.smooth)
+                scale = 2 ** (len(self.basis_fields) - 1 - self.index.order[field])
+                matrix = [v + m * tensor.r * scale for v, m in zip(matrix, tensor.matrix)]
+            tensor_acc.add(Tensor(1, matrix), self.smooth)
+        else:
+            for field in fields:
+                tensor_acc.add(field.get_weighted_tensor(point, self.smooth), self.smooth)
 
         # rotational noise for parks added here if applicable
 
         # global noise added here if applicable
 
         return tensor_acc
+
+    def sample_points(self, points):
+        tensors = self.sample_tensors(points)
+        return tensors.r, tensors.theta, tensors.get_major(), tensors.get_minor()
+
+    def sample_tensors(self, points) -> TensorArray:
+        points = as_point_array(points)
+        n = len(points)
+
+        if not self.basis_fields:
+            return TensorArray(np.ones(n), np.zeros((n, 2)))
+
+        tensor_acc = TensorArray.zeros(n)
+        if n == 0:
+            return tensor_acc
+
+        # summation of all contributing basis fields
+        contributed = np.zeros(n, dtype=bool)
+        matrix = np.zeros((n, 2))
+        min_v = Vector(points.min(axis=0))
+        max_v = Vector(points.max(axis=0))
+        for field in self.index.query_box(min_v, max_v):
+            distance = np.hypot(points[:, 0] - field.center.x, points[:, 1] - field.center.y)
+            indices = np.flatnonzero(distance < self.index.get_radius(field))
+            if len(indices):
+                tensors = field.get_weighted_tensors(points[indices], self.smooth)
+                if not self.smooth:
+                    # Every field of the full sum is doubled once by each later field, see evaluate_point.
+                    scale = len(self.basis_fields) - 1 - self.index.order[field]
+                    matrix[indices] += np.ldexp(tensors.matrix * tensors.r[:, None], scale)
+                else:
+                    tensor_acc.add(tensors, self.smooth, indices)
+                contributed[indices] = True
+
+        if not self.smooth:
+            tensor_acc.add(TensorArray(np.ones(n), matrix), self.smooth)
+
+        remaining = np.flatnonzero(~contributed)
+        if self.smooth and len(remaining):
+            for field in self.basis_fields:
+                tensor_acc.add(field.get_weighted_tensors(points[remaining], self.smooth), self.smooth, remaining)
+
+        return tensor_acc
+
+
+# Region covering the whole plane, for changes that affect the entire field.
+EVERYWHERE = (-math.inf, -math.inf, math.inf, math.inf)
+
+
+def merge_regions(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def region_contains(region, point: Vector):
+    return region[0] <= point.x <= region[2] and region[1] <= point.y <= region[3]
+
+
+# Converts a sequence of Vectors or an array-like of 2D points into an (N, 2) float array.
+def as_point_array(points) -> np.ndarray:
+    points = np.asarray(points, dtype=np.float64)
+    if points.size == 0:
+        return points.reshape(0, 2)
+    return np.atleast_2d(points)[:, :2]
+
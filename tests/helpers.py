@@ -0,0 +1,49 @@
+import math
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.grid_storage import GridStorage
+from roadGraphGen.roadGraphGen.integrator import RK4Integrator
+from roadGraphGen.roadGraphGen.streamline_parameters import StreamlineParameters
+from roadGraphGen.roadGraphGen.streamlines import StreamlineGenerator
+from roadGraphGen.roadGraphGen.tensor_field import TensorField
+
+
+# Fixtures shared by the tests tracing streamlines: a grid field with a radial field inside of
+# it, covering domains of up to 400 x 400 from the origin.
+def create_tensor_field() -> TensorField:
+    tensor_field = TensorField()
+    tensor_field.add_grid(Vector((0.0, 0.0)), 600, 10, math.pi / 7)
+    tensor_field.add_radial(Vector((180.0, 140.0)), 150, 20)
+    return tensor_field
+
+
+def create_parameters(dsep=40, dtest=15, dlookahead=80, collide_early=0.5) -> StreamlineParameters:
+    return StreamlineParameters(
+        dsep=dsep,
+        dtest=dtest,
+        dstep=1,
+        dcirclejoin=5,
+        dlookahead=dlookahead,
+        joinangle=0.1,
+        path_iterations=400,
+        seed_tries=100,
+        simplify_tolerance=0.01,
+        collide_early=collide_early,
+    )
+
+
+def create_generator(seed=7, world_dimensions=(300.0, 300.0), collide_early=0.5, grid_class=GridStorage):
+    parameters = create_parameters(collide_early=collide_early)
+    return StreamlineGenerator(
+        integrator=RK4Integrator(create_tensor_field(), parameters),
+        origin=Vector((0.0, 0.0)),
+        world_dimensions=Vector(world_dimensions),
+        parameters=parameters,
+        seed=seed,
+        grid_class=grid_class
+    )
+
+
+def streamline_points(generator):
+    return [[tuple(p) for p in streamline] for streamline in generator.all_streamlines]
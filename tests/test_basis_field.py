@@ -1,5 +1,6 @@
 import unittest
 import math
+import numpy as np
 
 from mathutils import Vector
 
@@ -107,6 +108,32 @@ class TestBasisField(unittest.TestCase):
         self.assertEqual(field.get_weighted_tensor(point, smooth=True).r, tensor.r)
         self.assertEqual(field.get_weighted_tensor(point, smooth=True).matrix, tensor.matrix)
 
+    def test_tensor_weights_batch(self):
+        center = Vector((2.0, 2.0))
+        size = 250
+        points = [Vector((150.0, 20.0)), Vector((2.0, 2.0)), Vector((400.0, -30.0)), Vector((-100.0, 60.0))]
+        for decay in [0, 10]:
+            field = BasisField(center, size, decay)
+            for smooth in [False, True]:
+                weights = field.get_tensor_weights(np.array(points), smooth)
+                for point, weight in zip(points, weights):
+                    self.assertAlmostEqual(weight, field.get_tensor_weight(point, smooth))
+
+    def test_get_weighted_tensors_batch(self):
+        center = Vector((2.0, 2.0))
+        size = 250
+        decay = 10
+        points = [Vector((150.0, 20.0)), Vector((5.0, 5.0)), Vector((-40.0, 90.0))]
+        fields = [GridBasisField(center, size, decay, math.pi / 3), RadialBasisField(center, size, decay)]
+        for field in fields:
+            for smooth in [False, True]:
+                tensors = field.get_weighted_tensors(np.array(points), smooth)
+                for i, point in enumerate(points):
+                    tensor = field.get_weighted_tensor(point, smooth)
+                    self.assertAlmostEqual(tensors.r[i], tensor.r, places=5)
+                    self.assertAlmostEqual(tensors.matrix[i, 0], tensor.matrix[0], places=3)
+                    self.assertAlmostEqual(tensors.matrix[i, 1], tensor.matrix[1], places=3)
+
 
 if __name__ == "__main__":
     unittest.main()
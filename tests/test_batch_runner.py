@@ -0,0 +1,81 @@
+import unittest
+import json
+import math
+import os
+import tempfile
+
+from roadGraphGen.roadGraphGen.batch_runner import BatchRunner, GenerationJob
+
+
+class TestBatchRunner(unittest.TestCase):
+
+    def create_jobs(self):
+        layout = [('grid', (0.0, 0.0), 800, 10, math.pi / 7), ('radial', (250.0, 150.0), 150, 20)]
+        base = {
+            'width': 300,
+            'height': 200,
+            'origin': (0, 0),
+            'basis_fields': layout,
+            'field_resolution': 4,
+            'parameters': {'dsep': 40, 'dtest': 15, 'dlookahead': 80, 'path_iterations': 400, 'seed_tries': 100},
+        }
+        jobs = [GenerationJob(f'seed_{seed}', seed=seed, **base) for seed in [1, 2]]
+        jobs.append(GenerationJob('dsep_30', seed=1, **dict(base, parameters=dict(base['parameters'], dsep=30))))
+        jobs.append(GenerationJob('direct', seed=1, grid='numpy', **dict(base, field_resolution=None)))
+        return jobs
+
+    def read_graphs(self, results):
+        graphs = {}
+        for result in results:
+            with open(result.path) as f:
+                graphs[result.name] = json.load(f)
+        return graphs
+
+    def test_jobs_share_cached_raster(self):
+        with tempfile.TemporaryDirectory() as directory:
+            results = BatchRunner(self.create_jobs(), directory, workers=1).run_all()
+            self.assertEqual([result.error for result in results], [None] * 4)
+            self.assertEqual(len(os.listdir(os.path.join(directory, 'raster_cache'))), 1)
+            self.assertNotIn('raster', results[-1].timings)
+
+            graphs = self.read_graphs(results)
+            self.assertEqual(graphs['seed_1']['seed'], 1)
+            for result in results:
+                graph = graphs[result.name]
+                self.assertGreater(result.streamlines, 0)
+                self.assertEqual(len(graph['nodes']), result.nodes)
+                self.assertEqual(len(graph['edges']), result.edges)
+                for edge in graph['edges']:
+                    self.assertLess(max(edge['start'], edge['end']), len(graph['nodes']))
+
+    def test_pool_matches_sequential_run(self):
+        with tempfile.TemporaryDirectory() as sequential, tempfile.TemporaryDirectory() as pooled:
+            expected = self.read_graphs(BatchRunner(self.create_jobs(), sequential, workers=1).run_all())
+            results = BatchRunner(self.create_jobs(), pooled, workers=2).run_all()
+            self.assertEqual(self.read_graphs(results), expected)
+
+    def test_failed_job_is_reported(self):
+        job = GenerationJob('broken', basis_fields=[('spiral', (0, 0), 10, 1)])
+        with tempfile.TemporaryDirectory() as directory:
+            results = BatchRunner([job], directory, workers=1).run_all()
+            self.assertIsNone(results[0].path)
+            self.assertIn("Unknown basis field type", results[0].error)
+
+    def test_failed_raster_is_reported(self):
+        broken = GenerationJob('broken', basis_fields=[('spiral', (0, 0), 10, 1)], field_resolution=4)
+        broken_too = GenerationJob('broken_too', seed=2, basis_fields=broken.basis_fields, field_resolution=4)
+        good = self.create_jobs()[-1]
+        for workers in [1, 2]:
+            with tempfile.TemporaryDirectory() as directory:
+                results = BatchRunner([broken, good, broken_too], directory, workers=workers).run_all()
+                results = {result.name: result for result in results}
+                self.assertEqual(set(results), {'broken', 'broken_too', 'direct'})
+                for name in ['broken', 'broken_too']:
+                    self.assertIsNone(results[name].path)
+                    self.assertIn("Unknown basis field type", results[name].error)
+                self.assertIsNone(results['direct'].error)
+                self.assertGreater(results['direct'].streamlines, 0)
+
+    def test_job_names_must_be_unique(self):
+        with self.assertRaises(ValueError):
+            BatchRunner([GenerationJob('a'), GenerationJob('a')], 'unused')
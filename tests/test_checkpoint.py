@@ -0,0 +1,68 @@
+import unittest
+import os
+import tempfile
+
+from mathutils import Vector
+
+from roadGraphGen.tests.helpers import create_generator
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def generated_points(self, generator):
+        return (
+            [[tuple(p) for p in s] for s in generator.all_streamlines],
+            [[tuple(p) for p in s] for s in generator.streamlines_major],
+            [[tuple(p) for p in s] for s in generator.all_streamlines_simple]
+        )
+
+    def assert_resumed_run_matches(self, configure):
+        path = os.path.join(self.directory.name, 'generator.ckpt')
+        uninterrupted = create_generator(seed=11)
+        configure(uninterrupted)
+        uninterrupted.start_streamlines()
+        for _ in range(6):
+            uninterrupted.update()
+        uninterrupted.save_checkpoint(path)
+        saved = len(uninterrupted.all_streamlines)
+        while uninterrupted.update():
+            pass
+
+        resumed = create_generator(seed=0)
+        resumed.load_checkpoint(path)
+        self.assertGreater(saved, 0)
+        self.assertEqual(len(resumed.all_streamlines), saved)
+        while resumed.update():
+            pass
+        self.assertEqual(self.generated_points(resumed), self.generated_points(uninterrupted))
+        for streamline, simple in zip(resumed.all_streamlines, resumed.all_streamlines_simple):
+            self.assertTrue(all(v in streamline for v in simple))
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_resume_matches_uninterrupted_generation(self):
+        self.assert_resumed_run_matches(lambda generator: None)
+
+    def test_resume_with_seeds_at_endpoints_and_free_space_sampling(self):
+        def configure(generator):
+            generator.SEED_AT_ENDPOINTS = True
+            generator.enable_free_space_sampling()
+        self.assert_resumed_run_matches(configure)
+
+    def test_load_rejects_other_files_and_domains(self):
+        path = os.path.join(self.directory.name, 'generator.ckpt')
+        with open(path, 'wb') as f:
+            f.write(b'not a checkpoint')
+        with self.assertRaises(ValueError):
+            create_generator(seed=11).load_checkpoint(path)
+
+        generator = create_generator(seed=11)
+        generator.save_checkpoint(path)
+        other = create_generator(seed=11)
+        other.world_dimensions = Vector((200.0, 300.0))
+        with self.assertRaises(ValueError):
+            other.load_checkpoint(path)
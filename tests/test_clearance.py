@@ -0,0 +1,69 @@
+import unittest
+import math
+
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.clearance import ClearanceGridStorage, ClearanceRaster
+from roadGraphGen.roadGraphGen.grid_storage import NumpyGridStorage
+from roadGraphGen.roadGraphGen.polyline import Polyline
+
+
+class TestClearanceRaster(unittest.TestCase):
+
+    def test_clearance_is_lower_bound(self):
+        raster = ClearanceRaster(Vector((10.0, -20.0)), Vector((300.0, 200.0)), 5, 30)
+        rng = np.random.default_rng(9)
+        # A dense spiral, stamped with a stride, and scattered points.
+        t = np.arange(0, 140, 0.3)
+        spiral = np.stack((160 + t * np.cos(t / 9), 80 + 0.6 * t * np.sin(t / 9)), axis=1)
+        scattered = rng.random((30, 2)) * (300, 200) + (10, -20)
+        raster.add_points(spiral)
+        for p in scattered:
+            raster.add_points(p[None])
+        points = np.concatenate((spiral, scattered))
+
+        queries = rng.random((3000, 2)) * (320, 220) + (0, -30)
+        clearance = raster.get_clearance(queries)
+        nearest = np.array([np.hypot(*(points - q).T).min() for q in queries])
+        self.assertTrue((clearance <= nearest).all())
+        # Far from all points, the clearance is close to the distance.
+        self.assertGreater(clearance.max(), 20)
+        for q, c in zip(queries[:200].tolist(), clearance[:200].tolist()):
+            self.assertEqual(raster.is_clear(*q, 10), c >= 10)
+
+
+class TestClearanceGridStorage(unittest.TestCase):
+
+    def test_queries_match_numpy_grid_storage(self):
+        origin = Vector((10.0, -20.0))
+        world_dimensions = Vector((300.0, 200.0))
+        grid = NumpyGridStorage(world_dimensions, origin, 25)
+        clearance = ClearanceGridStorage(world_dimensions, origin, 25)
+        spiral = Polyline([
+            (160 + t * math.cos(t / 9), 80 + 0.6 * t * math.sin(t / 9)) for t in np.arange(0, 140, 0.7)
+        ])
+        rng = np.random.default_rng(10)
+        samples = [Vector(p) for p in (rng.random((50, 2)) * (300, 200) + (10, -20)).tolist()]
+        tests = rng.random((300, 2)) * (320, 220) + (0, -30)
+        # Close to the first cell, which holds the sample outside of the domain added last.
+        tests = np.concatenate((tests, [(12.0, -18.0), (40.0, 20.0), (-40.0, 485.0)]))
+        for outside in [False, True]:
+            for target in [grid, clearance]:
+                if outside:
+                    target.add_sample(Vector((-50.0, 500.0)))
+                else:
+                    target.add_polyline(spiral)
+                    for v in samples:
+                        target.add_sample(v)
+            self.assertEqual(clearance.samples_outside, outside)
+            for d_sq in [4.0, 100.0, 625.0]:
+                expected = [grid.is_valid_sample(Vector(p), d_sq) for p in tests.tolist()]
+                self.assertEqual([clearance.is_valid_sample(Vector(p), d_sq) for p in tests.tolist()], expected)
+                self.assertEqual(clearance.is_valid_samples(tests, d_sq).tolist(), expected)
+
+        restored = ClearanceGridStorage(world_dimensions, origin, 25)
+        restored.set_samples(*clearance.samples_to_arrays())
+        np.testing.assert_array_equal(restored.raster.distances, clearance.raster.distances)
+        self.assertTrue(restored.samples_outside)
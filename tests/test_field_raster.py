@@ -0,0 +1,63 @@
+import unittest
+import math
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.field_raster import TensorFieldRaster
+from roadGraphGen.roadGraphGen.tensor_field import TensorField
+
+
+class TestTensorFieldRaster(unittest.TestCase):
+
+    def create_field(self):
+        tensor_field = TensorField()
+        tensor_field.add_grid(Vector((0.0, 0.0)), 400, 10, math.pi / 6)
+        tensor_field.add_radial(Vector((150.0, 120.0)), 200, 5)
+        return tensor_field
+
+    def test_raster_init(self):
+        raster = TensorFieldRaster(TensorField(), Vector((0.0, 0.0)), Vector((100.0, 50.0)), 10)
+        self.assertEqual(raster.raster_dimensions, (11, 6))
+        self.assertEqual(raster.components.shape, (11, 6, 2))
+
+    def test_raster_nodes_match_field(self):
+        tensor_field = self.create_field()
+        raster = TensorFieldRaster(tensor_field, Vector((10.0, 20.0)), Vector((200.0, 200.0)), 10)
+        for point in [Vector((10.0, 20.0)), Vector((50.0, 80.0)), Vector((210.0, 220.0))]:
+            expected = tensor_field.sample_point(point).get_major()
+            vector = raster.sample_field_vector(point, True)
+            self.assertAlmostEqual(abs(vector.dot(expected)), 1.0, places=5)
+
+    def test_raster_constant_field(self):
+        tensor_field = TensorField()
+        tensor_field.add_grid(Vector((0.0, 0.0)), 10000, 0, math.pi / 3)
+        raster = TensorFieldRaster(tensor_field, Vector((0.0, 0.0)), Vector((100.0, 100.0)), 7)
+        self.assertAlmostEqual(raster.max_angular_error(), 0.0)
+        minor = raster.sample_field_vector(Vector((33.3, 61.2)), False)
+        self.assertAlmostEqual(minor.x, math.cos(math.pi / 3 + math.pi / 2), places=5)
+        self.assertAlmostEqual(minor.y, math.sin(math.pi / 3 + math.pi / 2), places=5)
+
+    def test_sample_points_matches_sample_point(self):
+        raster = TensorFieldRaster(self.create_field(), Vector((0.0, 0.0)), Vector((200.0, 200.0)), 10)
+        points = [Vector((3.0, 4.0)), Vector((123.4, 56.7)), Vector((-20.0, 300.0))]
+        r, theta, major, minor = raster.sample_points(points)
+        for i, point in enumerate(points):
+            self.assertAlmostEqual(theta[i], raster.sample_point(point).theta)
+            vector = raster.sample_field_vector(point, False)
+            np.testing.assert_allclose(minor[i], [vector.x, vector.y], atol=1e-6)
+
+    def test_refresh_region(self):
+        tensor_field = self.create_field()
+        raster = TensorFieldRaster(tensor_field, Vector((0.0, 0.0)), Vector((400.0, 400.0)), 5, tile_size=8)
+        self.assertEqual(raster.refresh(), 0)
+        tensor_field.add_radial(Vector((20.0, 20.0)), 10, 5)
+        resampled = raster.refresh()
+        self.assertEqual(resampled, 8 * 8)
+        expected = TensorFieldRaster(tensor_field, Vector((0.0, 0.0)), Vector((400.0, 400.0)), 5)
+        np.testing.assert_allclose(raster.components, expected.components)
+        self.assertEqual(raster.cos_2theta, expected.cos_2theta)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from collections import deque
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.graph import Graph
+from roadGraphGen.tests.helpers import create_generator
+
+
+class TestGraph(unittest.TestCase):
+
+    def test_complex_graph_skips_own_endpoints(self):
+        generator = create_generator(world_dimensions=(150.0, 150.0))
+        generator.create_all_streamlines()
+        graph = Graph(generator, complex=True)
+
+        # Streamlines as deques of Vectors, whose endpoints are the same objects as the ends of
+        # their end segments, give the graph the endpoint extensions were written for.
+        generator.all_streamlines = [deque(Vector(p) for p in streamline) for streamline in generator.all_streamlines]
+        expected = Graph(generator, complex=True)
+        self.assertEqual(len(graph.nodes), len(expected.nodes))
+        self.assertEqual(len(graph.edges), len(expected.edges))
+        self.assertEqual(
+            sorted(tuple(node.co) for node in graph.nodes), sorted(tuple(node.co) for node in expected.nodes))
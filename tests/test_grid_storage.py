@@ -0,0 +1,144 @@
+import unittest
+import math
+
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.grid_storage import GridStorage, NumpyGridStorage, SparseGridStorage
+from roadGraphGen.roadGraphGen.polyline import Polyline
+
+
+class TestNumpyGridStorage(unittest.TestCase):
+
+    def create_grids(self):
+        origin = Vector((10.0, -20.0))
+        world_dimensions = Vector((300.0, 200.0))
+        grids = [GridStorage(world_dimensions, origin, 25), NumpyGridStorage(world_dimensions, origin, 25, capacity=4)]
+        rng = np.random.default_rng(5)
+        spiral = Polyline([
+            (160 + t * math.cos(t / 9), 80 + 0.6 * t * math.sin(t / 9)) for t in np.arange(0, 140, 0.7)
+        ])
+        samples = rng.random((50, 2)).tolist()
+        for grid in grids:
+            grid.add_polyline(spiral)
+            for x, y in samples:
+                grid.add_sample(Vector((10 + 300 * x, -20 + 200 * y)))
+            # Out of the domain, stored in the first cell.
+            grid.add_sample(Vector((-50.0, 500.0)))
+        return grids
+
+    def test_queries_match_grid_storage(self):
+        grid, numpy_grid = self.create_grids()
+        points, counts = grid.samples_to_arrays()
+        numpy_points, numpy_counts = numpy_grid.samples_to_arrays()
+        np.testing.assert_array_equal(numpy_points, points)
+        np.testing.assert_array_equal(numpy_counts, counts)
+
+        rng = np.random.default_rng(6)
+        tests = [Vector(p) for p in (rng.random((300, 2)) * (320, 220) + (0, -30)).tolist()]
+        # Samples themselves are not too close to themselves.
+        tests.extend(Vector(p) for p in points[::17].tolist())
+        for v in tests:
+            for d_sq in [4.0, 100.0, 625.0]:
+                self.assertEqual(numpy_grid.is_valid_sample(v, d_sq), grid.is_valid_sample(v, d_sq))
+            self.assertEqual(numpy_grid.get_nearby_points(v, 60), grid.get_nearby_points(v, 60))
+
+    def test_batch_queries_match_single_queries(self):
+        grids = self.create_grids()
+        rng = np.random.default_rng(8)
+        points = rng.random((400, 2)) * (340, 240) + (-10, -40)
+        # Samples, points outside of the domain and an empty batch.
+        points = np.concatenate((points, grids[0].samples_to_arrays()[0][::13], [(-50.0, 500.0), (-48.0, 498.0)]))
+        for grid in grids:
+            for d_sq in [4.0, 100.0, 625.0]:
+                expected = [grid.is_valid_sample(Vector(p), d_sq) for p in points.tolist()]
+                self.assertEqual(grid.is_valid_samples(points, d_sq).tolist(), expected)
+            self.assertEqual(grid.is_valid_samples(np.zeros((0, 2))).tolist(), [])
+
+        # The sample index is rebuilt once samples are added.
+        grid = grids[1]
+        point = np.array([[200.25, 150.25]])
+        self.assertTrue(grid.is_valid_samples(point, 4.0)[0])
+        grid.add_sample(Vector((201.25, 150.25)))
+        self.assertFalse(grid.is_valid_samples(point, 4.0)[0])
+
+    def test_set_samples_and_linked_grids(self):
+        grid, numpy_grid = self.create_grids()
+        restored = NumpyGridStorage(grid.world_dimensions, grid.origin, grid.dsep)
+        restored.set_samples(*grid.samples_to_arrays())
+        np.testing.assert_array_equal(restored.samples_to_arrays()[0], grid.samples_to_arrays()[0])
+
+        empty = NumpyGridStorage(grid.world_dimensions, grid.origin, grid.dsep)
+        sample = Vector(grid.samples_to_arrays()[0][40])
+        self.assertTrue(empty.is_valid_sample(sample))
+        empty.extend(grid)
+        self.assertFalse(empty.is_valid_sample(sample + Vector((1.0, 0.0))))
+        tests = [sample, sample + Vector((1.0, 0.0)), Vector((-100.0, -100.0))]
+        self.assertEqual(empty.is_valid_samples(tests).tolist(), [empty.is_valid_sample(v) for v in tests])
+
+
+class TestGridStorage(unittest.TestCase):
+
+    def test_get_nearest_in_cone(self):
+        for grid_class in [GridStorage, NumpyGridStorage]:
+            grid = grid_class(Vector((100.0, 100.0)), Vector((0.0, 0.0)), 10)
+            # In the cone, at 45 degrees and behind v.
+            for p in [(60.0, 52.0), (58.0, 50.0), (55.0, 55.0), (45.0, 50.0)]:
+                grid.add_sample(Vector(p))
+            v = Vector((50.0, 50.0))
+            direction = Vector((1.0, 0.0))
+            self.assertEqual(grid.get_nearest_in_cone(v, direction, 30, 0.5, 4), (Vector((58.0, 50.0)), 64.0, False))
+            self.assertEqual(
+                grid.get_nearest_in_cone(v, direction, 30, 0.5, 4, [Vector((58.0, 50.0))]),
+                (Vector((60.0, 52.0)), 104.0, False))
+            exclude = [Vector((58.0, 50.0)), Vector((60.0, 52.0))]
+            self.assertIsNone(grid.get_nearest_in_cone(v, direction, 30, 0.5, 4, exclude))
+            self.assertIsNone(grid.get_nearest_in_cone(v, direction, 30, 0.1, 4, [Vector((58.0, 50.0))]))
+
+            # Near samples are taken at any angle, but not behind v.
+            grid.add_sample(Vector((49.0, 50.5)))
+            grid.add_sample(Vector((50.5, 51.0)))
+            self.assertEqual(grid.get_nearest_in_cone(v, direction, 30, 0.5, 4), (Vector((50.5, 51.0)), 1.25, True))
+            self.assertIsNone(grid.get_nearest_in_cone(Vector((5.0, 95.0)), direction, 10, 0.5, 4))
+
+
+class TestSparseGridStorage(unittest.TestCase):
+
+    def test_queries_match_grid_storage_inside_domain(self):
+        origin = Vector((10.0, -20.0))
+        world_dimensions = Vector((300.0, 200.0))
+        grid = GridStorage(world_dimensions, origin, 25)
+        sparse = SparseGridStorage(world_dimensions, origin, 25, capacity=4)
+        rng = np.random.default_rng(7)
+        samples = (rng.random((400, 2)) * (300, 200) + (10, -20)).tolist()
+        for target in [grid, sparse]:
+            target.add_polyline(Polyline(samples[:200]))
+            for p in samples[200:]:
+                target.add_sample(Vector(p))
+
+        points, counts = grid.samples_to_arrays()
+        np.testing.assert_array_equal(sparse.samples_to_arrays()[0], points)
+        np.testing.assert_array_equal(sparse.samples_to_arrays()[1], counts[counts > 0])
+        for v in [Vector(p) for p in (rng.random((300, 2)) * (300, 200) + (10, -20)).tolist()]:
+            for d_sq in [4.0, 100.0, 625.0]:
+                self.assertEqual(sparse.is_valid_sample(v, d_sq), grid.is_valid_sample(v, d_sq))
+            self.assertEqual(sparse.get_nearby_points(v, 60), grid.get_nearby_points(v, 60))
+        tests = rng.random((300, 2)) * (300, 200) + (10, -20)
+        self.assertEqual(sparse.is_valid_samples(tests).tolist(), grid.is_valid_samples(tests).tolist())
+
+    def test_unbounded_cells(self):
+        # A continent of 10^12 cells, of which only the occupied ones exist.
+        sparse = SparseGridStorage(Vector((1e8, 1e8)), Vector((0.0, 0.0)), 100)
+        sparse.add_polyline(Polyline([(1e6 + i, 1e6) for i in range(1000)]))
+        self.assertEqual(len(sparse.cells), 10)
+        self.assertFalse(sparse.is_valid_sample(Vector((1e6 + 500.5, 1e6 + 20))))
+        self.assertTrue(sparse.is_valid_sample(Vector((1e6 + 500.5, 1e6 + 120))))
+
+        # Points outside of the domain are kept in their own cells, not in the first one.
+        sparse.add_sample(Vector((-250.0, 1e9)))
+        self.assertIn((-3, 10 ** 7), sparse.cells)
+        self.assertTrue(sparse.is_valid_sample(Vector((1.0, 1.0))))
+        self.assertFalse(sparse.is_valid_sample(Vector((-240.0, 1e9))))
+        tests = [(1e6 + 500.5, 1e6 + 20), (1e6 + 500.5, 1e6 + 120), (1.0, 1.0), (-240.0, 1e9), (-1e9, -1e9)]
+        self.assertEqual(sparse.is_valid_samples(tests).tolist(), [False, True, True, False, True])
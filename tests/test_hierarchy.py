@@ -0,0 +1,57 @@
+import unittest
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.graph import Graph
+from roadGraphGen.roadGraphGen.hierarchy import StreamlineHierarchy
+from roadGraphGen.roadGraphGen.integrator import RK4Integrator
+from roadGraphGen.tests.helpers import create_parameters, create_tensor_field
+
+
+class TestStreamlineHierarchy(unittest.TestCase):
+
+    def create_parameters(self, dsep):
+        return create_parameters(dsep=dsep, dtest=dsep * 0.4, dlookahead=dsep, collide_early=0)
+
+    def create_hierarchy(self):
+        hierarchy = StreamlineHierarchy(
+            RK4Integrator(create_tensor_field(), self.create_parameters(100)),
+            origin=Vector((0.0, 0.0)),
+            world_dimensions=Vector((300.0, 300.0)),
+            seed=5
+        )
+        hierarchy.add_level(self.create_parameters(100))
+        return hierarchy
+
+    def test_levels_are_tagged_and_separated_from_coarser_levels(self):
+        hierarchy = self.create_hierarchy()
+        hierarchy.add_level(self.create_parameters(40))
+        hierarchy.create_all_streamlines()
+        coarse, fine = hierarchy.levels
+
+        self.assertEqual(len(hierarchy.streamline_levels), len(hierarchy.all_streamlines))
+        self.assertEqual(hierarchy.streamline_levels.count(0), len(coarse.all_streamlines))
+        self.assertEqual(hierarchy.streamline_levels.count(1), len(fine.all_streamlines))
+        self.assertGreater(len(fine.all_streamlines), 0)
+
+        # The coarse samples are linked, not copied, into the grids of the fine level.
+        own_samples = len(fine.major_grid.samples_to_arrays()[0])
+        self.assertEqual(own_samples, sum(len(s) for s in fine.streamlines_major))
+        for streamline in coarse.streamlines_major:
+            self.assertFalse(fine.is_valid_sample(True, streamline[len(streamline) // 2], fine.parameters_sq.dsep))
+
+        graph = Graph(hierarchy)
+        self.assertEqual({edge.level for edge in graph.edges}, {0, 1})
+
+    def test_level_restricted_to_part_of_the_domain(self):
+        hierarchy = self.create_hierarchy()
+        hierarchy.add_level(self.create_parameters(40), Vector((0.0, 0.0)), Vector((120.0, 120.0)))
+        hierarchy.create_all_streamlines()
+
+        fine = hierarchy.levels[1]
+        self.assertGreater(len(fine.all_streamlines), 0)
+        self.assertEqual(tuple(fine.world_dimensions), (120.0, 120.0))
+        # Only joined ends leave the part of the domain.
+        for streamline in fine.all_streamlines:
+            inside = sum(1 for p in streamline if p.x < 121 and p.y < 121)
+            self.assertGreater(inside, len(streamline) / 2)
@@ -0,0 +1,92 @@
+import unittest
+import math
+
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.field_raster import TensorFieldRaster
+from roadGraphGen.roadGraphGen.integrator import AdaptiveIntegrator, RK4Integrator
+from roadGraphGen.roadGraphGen.streamline_parameters import StreamlineParameters
+from roadGraphGen.roadGraphGen.tensor_field import TensorField
+
+
+class TestAdaptiveIntegrator(unittest.TestCase):
+
+    def create_parameters(self):
+        return StreamlineParameters(
+            dsep=40,
+            dtest=15,
+            dstep=1,
+            dcirclejoin=5,
+            dlookahead=80,
+            joinangle=0.1,
+            path_iterations=400,
+            seed_tries=100,
+            simplify_tolerance=0.01,
+            collide_early=0,
+            tolerance=0.001,
+            min_step=0.25,
+            max_step=20
+        )
+
+    def trace(self, integrator, point, steps):
+        points = [point]
+        for _ in range(steps):
+            point = point + integrator.integrate(point, True)
+            points.append(point)
+        return points
+
+    def test_adaptive_straight_field(self):
+        tensor_field = TensorField()
+        tensor_field.add_grid(Vector((0.0, 0.0)), 10000, 0, math.pi / 5)
+        integrator = AdaptiveIntegrator(tensor_field, self.create_parameters())
+        points = self.trace(integrator, Vector((10.0, 10.0)), 200)
+        for p1, p2 in zip(points, points[1:]):
+            self.assertAlmostEqual((p2 - p1).length, 1.0, places=3)
+            self.assertAlmostEqual(abs((p2 - p1).normalized().dot(Vector((math.cos(math.pi / 5), math.sin(math.pi / 5))))), 1.0, places=5)
+        # Fixed step RK4 takes three samples per step.
+        self.assertLess(integrator.evaluations, 200)
+
+    def test_adaptive_radial_field(self):
+        tensor_field = TensorField()
+        tensor_field.add_radial(Vector((0.0, 0.0)), 10000, 0)
+        parameters = self.create_parameters()
+        adaptive = AdaptiveIntegrator(tensor_field, parameters)
+        points = self.trace(adaptive, Vector((30.0, 0.0)), 150)
+        for p in points:
+            self.assertAlmostEqual(p.length, 30.0, delta=0.05)
+        for p1, p2 in zip(points, points[1:]):
+            self.assertAlmostEqual((p2 - p1).length, 1.0, delta=0.01)
+
+        rk4 = RK4Integrator(tensor_field, parameters)
+        rk4_points = self.trace(rk4, Vector((30.0, 0.0)), 150)
+        self.assertLess(abs(points[-1].length - 30.0), abs(rk4_points[-1].length - 30.0) + 0.05)
+
+    def test_adaptive_reversed_direction(self):
+        tensor_field = TensorField()
+        tensor_field.add_grid(Vector((0.0, 0.0)), 10000, 0, 0)
+        integrator = AdaptiveIntegrator(tensor_field, self.create_parameters())
+        point = Vector((50.0, 50.0))
+        d = integrator.integrate(point, True)
+        backward = point + d * -1
+        self.assertLess(integrator.integrate(backward, True).dot(d), 0)
+        self.assertGreater(integrator.integrate(point + d, True).dot(d), 0)
+
+    def test_adaptive_degenerate_field(self):
+        tensor_field = TensorField()
+        tensor_field.smooth = True
+        tensor_field.add_radial(Vector((5.0, 5.0)), 100, 0)
+        integrator = AdaptiveIntegrator(tensor_field, self.create_parameters())
+        self.assertEqual(integrator.integrate(Vector((5.0, 5.0)), True), Vector((0.0, 0.0)))
+
+    def test_degenerate_points(self):
+        tensor_field = TensorField()
+        tensor_field.smooth = True
+        tensor_field.add_radial(Vector((5.0, 5.0)), 100, 0)
+        integrator = RK4Integrator(tensor_field, self.create_parameters())
+        # Only the center of the radial field is degenerate, points next to it are not.
+        points = np.array([(5.0, 5.0), (30.0, 5.0), (5.0, 40.0), (5.5, 5.0)])
+        self.assertEqual(integrator.degenerate_points(points).tolist(), [True, False, False, False])
+        integrator.raster = TensorFieldRaster(tensor_field, Vector((0.0, 0.0)), Vector((40.0, 40.0)), 5)
+        self.assertEqual(integrator.degenerate_points(points).tolist(), [True, False, False, False])
@@ -0,0 +1,43 @@
+import unittest
+import pickle
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.field_raster import TensorFieldRaster
+from roadGraphGen.roadGraphGen.parallel import ParallelStreamlineGenerator
+from roadGraphGen.tests.helpers import create_generator, streamline_points
+
+
+class TestParallelStreamlineGenerator(unittest.TestCase):
+
+    def create_generator(self):
+        return create_generator(seed=3, world_dimensions=(400.0, 300.0), collide_early=0)
+
+    def test_tile_domains(self):
+        parallel = ParallelStreamlineGenerator(self.create_generator(), tiles=(2, 3), halo=10)
+        self.assertEqual(parallel.halo, 40)
+        domains = parallel.get_tile_domains()
+        self.assertEqual(len(domains), 6)
+        self.assertEqual(domains[0], ((0.0, 0.0), (240.0, 140.0)))
+        self.assertEqual(domains[4], ((0.0, 160.0), (240.0, 140.0)))
+        self.assertEqual(len(set(parallel.get_tile_seeds())), 6)
+
+    def test_parallel_independent_of_workers(self):
+        sequential = self.create_generator()
+        ParallelStreamlineGenerator(sequential, tiles=(2, 2), workers=1).create_all_streamlines()
+        self.assertGreater(len(sequential.all_streamlines), 5)
+
+        pooled = self.create_generator()
+        ParallelStreamlineGenerator(pooled, tiles=(2, 2), workers=2).create_all_streamlines()
+        self.assertEqual(streamline_points(pooled), streamline_points(sequential))
+
+    def test_pickle_field(self):
+        generator = self.create_generator()
+        generator.integrator.raster = TensorFieldRaster(
+            generator.integrator.field, Vector((0.0, 0.0)), Vector((400.0, 300.0)), 10)
+        integrator = pickle.loads(pickle.dumps(generator.integrator))
+        for point in [Vector((10.0, 20.0)), Vector((240.0, 160.0))]:
+            self.assertEqual(integrator.integrate(point, True), generator.integrator.integrate(point, True))
+            self.assertEqual(
+                integrator.field.sample_point(point).matrix,
+                generator.integrator.field.sample_point(point).matrix)
@@ -0,0 +1,47 @@
+import unittest
+import pickle
+
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.polyline import Polyline
+
+
+class TestPolyline(unittest.TestCase):
+
+    def test_append_at_both_ends(self):
+        polyline = Polyline([Vector((0, 0))])
+        for i in range(1, 100):
+            polyline.append(Vector((i, 0)))
+            polyline.appendleft((-i, 0))
+        self.assertEqual(len(polyline), 199)
+        self.assertEqual(polyline[0], Vector((-99, 0)))
+        self.assertEqual(polyline[-1], Vector((99, 0)))
+        self.assertEqual([p.x for p in polyline], list(range(-99, 100)))
+        self.assertEqual([p.x for p in reversed(polyline)], list(range(99, -100, -1)))
+
+    def test_trim_keeps_points(self):
+        polyline = Polyline([(i, 2 * i) for i in range(50)])
+        polyline.append((50, 100))
+        polyline.trim(0)
+        self.assertEqual(len(polyline.buffer), 51)
+        self.assertEqual(polyline.xy.tolist(), [[i, 2 * i] for i in range(51)])
+
+    def test_contains_and_index_errors(self):
+        polyline = Polyline([(0.5, 1.5), (2.5, 3.5)])
+        self.assertIn(Vector((2.5, 3.5)), polyline)
+        self.assertNotIn(Vector((3.5, 2.5)), polyline)
+        with self.assertRaises(IndexError):
+            polyline[2]
+
+    def test_resampled(self):
+        polyline = Polyline([(0, 0), (2.5, 0), (2.5, 0.5), (2.5, 0.5)])
+        resampled = polyline.resampled(1)
+        np.testing.assert_allclose(resampled.xy, [[0, 0], [2.5 / 3, 0], [5 / 3, 0], [2.5, 0], [2.5, 0.5], [2.5, 0.5]])
+        self.assertEqual(Polyline([(1, 1)]).resampled(1).xy.tolist(), [[1, 1]])
+
+    def test_pickle(self):
+        polyline = Polyline([(i, -i) for i in range(20)])
+        restored = pickle.loads(pickle.dumps(polyline))
+        self.assertEqual(restored.xy.tolist(), polyline.xy.tolist())
@@ -0,0 +1,66 @@
+import unittest
+import math
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.seed_sampler import FreeSpaceSampler
+from roadGraphGen.tests.helpers import create_generator, streamline_points
+
+
+class TestFreeSpaceSampler(unittest.TestCase):
+
+    def test_stamp(self):
+        sampler = FreeSpaceSampler(Vector((10.0, 10.0)), Vector((100.0, 60.0)), 20, subdivisions=4)
+        self.assertEqual(sampler.dimensions, (20, 12))
+        point = Vector((43.0, 37.0))
+        sampler.stamp(True, [point])
+        self.assertFalse(sampler.blocked[False].any())
+
+        blocked = np.flatnonzero(sampler.blocked[True])
+        self.assertGreater(len(blocked), 0)
+        for cell in blocked:
+            i, j = divmod(int(cell), sampler.dimensions[1])
+            for corner in [(i, j), (i + 1, j), (i, j + 1), (i + 1, j + 1)]:
+                x = 10 + corner[0] * sampler.cell_size
+                y = 10 + corner[1] * sampler.cell_size
+                self.assertLess(math.hypot(x - point.x, y - point.y), 20)
+        self.assertTrue(sampler.blocked[True][6 * sampler.dimensions[1] + 5])
+
+    def test_get_seed_terminates(self):
+        sampler = FreeSpaceSampler(Vector((0.0, 0.0)), Vector((50.0, 50.0)), 10, subdivisions=2, max_failures=2)
+        rng = np.random.default_rng(1)
+        draws = []
+
+        def is_valid(seed):
+            draws.append(seed)
+            return False
+
+        self.assertIsNone(sampler.get_seed(True, rng, is_valid))
+        self.assertEqual(len(draws), 100 * 2)
+        self.assertEqual(sampler.free_count(True), 0)
+        self.assertEqual(sampler.free_count(False), 100)
+        for seed in draws:
+            self.assertTrue(0 <= seed.x <= 50 and 0 <= seed.y <= 50)
+
+        seed = sampler.get_seed(False, rng, lambda seed: seed.x > 40)
+        self.assertGreater(seed.x, 40)
+
+    def create_generator(self):
+        generator = create_generator(seed=11, collide_early=0)
+        generator.enable_free_space_sampling()
+        return generator
+
+    def test_generator_free_space_sampling(self):
+        generator = self.create_generator()
+        generator.create_all_streamlines()
+        self.assertGreater(len(generator.all_streamlines), 5)
+
+        # No free space is left for further seeds.
+        for major in [True, False]:
+            self.assertIsNone(generator.get_seed(major))
+
+        other = self.create_generator()
+        other.create_all_streamlines(batch_size=4)
+        self.assertEqual(
+            streamline_points(other), streamline_points(generator))
@@ -0,0 +1,96 @@
+import unittest
+import math
+
+import numpy as np
+
+from collections import deque
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.polyline import Polyline
+from roadGraphGen.roadGraphGen.simplify import (
+    StreamingSimplifier, get_square_segment_distance, simplify, simplify_all, simplify_ends, simplify_fronts,
+    simplify_radial_distance_indices
+)
+
+
+class TestSimplify(unittest.TestCase):
+
+    def assert_within_tolerance(self, points, simplified, tolerance):
+        segments = list(zip(list(simplified)[:-1], list(simplified)[1:]))
+        for p in points:
+            distance_sq = min(get_square_segment_distance(p, p1, p2) for p1, p2 in segments)
+            self.assertLessEqual(distance_sq, tolerance ** 2 * (1 + 1e-6))
+
+    def test_simplify_ends_after_joining(self):
+        tolerance = 0.05
+        points = deque(Vector((x, 10 * math.sin(x / 15))) for x in range(200))
+        simplified = simplify(points, tolerance)
+
+        for x in range(1, 12):
+            points.appendleft(Vector((-x, -0.3 * x)))
+        for x in range(200, 207):
+            points.append(Vector((x, points[-1].y + 0.5)))
+        updated = simplify_ends(points, simplified, 11, 7, tolerance)
+
+        self.assertIs(updated[0], points[0])
+        self.assertIs(updated[-1], points[-1])
+        self.assertTrue(all(any(v is p for p in points) for v in updated))
+        self.assert_within_tolerance(points, updated, tolerance)
+        self.assertLessEqual(len(updated), len(simplify(points, tolerance)) + 2)
+
+    def test_simplify_ends_without_new_points_keeps_simplification(self):
+        points = deque(Vector((x, 10 * math.sin(x / 15))) for x in range(200))
+        simplified = simplify(points, 0.05)
+        updated = simplify_ends(points, simplified, 0, 0, 0.05)
+        self.assertEqual(list(updated), list(simplified))
+
+    def test_long_streamline_without_recursion(self):
+        t = np.arange(0, 3000, 0.05)
+        points = Polyline(np.stack((t, np.sin(t / 3)), axis=1))
+        simplified = simplify(points, 0.01)
+        self.assertEqual(simplified[0], points[0])
+        self.assertEqual(simplified[-1], points[-1])
+        self.assert_within_tolerance([points[i] for i in range(0, len(points), 97)], simplified, 0.01)
+
+    def test_ties_keep_first_farthest_point(self):
+        points = deque(Vector(p) for p in [(0, 0), (1, 1), (2, 0), (3, 1), (4, 0)])
+        self.assertEqual([tuple(v) for v in simplify(points, 0.9)], [(0, 0), (1, 1), (4, 0)])
+
+    def test_radial_distance_prefilter(self):
+        xy = np.array([(0, 0), (0.1, 0), (0.3, 0), (0.35, 0), (1, 0), (1.05, 0)])
+        self.assertEqual(simplify_radial_distance_indices(xy, 0.2 ** 2).tolist(), [0, 2, 4, 5])
+
+        points = deque(Vector((x, 10 * math.sin(x / 15))) for x in np.arange(0, 200, 0.1).tolist())
+        simplified = simplify(points, 0.05, high_quality=False)
+        self.assertIs(simplified[0], points[0])
+        self.assertIs(simplified[-1], points[-1])
+        # Points dropped by the prefilter are within twice the tolerance.
+        self.assert_within_tolerance(points, simplified, 0.1)
+
+    def test_simplify_all_matches_simplify(self):
+        rng = np.random.default_rng(11)
+        lines = [Polyline(np.cumsum(rng.normal(0, 1, (n, 2)), axis=0)) for n in [40, 2, 300, 1, 7, 900]]
+        for high_quality in [True, False]:
+            simplified = simplify_all(lines, 0.5, high_quality)
+            self.assertEqual(len(simplified), len(lines))
+            for line, simple in zip(lines, simplified):
+                self.assertEqual(list(simple), list(simplify(line, 0.5, high_quality)))
+
+    def test_streaming_simplifier_within_tolerance(self):
+        points = [Vector((x, 10 * math.sin(x / 15))) for x in np.arange(0, 200, 0.5).tolist()]
+        for max_window in [64, 4]:
+            simplifier = StreamingSimplifier(0.05, max_window)
+            for p in points:
+                simplifier.add(p)
+            simplified = simplifier.result()
+            self.assertIs(simplified[0], points[0])
+            self.assertIs(simplified[-1], points[-1])
+            self.assert_within_tolerance(points, simplified, 0.05)
+            self.assertLess(len(simplified), len(points) / 2)
+        # Windows of 4 points keep at least every fifth point.
+        self.assertGreaterEqual(len(simplified), len(points) / 5)
+
+        # Both fronts of a streamline start at its seed.
+        simplified = simplify_fronts(Polyline(points), 100, 0.05)
+        self.assertIn(points[100], simplified)
+        self.assert_within_tolerance(points, simplified, 0.05)
@@ -0,0 +1,130 @@
+import unittest
+import math
+
+import numpy as np
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.grid_storage import GridStorage
+from roadGraphGen.roadGraphGen.polyline import Polyline
+from roadGraphGen.roadGraphGen.spatial_index import Quadtree, QuadtreeStorage, SpatialIndex, segments_intersect
+
+
+class TestQuadtree(unittest.TestCase):
+
+    def create_points(self, n=2000):
+        rng = np.random.default_rng(3)
+        # Clustered points, some of them outside of the domain.
+        points = rng.normal((100, 60), (60, 30), (n, 2))
+        points[:50] = (points[:50] - 100) * 10
+        return points
+
+    def test_bulk_load_and_insertion_queries(self):
+        points = self.create_points()
+        bulk = Quadtree(Vector((0.0, 0.0)), Vector((200.0, 120.0)), capacity=8)
+        bulk.add_points(points)
+        inserted = Quadtree(Vector((0.0, 0.0)), Vector((200.0, 120.0)), capacity=8)
+        for x, y in points.tolist():
+            inserted.add_point(x, y)
+
+        for tree in [bulk, inserted]:
+            self.assertEqual(len(tree), len(points))
+            for x, y, radius in [(100, 60, 10), (0, 0, 35), (190, 5, 50), (-500, 300, 400)]:
+                found, items = tree.query_radius(x, y, radius)
+                expected = np.flatnonzero(np.hypot(points[:, 0] - x, points[:, 1] - y) < radius)
+                self.assertEqual(sorted(items.tolist()), expected.tolist())
+                np.testing.assert_array_equal(found, points[items])
+                self.assertEqual(tree.any_within(x, y, radius ** 2), len(expected) > 0)
+
+            found, items = tree.query_box(20, 10, 90, 45)
+            expected = np.flatnonzero(
+                (points[:, 0] >= 20) & (points[:, 0] <= 90) & (points[:, 1] >= 10) & (points[:, 1] <= 45))
+            self.assertEqual(sorted(items.tolist()), expected.tolist())
+
+            found, items = tree.nearest(130, 20, k=7)
+            distances = np.hypot(points[:, 0] - 130, points[:, 1] - 20)
+            self.assertEqual(items.tolist(), np.argsort(distances)[:7].tolist())
+
+        # Points equal to the query point are no neighbours of it.
+        x, y = points[100]
+        self.assertFalse(bulk.any_within(x, y, 1e-12))
+
+    def test_segment_queries(self):
+        tree = Quadtree(Vector((0.0, 0.0)), Vector((100.0, 100.0)), capacity=2)
+        tree.add_points(self.create_points(200))
+        rng = np.random.default_rng(4)
+        segments = np.concatenate((rng.random((300, 2)) * 100, rng.normal(0, 6, (300, 2))), axis=1)
+        segments[:, 2:] += segments[:, :2]
+        for x1, y1, x2, y2 in segments.tolist():
+            tree.add_segment(x1, y1, x2, y2)
+
+        for x1, y1, x2, y2 in [(10, 10, 90, 80), (50, 0, 50, 100), (-20, 30, 5, 30), *segments[:20].tolist()]:
+            expected = [
+                i for i, (sx1, sy1, sx2, sy2) in enumerate(segments.tolist())
+                if min(sx1, sx2) <= max(x1, x2) and max(sx1, sx2) >= min(x1, x2)
+                and min(sy1, sy2) <= max(y1, y2) and max(sy1, sy2) >= min(y1, y2)
+                and segments_intersect(x1, y1, x2, y2, sx1, sy1, sx2, sy2)
+            ]
+            self.assertEqual(sorted(tree.query_segments(x1, y1, x2, y2)), expected)
+
+    def test_interface_must_be_implemented(self):
+        with self.assertRaises(NotImplementedError):
+            SpatialIndex().query_radius(0, 0, 1)
+
+    def test_segments_intersect(self):
+        self.assertTrue(segments_intersect(0, 0, 2, 2, 0, 2, 2, 0))
+        self.assertTrue(segments_intersect(0, 0, 2, 0, 1, 0, 3, 0))
+        self.assertTrue(segments_intersect(0, 0, 2, 0, 2, 0, 2, 5))
+        self.assertFalse(segments_intersect(0, 0, 2, 0, 0, 1, 2, 1))
+        self.assertFalse(segments_intersect(0, 0, 1, 1, 2, 2, 3, 0))
+
+
+class TestQuadtreeStorage(unittest.TestCase):
+
+    def test_queries_match_grid_storage(self):
+        origin = Vector((10.0, -20.0))
+        world_dimensions = Vector((300.0, 200.0))
+        grid = GridStorage(world_dimensions, origin, 25)
+        storage = QuadtreeStorage(world_dimensions, origin, 25, capacity=4)
+        spiral = Polyline([
+            (160 + t * math.cos(t / 9), 80 + 0.6 * t * math.sin(t / 9)) for t in np.arange(0, 140, 0.7)
+        ])
+        samples = [Vector(p) for p in (np.random.default_rng(5).random((50, 2)) * (320, 220) - (0, 30)).tolist()]
+        for target in [grid, storage]:
+            target.add_polyline(spiral)
+            for v in samples:
+                target.add_sample(v)
+
+        points, counts = grid.samples_to_arrays()
+        storage_points, storage_counts = storage.samples_to_arrays()
+        np.testing.assert_array_equal(storage_points, points)
+        np.testing.assert_array_equal(storage_counts, counts)
+
+        rng = np.random.default_rng(6)
+        tests = [Vector(p) for p in (rng.random((300, 2)) * (340, 240) - (10, 40)).tolist()]
+        tests.extend(Vector(p) for p in points[::17].tolist())
+        for v in tests:
+            for d_sq in [4.0, 100.0, 625.0]:
+                self.assertEqual(storage.is_valid_sample(v, d_sq), grid.is_valid_sample(v, d_sq))
+            self.assertEqual(storage.get_nearby_points(v, 60), grid.get_nearby_points(v, 60))
+        self.assertEqual(storage.is_valid_samples(tests, 100.0).tolist(), grid.is_valid_samples(tests, 100.0).tolist())
+
+        restored = QuadtreeStorage(world_dimensions, origin, 25)
+        restored.set_samples(points, counts)
+        np.testing.assert_array_equal(restored.samples_to_arrays()[0], points)
+
+    def test_polyline_segments(self):
+        storage = QuadtreeStorage(Vector((100.0, 100.0)), Vector((0.0, 0.0)), 10, capacity=2)
+        storage.add_sample(Vector((50.0, 50.0)))
+        storage.add_polyline(Polyline([(10, 10), (30, 10), (30, 40), (120, 40)]))
+        storage.add_polyline(Polyline([(60, 0), (60, 90)]))
+        # Items are the numbers of the first samples of the segments, the last one leaving the domain.
+        self.assertEqual(sorted(storage.query_segments(0, 20, 100, 20)), [2, 5])
+        self.assertEqual(sorted(storage.query_segments(110, 0, 110, 100)), [3])
+        self.assertEqual(storage.query_segments(0, 0, 5, 5), [])
+
+        # Restored and linked samples have no segments.
+        restored = QuadtreeStorage(storage.world_dimensions, storage.origin, 10)
+        restored.set_samples(*storage.samples_to_arrays())
+        restored.add_all(storage)
+        self.assertEqual(restored.query_segments(0, 20, 100, 20), [])
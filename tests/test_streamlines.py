@@ -0,0 +1,123 @@
+import unittest
+
+from mathutils import Vector
+
+from roadGraphGen.roadGraphGen.clearance import ClearanceGridStorage
+from roadGraphGen.roadGraphGen.integrator import FieldIntegrator
+from roadGraphGen.roadGraphGen.streamlines import StreamlineGenerator
+from roadGraphGen.roadGraphGen.tensor_field import TensorField
+from roadGraphGen.tests.helpers import create_generator, create_parameters, streamline_points
+
+
+# Leads streamlines seeded at the origin right, up, left and back down across their own start,
+# where they would follow themselves again, a loop that never turns against the seed direction.
+class LoopIntegrator(FieldIntegrator):
+    def integrate(self, point: Vector, major: bool) -> Vector:
+        if 9.5 <= point.x < 10.5 and point.y > 0.5:
+            return Vector((0.0, -1.0))
+        if point.x >= 20 and point.y < 20:
+            return Vector((0.0, 1.0))
+        if point.y >= 20:
+            return Vector((-1.0, 0.0))
+        return Vector((1.0, 0.0))
+
+
+class TestStreamlineGenerator(unittest.TestCase):
+
+    def test_batched_streamlines_match_sequential(self):
+        sequential = create_generator()
+        sequential.create_all_streamlines(batch_size=1)
+        self.assertGreater(len(sequential.all_streamlines), 5)
+
+        for batch_size in [4, 16]:
+            batched = create_generator()
+            batched.create_all_streamlines(batch_size=batch_size)
+            self.assertEqual(streamline_points(batched), streamline_points(sequential))
+
+    def test_clearance_grid_matches_grid_storage(self):
+        expected = create_generator()
+        expected.create_all_streamlines()
+        generator = create_generator(grid_class=ClearanceGridStorage)
+        generator.create_all_streamlines()
+        self.assertEqual(streamline_points(generator), streamline_points(expected))
+
+        # Seeds farthest from existing streamlines are still valid and cover the domain.
+        farthest = create_generator(grid_class=ClearanceGridStorage)
+        farthest.SEED_FARTHEST = True
+        farthest.create_all_streamlines()
+        self.assertGreater(len(farthest.all_streamlines), 5)
+        self.assertNotEqual(streamline_points(farthest), streamline_points(expected))
+
+    def test_streaming_simplification(self):
+        expected = create_generator()
+        expected.create_all_streamlines(join_dangling=False)
+        sequential = create_generator()
+        sequential.STREAMING_SIMPLIFICATION = True
+        sequential.create_all_streamlines(join_dangling=False)
+        self.assertEqual(streamline_points(sequential), streamline_points(expected))
+
+        # Batches simplify their streamlines the same way, and only the simplified streamlines
+        # need to be kept.
+        single = create_generator()
+        single.STREAMING_SIMPLIFICATION = True
+        single.create_all_streamlines(batch_size=1, join_dangling=False)
+        simple = [[tuple(p) for p in streamline] for streamline in single.all_streamlines_simple]
+        batched = create_generator()
+        batched.STREAMING_SIMPLIFICATION = True
+        batched.KEEP_DENSE_STREAMLINES = False
+        batched.create_all_streamlines(batch_size=4, join_dangling=False)
+        self.assertEqual(streamline_points(batched), simple)
+        self.assertLess(sum(map(len, batched.all_streamlines)), sum(map(len, single.all_streamlines)) / 2)
+
+        # Regions are found on the resampled streamlines.
+        region = (100, 100, 160, 160)
+        sequential.remove_streamlines_in_region(region)
+        batched.remove_streamlines_in_region(region)
+        self.assertEqual(len(batched.all_streamlines), len(sequential.all_streamlines))
+        self.assertEqual(batched.major_grid.is_valid_sample(Vector((130.0, 130.0))), True)
+
+    def test_lockstep_tracer_single_seed(self):
+        generator = create_generator()
+        seeds = [Vector((150.0, 150.0)), Vector((40.0, 250.0))]
+        traced = generator.tracer.trace(seeds, [True, False], [False, True])
+        self.assertEqual(len(traced), 2)
+        for i, seed in enumerate(seeds):
+            single = generator.tracer.trace([seed], [i == 0], [i == 1])[0]
+            self.assertEqual([tuple(p) for p in traced[i]], [tuple(p) for p in single])
+            self.assertIn(seed, traced[i])
+
+    def test_incremental_streamlines_match_create_all(self):
+        created = create_generator()
+        created.create_all_streamlines()
+
+        incremental = create_generator()
+        incremental.start_streamlines()
+        updates = 0
+        while incremental.update():
+            updates += 1
+        self.assertTrue(incremental.streamlines_done)
+        self.assertGreater(updates, len(incremental.all_streamlines))
+        self.assertEqual(streamline_points(incremental), streamline_points(created))
+        self.assertEqual(
+            [[tuple(p) for p in s] for s in incremental.all_streamlines_simple],
+            [[tuple(p) for p in s] for s in created.all_streamlines_simple]
+        )
+
+    def test_streamline_stops_at_self_collision(self):
+        parameters = create_parameters(collide_early=0)
+        generator = StreamlineGenerator(
+            integrator=LoopIntegrator(TensorField()),
+            origin=Vector((-50.0, -50.0)),
+            world_dimensions=Vector((100.0, 100.0)),
+            parameters=parameters,
+            seed=7
+        )
+        seed = Vector((0.0, 0.0))
+        streamline = generator.integrate_streamline(seed, True)
+        # The forward front ends on its way down, before reaching its own start.
+        self.assertLess(len(streamline), 150)
+        self.assertAlmostEqual(streamline[-1].x, 10.0, delta=0.5)
+        self.assertGreater(streamline[-1].y, 0.5)
+
+        traced = generator.tracer.trace([seed], [True], [False])[0]
+        self.assertEqual(len(traced), len(streamline))
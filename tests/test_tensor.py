@@ -1,43 +1,67 @@
 import unittest
 import math
+import numpy as np
 
 from mathutils import Vector
 
-from roadGraphGen.roadGraphGen.tensor import Tensor
+from roadGraphGen.roadGraphGen.tensor import Tensor, TensorArray
 
 
-class TestTensor(unittest.TestCase):
+# Test cases shared by Tensor and TensorArray. The concrete test cases give the factories
+# 'create(r, matrix)' and 'zero()' of their tensors as class attributes. The TensorArray variants
+# operate on arrays holding a single tensor, the helper methods convert their results to the
+# Tensor types.
+class TensorTests:
+
+    def r(self, tensor):
+        return tensor.r
+
+    def matrix(self, tensor):
+        return tensor.matrix
+
+    def theta(self, tensor):
+        return tensor.theta
+
+    def major(self, tensor):
+        return tensor.get_major()
+
+    def minor(self, tensor):
+        return tensor.get_minor()
 
     def test_tensor_zero(self):
-        tensor = Tensor.zero()
-        self.assertEqual(tensor.r, 0)
-        self.assertEqual(tensor.matrix, [0, 0])
-        self.assertEqual(tensor.theta, 0)
+        tensor = self.zero()
+        self.assertEqual(self.r(tensor), 0)
+        self.assertEqual(self.matrix(tensor), [0, 0])
+        self.assertEqual(self.theta(tensor), 0)
 
     def test_tensor_new(self):
         theta = math.pi / 4
-        tensor = Tensor(1, [math.cos(2 * theta), math.sin(2 * theta)])
-        self.assertEqual(tensor.theta, theta)
+        tensor = self.create(1, [math.cos(2 * theta), math.sin(2 * theta)])
+        self.assertEqual(self.theta(tensor), theta)
 
     def test_tensor_get_major(self):
         theta = math.pi / 4
-        tensor = Tensor(1, [math.cos(2 * theta), math.sin(2 * theta)])
+        tensor = self.create(1, [math.cos(2 * theta), math.sin(2 * theta)])
         vector = Vector((math.cos(theta), math.sin(theta)))
-        self.assertEqual(tensor.get_major(), vector)
+        self.assertEqual(self.major(tensor), vector)
 
     def test_tensor_get_minor(self):
         theta = math.pi / 4
-        tensor = Tensor(1, [math.cos(2 * theta), math.sin(2 * theta)])
+        tensor = self.create(1, [math.cos(2 * theta), math.sin(2 * theta)])
         vector = Vector((math.cos(theta + math.pi / 2), math.sin(theta + math.pi / 2)))
-        self.assertEqual(tensor.get_minor(), vector)
+        self.assertEqual(self.minor(tensor), vector)
 
     def test_tensor_scale(self):
-        t = Tensor(1, [0.0, 1.0])
+        t = self.create(1, [0.0, 1.0])
         t.scale(2.0)
-        self.assertEqual(t.r, 2.0)
+        self.assertEqual(self.r(t), 2.0)
 
     def test_tensor_rotate(self):
-        pass
+        t = self.create(1, [1.0, 0.0])
+        t.rotate(math.pi / 4)
+        self.assertAlmostEqual(self.theta(t), math.pi / 4)
+        self.assertAlmostEqual(self.matrix(t)[0], 0.0)
+        self.assertAlmostEqual(self.matrix(t)[1], 1.0)
 
     def test_tensor_add(self):
         v_1 = Vector((1.0, 1.0))
@@ -45,17 +69,17 @@ class TestTensor(unittest.TestCase):
         theta_1 = math.atan2(v_1.y, v_1.x)
         theta_2 = math.atan2(v_2.y, v_2.x)
 
-        t_1 = Tensor(1, [math.cos(2 * theta_1), math.sin(2 * theta_1)])
-        t_2 = Tensor(1, [math.cos(2 * theta_2), math.sin(2 * theta_2)])
+        t_1 = self.create(1, [math.cos(2 * theta_1), math.sin(2 * theta_1)])
+        t_2 = self.create(1, [math.cos(2 * theta_2), math.sin(2 * theta_2)])
 
         t_1.add(t_2)
 
-        self.assertEqual(t_1.r, 2.0)
+        self.assertEqual(self.r(t_1), 2.0)
         self.assertEqual(
-            t_1.matrix,
+            self.matrix(t_1),
             [math.cos(2 * theta_1) + math.cos(2 * theta_2), math.sin(2 * theta_1) + math.sin(2 * theta_2)])
-        self.assertEqual(t_1.theta, math.pi / 8)
-        self.assertEqual(t_1.get_major(), Vector((math.cos(math.pi / 8), math.sin(math.pi / 8))))
+        self.assertEqual(self.theta(t_1), math.pi / 8)
+        self.assertEqual(self.major(t_1), Vector((math.cos(math.pi / 8), math.sin(math.pi / 8))))
 
     def test_tensor_add_smooth(self):
         v_1 = Vector((1.0, 1.0))
@@ -63,8 +87,8 @@ class TestTensor(unittest.TestCase):
         theta_1 = math.atan2(v_1.y, v_1.x)
         theta_2 = math.atan2(v_2.y, v_2.x)
 
-        t_1 = Tensor(1, [math.cos(2 * theta_1), math.sin(2 * theta_1)])
-        t_2 = Tensor(1, [math.cos(2 * theta_2), math.sin(2 * theta_2)])
+        t_1 = self.create(1, [math.cos(2 * theta_1), math.sin(2 * theta_1)])
+        t_2 = self.create(1, [math.cos(2 * theta_2), math.sin(2 * theta_2)])
 
         t_1.add(t_2, smooth=True)
 
@@ -73,10 +97,58 @@ class TestTensor(unittest.TestCase):
         r = math.sqrt(x * x + y * y)
         matrix = [x, y]
 
-        self.assertEqual(t_1.r, r)
-        self.assertEqual(t_1.matrix, matrix)
-        self.assertEqual(t_1.theta, math.pi / 8)
-        self.assertEqual(t_1.get_major(), Vector((math.cos(math.pi / 8), math.sin(math.pi / 8))))
+        self.assertEqual(self.r(t_1), r)
+        self.assertEqual(self.matrix(t_1), matrix)
+        self.assertEqual(self.theta(t_1), math.pi / 8)
+        self.assertEqual(self.major(t_1), Vector((math.cos(math.pi / 8), math.sin(math.pi / 8))))
+
+
+class TestTensor(TensorTests, unittest.TestCase):
+    create = staticmethod(Tensor)
+    zero = staticmethod(Tensor.zero)
+
+
+class TestTensorArray(TensorTests, unittest.TestCase):
+    create = staticmethod(lambda r, matrix: TensorArray([r], [matrix]))
+    zero = staticmethod(lambda: TensorArray.zeros(1))
+
+    def r(self, tensor):
+        return tensor.r[0]
+
+    def matrix(self, tensor):
+        return tensor.matrix[0].tolist()
+
+    def theta(self, tensor):
+        return tensor.theta[0]
+
+    def major(self, tensor):
+        return Vector(tensor.get_major()[0])
+
+    def minor(self, tensor):
+        return Vector(tensor.get_minor()[0])
+
+    def test_tensor_array_matches_tensor(self):
+        rng = np.random.default_rng(3)
+        r = rng.random(50)
+        matrix = rng.random((50, 2)) * 2 - 1
+        other_r = rng.random(50)
+        other_matrix = rng.random((50, 2)) * 2 - 1
+        for smooth in [False, True]:
+            tensors = TensorArray(r.copy(), matrix.copy()).add(TensorArray(other_r, other_matrix), smooth).rotate(0.3)
+            for i in range(50):
+                tensor = Tensor(r[i], matrix[i].tolist()).add(Tensor(other_r[i], other_matrix[i].tolist()), smooth)
+                tensor.rotate(0.3)
+                self.assertAlmostEqual(tensors.r[i], tensor.r)
+                self.assertAlmostEqual(tensors.theta[i], tensor.theta)
+                np.testing.assert_allclose(tensors.matrix[i], tensor.matrix, atol=1e-12)
+                np.testing.assert_allclose(tensors.get_minor()[i], tensor.get_minor(), atol=1e-6)
+
+    def test_tensor_array_add_indices(self):
+        tensors = TensorArray.zeros(4)
+        tensors.add(TensorArray([1.0, 1.0], [[0.0, 1.0], [1.0, 0.0]]), indices=np.array([1, 3]))
+        self.assertEqual(tensors.r.tolist(), [0.0, 2.0, 0.0, 2.0])
+        self.assertEqual(tensors.matrix.tolist(), [[0.0, 0.0], [0.0, 1.0], [0.0, 0.0], [1.0, 0.0]])
+        self.assertEqual(tensors[1].matrix, [0.0, 1.0])
 
 
 if __name__ == "__main__":
@@ -1,10 +1,11 @@
 import unittest
 import math
+import numpy as np
 
 from mathutils import Vector
 
 from roadGraphGen.roadGraphGen.tensor import Tensor
-from roadGraphGen.roadGraphGen.tensor_field import TensorField
+from roadGraphGen.roadGraphGen.tensor_field import TensorField, EVERYWHERE, region_contains
 from roadGraphGen.roadGraphGen.basis_field import GridBasisField, RadialBasisField
 
 
@@ -84,6 +85,175 @@ class TestTensorField(unittest.TestCase):
         self.assertEqual(sample.theta, tensor.theta)
         self.assertEqual(sample.get_major(), tensor.get_major())
 
+    def test_sample_points_empty(self):
+        tensor_field = TensorField()
+        r, theta, major, minor = tensor_field.sample_points(np.array([[0.0, 0.0], [5.0, 3.0]]))
+        self.assertEqual(list(r), [1.0, 1.0])
+        self.assertEqual(list(theta), [0.0, 0.0])
+        self.assertEqual(major.tolist(), [[1.0, 0.0], [1.0, 0.0]])
+
+    def test_sample_points_multi(self):
+        size = 250
+        decay = 10
+        points = [Vector((40.0, 40.0)), Vector((-120.0, 35.0)), Vector((90.0, 280.0)), Vector((900.0, 900.0))]
+        for smooth in [False, True]:
+            tensor_field = TensorField()
+            tensor_field.smooth = smooth
+            tensor_field.add_grid(Vector((0.0, 0.0)), size, decay, math.pi / 4)
+            tensor_field.add_radial(Vector((50.0, 10.0)), size, decay)
+            tensor_field.add_radial(Vector((100.0, 300.0)), size, decay)
+            r, theta, major, minor = tensor_field.sample_points(points)
+            for i, point in enumerate(points):
+                tensor = tensor_field.sample_point(point)
+                self.assertAlmostEqual(r[i] / max(1.0, tensor.r), tensor.r / max(1.0, tensor.r))
+                self.assertAlmostEqual(theta[i], tensor.theta, places=5)
+                self.assertAlmostEqual(major[i, 0], tensor.get_major().x, places=5)
+                self.assertAlmostEqual(major[i, 1], tensor.get_major().y, places=5)
+                self.assertAlmostEqual(minor[i, 0], tensor.get_minor().x, places=5)
+                self.assertAlmostEqual(minor[i, 1], tensor.get_minor().y, places=5)
+
+    def test_index_updates(self):
+        tensor_field = TensorField()
+        grid = GridBasisField(Vector((0.0, 0.0)), 100, 10, 0.5)
+        radial = RadialBasisField(Vector((500.0, 0.0)), 100, 10)
+        tensor_field.add_field(grid)
+        tensor_field.add_field(radial)
+        self.assertEqual(tensor_field.index.query(Vector((10.0, 10.0))), [grid])
+        self.assertEqual(tensor_field.index.query(Vector((450.0, 10.0))), [radial])
+        self.assertEqual(tensor_field.index.query(Vector((250.0, 10.0))), [])
+        tensor_field.remove_field(grid)
+        self.assertEqual(tensor_field.index.query(Vector((10.0, 10.0))), [])
+        self.assertEqual(tensor_field.index.order[radial], 0)
+        tensor_field.reset()
+        self.assertEqual(tensor_field.index.query(Vector((450.0, 10.0))), [])
+
+    def test_index_smooth_epsilon(self):
+        tensor_field = TensorField()
+        tensor_field.add_radial(Vector((0.0, 0.0)), 100, 10)
+        point = Vector((110.0, 0.0))
+        self.assertEqual(tensor_field.index.query(point), [])
+        tensor_field.smooth = True
+        self.assertEqual(len(tensor_field.index.query(point)), 1)
+        tensor_field.smooth_epsilon = 0.5
+        self.assertEqual(tensor_field.index.query(point), [])
+
+    def test_sample_point_culled(self):
+        size = 120
+        decay = 4
+        grids = [GridBasisField(Vector((x * 90.0, y * 70.0)), size, decay, 0.3 * x - 0.2 * y)
+                  for x in range(6) for y in range(6)]
+        radials = [RadialBasisField(Vector((x * 150.0 + 20, y * 110.0 + 35)), size, decay)
+                   for x in range(3) for y in range(4)]
+        points = [Vector((x * 23.7 - 30, y * 31.3 - 20)) for x in range(20) for y in range(15)]
+        # The smooth summation squares the magnitude with every field, so only few fields are used there.
+        for smooth in [True, False]:
+            fields = grids + radials if not smooth else grids[::9]
+            tensor_field = TensorField(index_cell_size=50)
+            tensor_field.smooth = smooth
+            for field in fields:
+                tensor_field.add_field(field)
+            r, theta, major, minor = tensor_field.sample_points(points)
+            for i, point in enumerate(points):
+                sample = tensor_field.sample_point(point)
+                self.assertAlmostEqual(sample.theta, theta[i], places=5)
+                if not smooth:
+                    self.assertEqual(sample.theta, self.sample_all_fields(fields, point).theta)
+
+    def test_sample_point_culled_interleaved(self):
+        # The far field between the two contributing ones doubles the first of them in the full sum.
+        fields = [
+            GridBasisField(Vector((0.0, 0.0)), 100, 1, 0),
+            GridBasisField(Vector((1000.0, 0.0)), 100, 1, 0.7),
+            GridBasisField(Vector((50.0, 0.0)), 100, 1, 1.2),
+        ]
+        tensor_field = TensorField()
+        for field in fields:
+            tensor_field.add_field(field)
+        point = Vector((25.0, 0.0))
+        expected = self.sample_all_fields(fields, point).theta
+        self.assertAlmostEqual(expected, 0.102, places=3)
+        self.assertEqual(tensor_field.sample_point(point).theta, expected)
+        self.assertAlmostEqual(tensor_field.sample_tensors([point]).theta[0], expected)
+
+    def sample_all_fields(self, fields, point):
+        tensor = Tensor.zero()
+        for field in fields:
+            tensor.add(field.get_weighted_tensor(point, False), False)
+        return tensor
+
+    def test_sample_cache(self):
+        tensor_field = TensorField()
+        tensor_field.add_grid(Vector((0.0, 0.0)), 250, 10, math.pi / 4)
+        tensor_field.enable_sample_cache(size=2, quantum=0.01)
+        point = Vector((40.0, 40.0))
+        tensor = tensor_field.sample_point(point)
+        cached = tensor_field.sample_point(Vector((40.001, 40.0)))
+        self.assertEqual((tensor_field.sample_cache.hits, tensor_field.sample_cache.misses), (1, 1))
+        self.assertEqual(cached.matrix, tensor.matrix)
+        self.assertIsNot(cached, tensor_field.sample_point(point))
+
+        tensor_field.sample_point(Vector((10.0, 10.0)))
+        tensor_field.sample_point(Vector((20.0, 10.0)))
+        self.assertEqual(len(tensor_field.sample_cache), 2)
+        tensor_field.sample_point(point)
+        self.assertEqual(tensor_field.sample_cache.misses, 4)
+
+        tensor_field.add_radial(Vector((50.0, 10.0)), 250, 10)
+        self.assertEqual(len(tensor_field.sample_cache), 0)
+        self.assertNotEqual(tensor_field.sample_point(point).matrix, tensor.matrix)
+        tensor_field.reset()
+        self.assertEqual(len(tensor_field.sample_cache), 0)
+
+    def test_dirty_region(self):
+        tensor_field = TensorField()
+        radial = RadialBasisField(Vector((100.0, 50.0)), 20, 10)
+        version = tensor_field.version
+        self.assertIsNone(tensor_field.get_dirty_region(version))
+        tensor_field.add_field(radial)
+        self.assertEqual(tensor_field.get_dirty_region(version), (80.0, 30.0, 120.0, 70.0))
+        version = tensor_field.version
+        tensor_field.update_field(radial, center=Vector((200.0, 50.0)))
+        self.assertEqual(tensor_field.get_dirty_region(version), (80.0, 30.0, 220.0, 70.0))
+        self.assertEqual(tensor_field.index.query(Vector((200.0, 55.0))), [radial])
+        self.assertEqual(tensor_field.index.query(Vector((100.0, 55.0))), [])
+        tensor_field.reset()
+        self.assertEqual(tensor_field.get_dirty_region(version), EVERYWHERE)
+
+    def test_remove_field_dirty_region(self):
+        fields = [
+            GridBasisField(Vector((0.0, 0.0)), 100, 1, 0),
+            GridBasisField(Vector((1000.0, 0.0)), 100, 1, 0.7),
+            GridBasisField(Vector((50.0, 0.0)), 100, 1, 1.2),
+        ]
+        tensor_field = TensorField()
+        for field in fields:
+            tensor_field.add_field(field)
+        tensor_field.enable_sample_cache()
+        point = Vector((25.0, 0.0))
+        before = tensor_field.sample_point(point).theta
+        version = tensor_field.version
+
+        # The point lies outside of the disc of the removed field, but the relative weight of the
+        # fields before and after it changes.
+        tensor_field.remove_field(fields[1])
+        self.assertTrue(region_contains(tensor_field.get_dirty_region(version), point))
+        expected = self.sample_all_fields([fields[0], fields[2]], point).theta
+        self.assertNotAlmostEqual(expected, before, places=2)
+        self.assertEqual(tensor_field.sample_point(point).theta, expected)
+
+        # Removing the last field halves all others alike.
+        version = tensor_field.version
+        tensor_field.remove_field(fields[2])
+        self.assertEqual(tensor_field.get_dirty_region(version), (-50.0, -100.0, 150.0, 100.0))
+
+    def test_update_field_keeps_order(self):
+        tensor_field = TensorField()
+        tensor_field.add_grid(Vector((0.0, 0.0)), 100, 5, 0.3)
+        tensor_field.add_grid(Vector((10.0, 0.0)), 100, 5, 1.2)
+        first = tensor_field.basis_fields[0]
+        tensor_field.update_field(first, center=Vector((5.0, 0.0)))
+        self.assertEqual(tensor_field.index.query(Vector((5.0, 5.0))), tensor_field.basis_fields)
+
 
 if __name__ == "__main__":
     unittest.main()